@@ -1,5 +1,13 @@
-from django.contrib import admin
-from .models import Problem, Submission, Contest, Profile, Rank, RatingHistory
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from .importer import PackageError, import_package, read_package
+from .jobs import enqueue
+from .judging import delete_submission, set_verdict
+from .rating import refresh_rank_positions
+from .models import Problem, Submission, Contest, Profile, Rank, RatingHistory, Job
 
 # Сначала принудительно отменяем регистрацию, чтобы сбросить старый вид
 try:
@@ -7,10 +15,13 @@ try:
 except admin.sites.NotRegistered:
     pass
 
+class PackageUploadForm(forms.Form):
+    package = forms.FileField(help_text="JSONL file or ZIP archive with .jsonl files.")
+
 @admin.register(Problem)
 class ProblemAdmin(admin.ModelAdmin):
     # ТЕПЕРЬ ТЫ УВИДИШЬ ЭТИ КОЛОНКИ:
-    list_display = ('id', 'title', 'difficulty', 'difficulty_level') 
+    list_display = ('id', 'title', 'difficulty', 'difficulty_level', 'checker') 
     
     # Клик по названию откроет задачу
     list_display_links = ('id', 'title') 
@@ -19,8 +30,49 @@ class ProblemAdmin(admin.ModelAdmin):
     list_editable = ('difficulty', 'difficulty_level') 
     
     # Фильтр справа для удобства
-    list_filter = ('difficulty_level',)
-    search_fields = ('title',)
+    list_filter = ('difficulty_level', 'checker')
+    search_fields = ('title', 'external_id')
+
+    actions = ['rejudge_submissions']
+
+    @admin.action(description="Re-judge submissions of selected problems")
+    def rejudge_submissions(self, request, queryset):
+        # Перепроверка идёт в фоне через очередь задач (см. archive.jobs), по задаче на Job
+        for problem in queryset:
+            enqueue('rejudge', user=request.user, problem_id=problem.pk)
+        self.message_user(request, f"Re-judge queued for {queryset.count()} problem(s). See the job list for progress.")
+
+    # Кнопка "Import package" над списком задач
+    change_list_template = 'admin/archive/problem/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_package_view), name='archive_problem_import'),
+        ] + super().get_urls()
+
+    def import_package_view(self, request):
+        form = PackageUploadForm(request.POST or None, request.FILES or None)
+        errors = []
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['package']
+            try:
+                summary = import_package(read_package(upload.file, upload.name))
+            except PackageError as e:
+                errors = e.errors
+            else:
+                messages.success(request, (
+                    "Problems: {problems_created} created, {problems_updated} updated. "
+                    "Contests: {contests_created} created, {contests_updated} updated. "
+                    "Links: {links}.".format(**summary)
+                ))
+                return redirect('admin:archive_problem_changelist')
+        return TemplateResponse(request, 'admin/archive/problem/import_package.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Import problem package",
+            'form': form,
+            'errors': errors,
+        })
 
 # Регистрация профилей с быстрым баном
 try:
@@ -30,11 +82,41 @@ except admin.sites.NotRegistered:
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
-    list_display = ('user', 'rating', 'is_disqualified')
+    list_display = ('user', 'rating', 'rank_position', 'is_disqualified')
     list_editable = ('is_disqualified',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Рейтинг или бан меняют места в общем рейтинге
+        if {'rating', 'is_disqualified'} & set(form.changed_data):
+            refresh_rank_positions()
+
+@admin.register(Submission)
+class SubmissionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'author', 'problem', 'is_correct', 'submitted_at')
+    list_filter = ('is_correct',)
+    # От этих полей зависят таблицы результатов, решённые задачи и статистика;
+    # вердикт меняется только через set_verdict, посылки создаёт только сайт
+    readonly_fields = ('author', 'problem', 'user_answer', 'submitted_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        is_correct = obj.is_correct
+        obj.is_correct = form.initial.get('is_correct', is_correct)
+        super().save_model(request, obj, form, change)
+        set_verdict(obj, is_correct)
+
+    def delete_model(self, request, obj):
+        delete_submission(obj)
+
+    def delete_queryset(self, request, queryset):
+        for submission in queryset:
+            delete_submission(submission)
+
 # Остальные модели просто регистрируем, если они еще не в системе
-models_to_register = [Submission, Contest, Rank, RatingHistory]
+models_to_register = [Contest, Rank, RatingHistory, Job]
 for model in models_to_register:
     try:
         admin.site.register(model)
@@ -0,0 +1,485 @@
+"""
+Проверка ответов: разбор записи ответа и сравнение с эталоном задачи.
+
+Ответ разбирается небольшим парсером выражений, понимающим обычную запись
+и основные конструкции LaTeX (\\frac, \\sqrt, ^{...}, \\cdot, \\pi), поэтому
+1/2, 0.5, \\frac{1}{2} и 2^{-1} — один и тот же ответ для числовых проверок.
+Эталон задачи разбирается один раз (compile_checker кешируется), так что
+проверка посылки — это один разбор ответа и одно сравнение.
+"""
+import math
+import random
+import re
+from fractions import Fraction
+from functools import lru_cache
+
+
+class AnswerError(ValueError):
+    """Ответ не удалось разобрать (или он не подходит проверке задачи)."""
+
+
+# --- PARSER ---
+
+FUNCTIONS = {
+    'sqrt': math.sqrt, 'sin': math.sin, 'cos': math.cos, 'tan': math.tan,
+    'ln': math.log, 'log': math.log, 'exp': math.exp, 'abs': abs,
+}
+CONSTANTS = {'pi': math.pi, 'e': math.e}
+# Многобуквенные имена; остальные буквы — отдельные переменные (xy == x*y)
+NAMES = sorted(list(FUNCTIONS) + ['pi'], key=len, reverse=True)
+
+REPLACEMENTS = [
+    ('\\left', ''), ('\\right', ''), ('\\cdot', '*'), ('\\times', '*'), ('\\div', '/'),
+    ('\\dfrac', '\\frac'), ('\\tfrac', '\\frac'), ('\\pi', 'pi'), ('\\ln', 'ln'), ('\\log', 'log'),
+    ('\\sin', 'sin'), ('\\cos', 'cos'), ('\\tan', 'tan'), ('\\exp', 'exp'),
+    ('\\,', ''), ('\\!', ''), ('\\;', ''), ('$', ''), ('**', '^'),
+    ('−', '-'), ('–', '-'), ('×', '*'), ('·', '*'), ('÷', '/'), ('π', 'pi'), ('√', 'sqrt'),
+]
+
+# Ответы длиннее не разбираем, а вложенность скобок, минусов и функций ограничена:
+# рекурсивный спуск не должен упираться в лимит рекурсии Python
+MAX_ANSWER_LENGTH = 1000
+MAX_NESTING = 100
+
+TOKEN_RE = re.compile(r'\s*(?:(\d+\.?\d*|\.\d+)|(\\[a-zA-Z]+)|([a-zA-Z]+)|(.))')
+
+
+def tokenize(text):
+    if len(text) > MAX_ANSWER_LENGTH:
+        raise AnswerError("Answer is too long")
+    for old, new in REPLACEMENTS:
+        text = text.replace(old, new)
+    tokens = []
+    for number, command, letters, symbol in TOKEN_RE.findall(text.strip()):
+        if number:
+            tokens.append(('num', Fraction(number)))
+        elif command:
+            if command not in ('\\frac', '\\sqrt'):
+                raise AnswerError(f"Unsupported command {command}")
+            tokens.append(('cmd', command))
+        elif letters:
+            while letters:
+                name = next((n for n in NAMES if letters.startswith(n)), letters[0])
+                tokens.append(('name', name))
+                letters = letters[len(name):]
+        elif symbol.strip():
+            tokens.append(('op', symbol))
+    return tokens
+
+
+class Parser:
+    """
+    Рекурсивный спуск по токенам; результат — дерево из кортежей:
+    ('num', Fraction), ('var', имя), ('const', имя), ('neg', a),
+    ('add'|'sub'|'mul'|'div'|'pow', a, b), ('call', функция, a).
+    """
+
+    OPEN = {'(': ')', '{': '}', '[': ']'}
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+        self.depth = 0
+
+    def nested(self, parse):
+        # Каждый уровень вложенности проходит через unary или atom
+        self.depth += 1
+        if self.depth > MAX_NESTING:
+            raise AnswerError("Answer is nested too deeply")
+        try:
+            return parse()
+        finally:
+            self.depth -= 1
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        token = self.peek()
+        if token[0] is None or (value is not None and token[1] != value):
+            raise AnswerError(f"Expected {value or 'more input'}")
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise AnswerError("Empty answer")
+        node = self.expr()
+        if self.pos != len(self.tokens):
+            raise AnswerError(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def expr(self):
+        node = self.term()
+        while self.peek() in (('op', '+'), ('op', '-')):
+            op = self.take()[1]
+            node = ('add' if op == '+' else 'sub', node, self.term())
+        return node
+
+    def starts_atom(self):
+        kind, value = self.peek()
+        return kind in ('num', 'name', 'cmd') or (kind == 'op' and value in self.OPEN)
+
+    def term(self):
+        node = self.unary()
+        while True:
+            if self.peek() in (('op', '*'), ('op', '/')):
+                op = self.take()[1]
+                node = ('mul' if op == '*' else 'div', node, self.unary())
+            elif self.starts_atom():
+                # Неявное умножение: 2x, 2(x+1), (a)(b)
+                node = ('mul', node, self.power())
+            else:
+                return node
+
+    def unary(self):
+        return self.nested(self._unary)
+
+    def _unary(self):
+        if self.peek() == ('op', '-'):
+            self.take()
+            return ('neg', self.unary())
+        if self.peek() == ('op', '+'):
+            self.take()
+            return self.unary()
+        return self.power()
+
+    def power(self):
+        node = self.atom()
+        if self.peek() == ('op', '^'):
+            self.take()
+            return ('pow', node, self.unary())
+        return node
+
+    def group(self, close):
+        node = self.expr()
+        self.take(close)
+        return node
+
+    def atom(self):
+        return self.nested(self._atom)
+
+    def _atom(self):
+        kind, value = self.take()
+        if kind == 'num':
+            return ('num', value)
+        if kind == 'op' and value in self.OPEN:
+            return self.group(self.OPEN[value])
+        if kind == 'cmd':
+            if value == '\\frac':
+                numerator = self.argument()
+                return ('div', numerator, self.argument())
+            if self.peek() == ('op', '['):
+                self.take()
+                degree = self.group(']')
+                return ('pow', self.argument(), ('div', ('num', Fraction(1)), degree))
+            return ('call', 'sqrt', self.argument())
+        if kind == 'name':
+            if value in FUNCTIONS:
+                return ('call', value, self.power())
+            if value in CONSTANTS:
+                return ('const', value)
+            return ('var', value)
+        raise AnswerError(f"Unexpected {value!r}")
+
+    def argument(self):
+        # Аргумент \frac и \sqrt: {...} или один символ (\frac12 == 1/2)
+        if self.peek() == ('op', '{'):
+            self.take()
+            return self.group('}')
+        kind, value = self.take()
+        if kind == 'num':
+            digits = str(value)
+            if len(digits) > 1 and digits.isdigit():
+                # Разбиваем число: первая цифра — аргумент, остальное вернётся в поток
+                self.tokens[self.pos:self.pos] = [('num', Fraction(digits[1:]))]
+                return ('num', Fraction(digits[0]))
+            return ('num', value)
+        if kind == 'name':
+            return ('const', value) if value in CONSTANTS else ('var', value)
+        raise AnswerError(f"Unexpected {value!r}")
+
+
+def parse_expression(text):
+    return Parser(tokenize(text)).parse()
+
+
+def variables(node):
+    if node[0] == 'var':
+        return {node[1]}
+    return set().union(*(variables(child) for child in node[1:] if isinstance(child, tuple)))
+
+
+# --- EVALUATION ---
+
+# Ограничение на размер точных степеней, чтобы ответ вроде ((9^999)^999)^999 не вешал проверку
+MAX_EXACT_BITS = 100_000
+
+def evaluate_exact(node):
+    """Точное значение выражения без переменных в виде Fraction."""
+    kind = node[0]
+    if kind == 'num':
+        return node[1]
+    if kind == 'neg':
+        return -evaluate_exact(node[1])
+    if kind in ('add', 'sub', 'mul', 'div', 'pow'):
+        a, b = evaluate_exact(node[1]), evaluate_exact(node[2])
+        if kind == 'add':
+            return a + b
+        if kind == 'sub':
+            return a - b
+        if kind == 'mul':
+            return a * b
+        if kind == 'div':
+            if not b:
+                raise AnswerError("Division by zero")
+            return a / b
+        if b.denominator != 1 or (not a and b < 0):
+            raise AnswerError("Not a rational number")
+        if max(a.numerator.bit_length(), a.denominator.bit_length()) * abs(b) > MAX_EXACT_BITS:
+            raise AnswerError("Number is too large")
+        return a ** int(b)
+    if kind == 'call' and node[1] == 'sqrt':
+        value = evaluate_exact(node[2])
+        if value >= 0:
+            root = (math.isqrt(value.numerator), math.isqrt(value.denominator))
+            if root[0] ** 2 == value.numerator and root[1] ** 2 == value.denominator:
+                return Fraction(*root)
+    raise AnswerError("Not a rational number")
+
+
+def evaluate(node, env=None):
+    """Значение выражения (float) при значениях переменных env."""
+    kind = node[0]
+    if kind == 'num':
+        try:
+            return float(node[1])
+        except OverflowError:
+            raise AnswerError("Number is too large")
+    if kind == 'const':
+        return CONSTANTS[node[1]]
+    if kind == 'var':
+        if env is None or node[1] not in env:
+            raise AnswerError(f"Unknown variable {node[1]}")
+        return env[node[1]]
+    if kind == 'neg':
+        return -evaluate(node[1], env)
+    if kind == 'call':
+        try:
+            return float(FUNCTIONS[node[1]](evaluate(node[2], env)))
+        except (ValueError, OverflowError):
+            raise AnswerError("Math domain error")
+    a, b = evaluate(node[1], env), evaluate(node[2], env)
+    try:
+        if kind == 'add':
+            return a + b
+        if kind == 'sub':
+            return a - b
+        if kind == 'mul':
+            return a * b
+        if kind == 'div':
+            return a / b
+        result = a ** b
+    except (ZeroDivisionError, OverflowError):
+        raise AnswerError("Math domain error")
+    if isinstance(result, complex):
+        raise AnswerError("Complex value")
+    return result
+
+
+def close_enough(a, b, tolerance):
+    return abs(a - b) <= tolerance * max(1.0, abs(b))
+
+
+# --- CHECKERS ---
+
+# имя -> класс проверки; имя хранится в Problem.checker
+CHECKERS = {}
+
+
+def checker(name, label):
+    def register(cls):
+        cls.name, cls.label = name, label
+        CHECKERS[name] = cls
+        return cls
+    return register
+
+
+class Checker:
+    """Эталон разбирается в __init__ (AnswerError, если он некорректен), ответ — в __call__."""
+
+    def __init__(self, canonical, tolerance):
+        self.tolerance = tolerance
+        try:
+            self.expected = self.parse(canonical)
+        except RecursionError:
+            raise AnswerError("Answer is nested too deeply")
+
+    def parse(self, text):
+        raise NotImplementedError
+
+    def equal(self, given):
+        return given == self.expected
+
+    def __call__(self, answer):
+        try:
+            return self.equal(self.parse(answer))
+        except (AnswerError, RecursionError):
+            # RecursionError — на случай длинных цепочек вроде 1+1+...+1 при вычислении
+            return False
+
+
+@checker('exact', "Exact text")
+class ExactChecker(Checker):
+    def parse(self, text):
+        return str(text).strip().lower()
+
+
+@checker('numeric', "Number (with tolerance)")
+class NumericChecker(Checker):
+    def parse(self, text):
+        node = parse_expression(text)
+        if variables(node):
+            raise AnswerError("Answer must be a number")
+        value = evaluate(node)
+        if math.isnan(value) or math.isinf(value):
+            raise AnswerError("Answer must be a finite number")
+        return value
+
+    def equal(self, given):
+        return close_enough(given, self.expected, self.tolerance)
+
+
+@checker('rational', "Exact rational number")
+class RationalChecker(Checker):
+    def parse(self, text):
+        return evaluate_exact(parse_expression(text))
+
+
+@checker('tuple', "Tuple (ordered, numeric)")
+class TupleChecker(NumericChecker):
+    BRACKETS = {'(': ')', '[': ']', '{': '}'}
+
+    def split(self, text):
+        text = str(text).strip()
+        for old, new in (('\\{', '{'), ('\\}', '}'), ('\\left', ''), ('\\right', '')):
+            text = text.replace(old, new)
+        if len(text) >= 2 and self.BRACKETS.get(text[0]) == text[-1] and self.wraps(text):
+            text = text[1:-1]
+        parts, depth, current = [], 0, []
+        for char in text:
+            if char in '([{':
+                depth += 1
+            elif char in ')]}':
+                depth -= 1
+            if char in ',;' and depth == 0:
+                parts.append(''.join(current))
+                current = []
+            else:
+                current.append(char)
+        parts.append(''.join(current))
+        return parts
+
+    @staticmethod
+    def wraps(text):
+        # Внешние скобки охватывают всю строку, а не "(1)+(2)"
+        depth = 0
+        for i, char in enumerate(text):
+            depth += char in '([{'
+            depth -= char in ')]}'
+            if depth == 0 and i < len(text) - 1:
+                return False
+        return True
+
+    def parse(self, text):
+        return [NumericChecker.parse(self, part) for part in self.split(text)]
+
+    def equal(self, given):
+        return len(given) == len(self.expected) and all(
+            close_enough(a, b, self.tolerance) for a, b in zip(given, self.expected)
+        )
+
+
+@checker('set', "Set (any order, numeric)")
+class SetChecker(TupleChecker):
+    def parse(self, text):
+        return sorted(super().parse(text))
+
+    def equal(self, given):
+        # Для множества повторы не важны: {1, 1, 2} == {2, 1}
+        def unique(values):
+            result = []
+            for value in values:
+                if not result or not close_enough(value, result[-1], self.tolerance):
+                    result.append(value)
+            return result
+        given, expected = unique(given), unique(self.expected)
+        return len(given) == len(expected) and all(
+            close_enough(a, b, self.tolerance) for a, b in zip(given, expected)
+        )
+
+
+# Фиксированные точки (воспроизводимые вердикты) из области, где определены корни и логарифмы
+MAX_VARIABLES = 16
+_rng = random.Random(20240601)
+SAMPLE_POINTS = [[_rng.uniform(0.5, 2.5) for _ in range(MAX_VARIABLES)] for _ in range(6)]
+
+
+@checker('symbolic', "Expression (symbolic equivalence)")
+class SymbolicChecker(Checker):
+    """
+    Эквивалентность выражений проверяется подстановкой: оба выражения
+    вычисляются в нескольких фиксированных случайных точках (при совпадении
+    во всех точках выражения тождественны с вероятностью, близкой к 1).
+    """
+
+    def parse(self, text):
+        return parse_expression(text)
+
+    def equal(self, given):
+        names = sorted(variables(given) | variables(self.expected))
+        if len(names) > MAX_VARIABLES:
+            return False
+        compared = 0
+        for sample in SAMPLE_POINTS:
+            env = dict(zip(names, sample))
+            try:
+                expected = evaluate(self.expected, env)
+            except AnswerError:
+                continue
+            try:
+                value = evaluate(given, env)
+            except AnswerError:
+                return False
+            if not close_enough(value, expected, self.tolerance):
+                return False
+            compared += 1
+        return compared > 0
+
+
+CHECKER_CHOICES = [(name, cls.label) for name, cls in CHECKERS.items()]
+
+
+@lru_cache(maxsize=4096)
+def compile_checker(kind, canonical, tolerance):
+    """Проверка задачи с уже разобранным эталоном; кешируется по (вид, эталон, допуск)."""
+    try:
+        cls = CHECKERS[kind]
+    except KeyError:
+        raise AnswerError(f"Unknown checker {kind!r}")
+    return cls(canonical, tolerance)
+
+
+def judge_chunk(kind, canonical, tolerance, rows):
+    """
+    Перепроверяет пачку (id, ответ, старый вердикт) и возвращает [(id, новый вердикт)]
+    только для изменившихся. Модуль не зависит от Django, поэтому функция
+    годится для ProcessPoolExecutor.
+    """
+    check = compile_checker(kind, canonical, tolerance)
+    flipped = []
+    for pk, answer, was_correct in rows:
+        is_correct = check(answer)
+        if is_correct != was_correct:
+            flipped.append((pk, is_correct))
+    return flipped
@@ -0,0 +1,152 @@
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Submission
+from .standings import compute_standings, contest_submissions, scoreboard_rows
+
+# Размер пачки при чтении из БД: память экспорта не зависит от размера контеста
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+SUBMISSION_COLUMNS = (
+    'id', 'submitted_at', 'username', 'problem_id', 'problem', 'is_correct',
+    'answer', 'solution', 'disqualified',
+)
+
+
+def parse_time(value):
+    """
+    Время из параметра фильтра (ISO 8601); пустое значение — None.
+
+    Время со смещением (Z, +04:00) приводится к виду, в котором даты хранятся в
+    проекте: при USE_TZ = False — к наивному в TIME_ZONE, иначе наивное — к aware.
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Invalid datetime: {value!r}")
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        return timezone.make_aware(parsed)
+    if not settings.USE_TZ and timezone.is_aware(parsed):
+        return timezone.make_naive(parsed)
+    return parsed
+
+
+def parse_id(value):
+    """id из параметра фильтра; пустое значение — None."""
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid id: {value!r}")
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: writerow сразу возвращает готовую строку."""
+
+    def write(self, value):
+        return value
+
+
+def serialize(rows, header, fmt):
+    """Генератор строк экспорта в формате csv или jsonl."""
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+    elif fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(dict(zip(header, row)), ensure_ascii=False, default=str) + '\n'
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+# --- SUBMISSIONS ---
+
+def export_submissions(contest=None, problem_id=None, since=None, until=None):
+    """Заголовок и генератор строк посылок (включая дисквалифицированных) с фильтрами."""
+    if contest is not None:
+        submissions = contest_submissions(contest, include_disqualified=True)
+    else:
+        submissions = Submission.objects.all()
+    if problem_id:
+        submissions = submissions.filter(problem_id=problem_id)
+    if since:
+        submissions = submissions.filter(submitted_at__gte=since)
+    if until:
+        submissions = submissions.filter(submitted_at__lte=until)
+
+    rows = submissions.order_by('id').values_list(
+        'id', 'submitted_at', 'author__username', 'problem_id', 'problem__title', 'is_correct',
+        'user_answer', 'solution_text', 'author__profile__is_disqualified'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return SUBMISSION_COLUMNS, (
+        (pk, submitted_at.isoformat(), *rest) for pk, submitted_at, *rest in rows
+    )
+
+
+# --- STANDINGS ---
+
+def standings_header(problems):
+    header = ['rank', 'username', 'solved', 'penalty']
+    for problem in problems:
+        header += [f'{problem.title} result', f'{problem.title} time']
+    return header
+
+
+def standings_cells(row):
+    """Ячейки задач в нотации таблицы: '+', '+2' (две неудачи до AC), '-3' и время решения."""
+    cells = []
+    for stat in row['problems']:
+        if stat['status'] == 'OK':
+            cells += ['+' + (str(stat['failed']) if stat['failed'] else ''), stat['time']]
+        else:
+            cells += [f"-{stat['failed']}" if stat['failed'] else '', '']
+    return cells
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def export_standings(contest, problems=None, until=None):
+    """
+    Заголовок и генератор строк таблицы результатов в порядке contest_standings.
+
+    Полная таблица читается из сохранённых StandingsEntry/StandingsCell пачками,
+    поэтому память не растёт с числом участников. Срез по задачам или по моменту
+    времени (until) пересчитывается однопроходным compute_standings с теми же
+    правилами штрафа — его память пропорциональна числу участников.
+    """
+    all_problems = list(contest.problems.all())
+    if problems is None and until is None:
+        entries = contest.standings.filter(
+            user__profile__is_disqualified=False
+        ).select_related('user').order_by('-solved', 'penalty', 'user_id').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        rows = (
+            row for chunk in _chunks(entries, EXPORT_CHUNK_SIZE)
+            for row in scoreboard_rows(contest, all_problems, chunk)
+        )
+        problems = all_problems
+    else:
+        problems = all_problems if problems is None else list(problems)
+        rows = compute_standings(contest, problems, until=until)
+
+    return standings_header(problems), (
+        (rank, row['user'].username, row['solved'], row['penalty'], *standings_cells(row))
+        for rank, row in enumerate(rows, start=1)
+    )
@@ -0,0 +1,268 @@
+import io
+import json
+import zipfile
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .checkers import AnswerError, compile_checker
+from .jobs import enqueue_standings_rebuild
+from .models import Contest, Problem, refresh_published_at
+from .rendering import STATEMENT_RENDERER_VERSION, render_statement_many
+
+# Сколько строк пишем одним bulk_create и одной транзакцией
+IMPORT_BATCH_SIZE = 500
+
+PROBLEM_FIELDS = (
+    'title', 'description', 'correct_answer', 'checker', 'answer_tolerance', 'difficulty', 'difficulty_level',
+)
+CONTEST_FIELDS = ('title', 'description', 'start_time', 'end_time')
+DIFFICULTY_LEVELS = {value for value, _ in Problem.DIFFICULTY_CHOICES}
+
+
+class PackageError(Exception):
+    """Пакет не прошёл проверку; errors — список сообщений вида 'файл:строка: ошибка'."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} error(s) in package: " + '; '.join(errors[:5]))
+
+
+def read_package(file, name='package.jsonl'):
+    """
+    Записи пакета: (источник, номер строки, dict).
+
+    Пакет — JSONL-файл или ZIP с .jsonl-файлами (читаются по порядку имён).
+    Каждая строка — объект с "type": "problem" или "contest" и стабильным "id".
+    """
+    if zipfile.is_zipfile(file):
+        file.seek(0)
+        with zipfile.ZipFile(file) as archive:
+            for member in sorted(n for n in archive.namelist() if n.endswith('.jsonl')):
+                with archive.open(member) as member_file:
+                    yield from _read_lines(io.TextIOWrapper(member_file, encoding='utf-8'), member)
+    else:
+        file.seek(0)
+        yield from _read_lines(io.TextIOWrapper(file, encoding='utf-8'), name)
+
+
+def _read_lines(lines, source):
+    for lineno, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            record = e
+        yield source, lineno, record
+
+
+def normalize_answer(value):
+    """Ответ в том виде, в котором его хранит Problem.save."""
+    return str(value).strip()
+
+
+def _parse_time(value):
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise ValueError(f"invalid datetime {value!r}")
+    if timezone.is_aware(parsed) and not settings.USE_TZ:
+        parsed = timezone.make_naive(parsed)
+    return parsed
+
+
+def _clean_problem(record):
+    title = str(record.get('title') or '').strip()
+    if not title or len(title) > 200:
+        raise ValueError("title must be 1-200 characters")
+    answer = normalize_answer(record.get('correct_answer', ''))
+    if not answer or len(answer) > 100:
+        raise ValueError("correct_answer must be 1-100 characters")
+    checker, tolerance = record.get('checker', 'exact'), float(record.get('tolerance', 1e-6))
+    try:
+        # Эталон должен разбираться своей проверкой; разобранный вариант заодно попадёт в кеш
+        compile_checker(checker, answer, tolerance)
+    except AnswerError as e:
+        raise ValueError(f"correct_answer does not fit the {checker} checker: {e}")
+    difficulty_level = record.get('difficulty_level', 'bg-primary')
+    if difficulty_level not in DIFFICULTY_LEVELS:
+        raise ValueError(f"unknown difficulty_level {difficulty_level!r}")
+    return {
+        'title': title,
+        'description': str(record.get('description') or ''),
+        'correct_answer': answer,
+        'checker': checker,
+        'answer_tolerance': tolerance,
+        'difficulty': int(record.get('difficulty', 0)),
+        'difficulty_level': difficulty_level,
+    }
+
+
+def _clean_contest(record):
+    title = str(record.get('title') or '').strip()
+    if not title or len(title) > 200:
+        raise ValueError("title must be 1-200 characters")
+    start_time = _parse_time(record.get('start_time'))
+    end_time = _parse_time(record.get('end_time'))
+    if end_time <= start_time:
+        raise ValueError("end_time must be after start_time")
+    problems = record.get('problems')
+    if problems is not None and not isinstance(problems, list):
+        raise ValueError("problems must be a list of problem ids")
+    return {
+        'title': title,
+        'description': str(record.get('description') or ''),
+        'start_time': start_time,
+        'end_time': end_time,
+    }, problems and [str(problem_id) for problem_id in problems]
+
+
+def validate_package(records):
+    """
+    Проверяет и нормализует весь пакет до записи в БД.
+
+    Возвращает (problems, contests, links): {external_id: поля},
+    {external_id: поля} и {contest_external_id: [problem_external_id, ...]}
+    (только для контестов, где задан "problems").
+    При любой ошибке бросает PackageError со всеми найденными ошибками.
+    """
+    problems, contests, links, errors = {}, {}, {}, []
+    for source, lineno, record in records:
+        where = f"{source}:{lineno}"
+        if not isinstance(record, dict):
+            errors.append(f"{where}: not a JSON object")
+            continue
+        kind, external_id = record.get('type'), str(record.get('id') or '').strip()
+        if not external_id or len(external_id) > 100:
+            errors.append(f"{where}: id must be 1-100 characters")
+            continue
+        try:
+            if kind == 'problem':
+                problems[external_id] = _clean_problem(record)
+            elif kind == 'contest':
+                contests[external_id], problem_ids = _clean_contest(record)
+                if problem_ids is not None:
+                    links[external_id] = problem_ids
+            else:
+                errors.append(f"{where}: unknown type {kind!r}")
+        except (TypeError, ValueError) as e:
+            errors.append(f"{where}: {e}")
+
+    # Задачи контеста должны быть в пакете или уже в архиве
+    referenced = {problem_id for problem_ids in links.values() for problem_id in problem_ids}
+    known = set(problems) | set(
+        Problem.objects.filter(external_id__in=referenced - set(problems)).values_list('external_id', flat=True)
+    )
+    for contest_id, problem_ids in links.items():
+        for problem_id in problem_ids:
+            if problem_id not in known:
+                errors.append(f"contest {contest_id}: unknown problem {problem_id!r}")
+
+    if errors:
+        raise PackageError(errors)
+    return problems, contests, links
+
+
+def _batches(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _upsert(model, rows, fields, batch_size, progress):
+    """
+    bulk_create с ON CONFLICT (external_id) DO UPDATE пачками по транзакции.
+    Возвращает (создано, обновлено) и прогресс после каждой пачки.
+    """
+    created = updated = 0
+    for batch in _batches(rows, batch_size):
+        with transaction.atomic():
+            existing = set(
+                model.objects.filter(external_id__in=[obj.external_id for obj in batch])
+                .values_list('external_id', flat=True)
+            )
+            model.objects.bulk_create(
+                batch, update_conflicts=True, unique_fields=['external_id'], update_fields=list(fields)
+            )
+        updated += len(existing)
+        created += len(batch) - len(existing)
+        if progress:
+            progress(len(batch))
+    return created, updated
+
+
+def import_package(records, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Импортирует пакет задач и контестов (идемпотентный upsert по external_id).
+
+    bulk_create не вызывает save() и сигналы, поэтому HTML условия рендерится
+    здесь пакетно, а published_at задачи сразу ставится по самому раннему
+    контесту пакета (чтобы задача будущего раунда ни на миг не стала видна)
+    и уточняется refresh_published_at после записи связей.
+    progress(done, total) вызывается после каждой пачки.
+    """
+    problems, contests, links = validate_package(records)
+    total = len(problems) + len(contests) + len(links)
+    done = 0
+
+    def step(count):
+        nonlocal done
+        done += count
+        if progress:
+            progress(done, total)
+
+    first_start = {}
+    for contest_id, problem_ids in links.items():
+        for problem_id in problem_ids:
+            start = contests[contest_id]['start_time']
+            if problem_id not in first_start or start < first_start[problem_id]:
+                first_start[problem_id] = start
+
+    problem_rows = []
+    for batch in _batches(problems.items(), batch_size):
+        rendered = render_statement_many([fields['description'] for _, fields in batch])
+        for (external_id, fields), html in zip(batch, rendered):
+            problem_rows.append(Problem(
+                external_id=external_id, description_html=html, html_version=STATEMENT_RENDERER_VERSION,
+                published_at=first_start.get(external_id), **fields
+            ))
+    problems_created, problems_updated = _upsert(
+        Problem, problem_rows, PROBLEM_FIELDS + ('description_html', 'html_version'), batch_size, step
+    )
+
+    contest_rows = [Contest(external_id=external_id, **fields) for external_id, fields in contests.items()]
+    contests_created, contests_updated = _upsert(Contest, contest_rows, CONTEST_FIELDS, batch_size, step)
+
+    # Связи контест–задача: состав контеста из пакета заменяет прежний
+    contest_pks = dict(Contest.objects.filter(external_id__in=list(contests)).values_list('external_id', 'pk'))
+    referenced = {problem_id for problem_ids in links.values() for problem_id in problem_ids}
+    problem_pks = dict(Problem.objects.filter(external_id__in=list(referenced)).values_list('external_id', 'pk'))
+    Link = Contest.problems.through
+    touched = set()
+    for batch in _batches(links.items(), batch_size):
+        with transaction.atomic():
+            batch_contests = [contest_pks[contest_id] for contest_id, _ in batch]
+            touched.update(Link.objects.filter(contest_id__in=batch_contests).values_list('problem_id', flat=True))
+            Link.objects.filter(contest_id__in=batch_contests).delete()
+            Link.objects.bulk_create([
+                Link(contest_id=contest_pks[contest_id], problem_id=problem_pks[problem_id])
+                for contest_id, problem_ids in batch
+                for problem_id in dict.fromkeys(problem_ids)
+            ])
+        step(len(batch))
+
+    # Отвязанные задачи и задачи контестов пакета (время раунда могло сдвинуться)
+    touched.update(Link.objects.filter(contest_id__in=list(contest_pks.values())).values_list('problem_id', flat=True))
+    refresh_published_at(list(touched))
+    # bulk-запись сигналов не шлёт: таблицы результатов контестов с посылками пересобираем явно
+    enqueue_standings_rebuild(contest_pks.values())
+
+    return {
+        'problems_created': problems_created,
+        'problems_updated': problems_updated,
+        'contests_created': contests_created,
+        'contests_updated': contests_updated,
+        'links': sum(len(set(problem_ids)) for problem_ids in links.values()),
+    }
@@ -0,0 +1,135 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .judging import record_submission
+from .models import Submission
+
+logger = logging.getLogger(__name__)
+
+
+class SubmissionIngest:
+    """
+    Group commit для посылок: запросы кладут готовые Submission в очередь,
+    а один поток-писатель сохраняет их пачками — bulk_create и производные
+    таблицы в одной транзакции на пачку. Пачка закрывается, когда набралось
+    batch_size посылок или с первой прошло flush_interval секунд.
+
+    Посылки, ещё не записанные к моменту падения процесса, теряются; при
+    штатном завершении очередь дописывается (atexit).
+    """
+
+    def __init__(self, batch_size=100, flush_interval=0.005):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'queued': 0, 'written': 0, 'batches': 0, 'failed': 0}
+
+    def put(self, submission):
+        self._ensure_writer()
+        with self._lock:
+            self.stats['queued'] += 1
+        self.queue.put(submission)
+
+    def flush(self):
+        """Ждёт, пока всё поставленное в очередь будет записано."""
+        self.queue.join()
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, pending=self.queue.qsize(), batch_size=self.batch_size)
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='archive-ingest', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self.write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+                # Соединение потока не переживает долгий простой очереди
+                if self.queue.empty():
+                    connection.close()
+
+    def write(self, batch):
+        """Пишет пачку одной транзакцией; при ошибке — по одной, чтобы плохая посылка не потянула соседей."""
+        try:
+            with transaction.atomic():
+                Submission.objects.bulk_create(batch)
+                for submission in batch:
+                    record_submission(submission)
+            written, failed = len(batch), 0
+        except Exception:
+            logger.exception("Group commit of %d submissions failed, retrying one by one", len(batch))
+            written = failed = 0
+            for submission in batch:
+                submission.pk = None
+                try:
+                    with transaction.atomic():
+                        submission.save()
+                        record_submission(submission)
+                    written += 1
+                except Exception:
+                    logger.exception("Submission by user %s was not saved", submission.author_id)
+                    failed += 1
+        with self._lock:
+            self.stats['written'] += written
+            self.stats['failed'] += failed
+            self.stats['batches'] += 1
+
+
+submission_ingest = SubmissionIngest(
+    batch_size=getattr(settings, 'SUBMISSION_INGEST_BATCH_SIZE', 100),
+    flush_interval=getattr(settings, 'SUBMISSION_INGEST_INTERVAL', 0.005),
+)
+atexit.register(submission_ingest.flush)
+
+
+def submit_answer(user, problem, answer, solution=''):
+    """
+    Проверяет ответ и сохраняет посылку. С SUBMISSION_INGEST_ENABLED посылка
+    уходит в очередь group commit и вердикт возвращается сразу, иначе
+    пишется в транзакции запроса.
+    """
+    submission = Submission(
+        author=user,
+        problem=problem,
+        user_answer=answer,
+        solution_text=solution,
+        is_correct=problem.check_answer(answer),
+        submitted_at=timezone.now()
+    )
+    if getattr(settings, 'SUBMISSION_INGEST_ENABLED', False):
+        submission_ingest.put(submission)
+    else:
+        with transaction.atomic():
+            submission.save()
+            record_submission(submission)
+    return submission
@@ -0,0 +1,236 @@
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .models import Contest, Job, Problem
+from .prerender import count_stale_html, has_stale_html, rerender_stale_html
+from .rating import apply_contest_rating
+from .rejudge import rejudge_problem
+from .standings import has_scoreboard_data, rebuild_scoreboard
+
+logger = logging.getLogger(__name__)
+
+# kind -> функция(job, **payload), возвращающая короткую строку результата
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, user=None, **payload):
+    """Ставит задачу в очередь; если такая же ещё не выполнена, возвращает её."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    pending = Job.objects.filter(
+        kind=kind, payload=payload, status__in=[Job.QUEUED, Job.RUNNING]
+    ).order_by('id').first()
+    if pending:
+        return pending
+    return Job.objects.create(kind=kind, payload=payload, created_by=user)
+
+
+def set_progress(job, progress, total=None):
+    job.progress = progress
+    fields = {'progress': progress}
+    if total is not None:
+        job.total = fields['total'] = total
+    Job.objects.filter(pk=job.pk).update(**fields)
+
+
+def claim_next():
+    """Забирает самую старую задачу из очереди. Условный UPDATE не даёт двум воркерам взять одну задачу."""
+    while True:
+        job_id = Job.objects.filter(status=Job.QUEUED).order_by('id').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, started_at=now, heartbeat_at=now
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+
+
+def job_lease_timeout():
+    return getattr(settings, 'JOB_LEASE_TIMEOUT', 300)
+
+
+def heartbeat(job_ids):
+    """Продлевает аренду задач, которые воркер ещё выполняет."""
+    if job_ids:
+        Job.objects.filter(pk__in=job_ids, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+
+
+def fail_abandoned_jobs():
+    """
+    Помечает FAILED задачи RUNNING, чью аренду дольше JOB_LEASE_TIMEOUT никто
+    не продлевал (воркер упал или был убит). Обратно в очередь их не ставим:
+    задача, которая сама роняет воркер, иначе перезапускалась бы бесконечно.
+    Возвращает число таких задач.
+    """
+    lease = job_lease_timeout()
+    if lease <= 0:
+        return 0
+    now = timezone.now()
+    abandoned = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=now - timedelta(seconds=lease)).update(
+        status=Job.FAILED, error="The worker stopped responding; the job was abandoned.", finished_at=now
+    )
+    if abandoned:
+        logger.warning("Marked %d abandoned job(s) as failed", abandoned)
+    return abandoned
+
+
+def run_job(job):
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+        job.result = (handler(job, **job.payload) or '')[:255]
+        job.status = Job.DONE
+    except Exception:
+        logger.exception("Job %s failed", job.pk)
+        job.status = Job.FAILED
+        job.error = traceback.format_exc()
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+    return job
+
+
+def _run_in_thread(job):
+    try:
+        run_job(job)
+    finally:
+        # У каждого потока своё соединение с БД — закрываем, чтобы не копились
+        connection.close()
+
+
+def run_worker(workers=2, poll_interval=1.0, once=False, stop_event=None):
+    """
+    Выполняет задачи из очереди пулом потоков.
+
+    once=True — выполнить всё, что уже стоит в очереди, и выйти.
+    Пока задачи выполняются, главный поток раз в треть JOB_LEASE_TIMEOUT
+    продлевает их аренду и снимает задачи, брошенные другими воркерами.
+    Возвращает число выполненных задач.
+    """
+    slots = threading.Semaphore(workers)
+    running = {}
+    processed = 0
+    beat_every = job_lease_timeout() / 3 if job_lease_timeout() > 0 else poll_interval
+    next_beat = 0
+
+    def beat_if_due():
+        nonlocal next_beat
+        if time.monotonic() >= next_beat:
+            heartbeat(list(running))
+            fail_abandoned_jobs()
+            next_beat = time.monotonic() + beat_every
+
+    def finished(job_id):
+        running.pop(job_id, None)
+        slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='archive-job') as pool:
+        while not (stop_event and stop_event.is_set()):
+            close_old_connections()
+            beat_if_due()
+            # Все потоки заняты — ждём свободный, не переставая продлевать аренду
+            if not slots.acquire(timeout=min(poll_interval, beat_every)):
+                continue
+            job = claim_next()
+            if job is None:
+                slots.release()
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+            processed += 1
+            running[job.pk] = future = pool.submit(_run_in_thread, job)
+            future.add_done_callback(lambda _, job_id=job.pk: finished(job_id))
+        # Дожидаемся начатых задач, продолжая продлевать их аренду
+        while running:
+            wait(list(running.values()), timeout=beat_every)
+            beat_if_due()
+    return processed
+
+
+# --- HANDLERS ---
+
+@job_handler('rate_contest')
+def rate_contest_job(job, contest_id):
+    contest = Contest.objects.get(pk=contest_id)
+    set_progress(job, 0, 1)
+    rated = apply_contest_rating(contest)
+    set_progress(job, 1)
+    if not rated:
+        return "No active participants found."
+    return f"Rating calculated for {rated} participants."
+
+
+@job_handler('rebuild_standings')
+def rebuild_standings_job(job, contest_id=None):
+    contests = Contest.objects.order_by('id')
+    if contest_id is not None:
+        contests = contests.filter(pk=contest_id)
+    contests = list(contests)
+    set_progress(job, 0, len(contests))
+    drift = 0
+    for done, contest in enumerate(contests, start=1):
+        drift += rebuild_scoreboard(contest)
+        set_progress(job, done)
+    return f"Rebuilt {len(contests)} contest(s), {drift} drifted rows fixed."
+
+
+@job_handler('prerender_html')
+def prerender_html_job(job):
+    set_progress(job, 0, count_stale_html())
+    done = rerender_stale_html(progress=lambda done: set_progress(job, done))
+    return f"Re-rendered {done} row(s)."
+
+
+@job_handler('rejudge')
+def rejudge_job(job, problem_id):
+    problem = Problem.objects.get(pk=problem_id)
+    set_progress(job, 0, problem.submission_set.count())
+    summary = rejudge_problem(problem, progress=lambda done: set_progress(job, done))
+    return (
+        f"Checked {summary['checked']} submission(s): {summary['flipped']} verdict(s) flipped "
+        f"(+{summary['to_correct']} / -{summary['to_wrong']}), {summary['contests']} standings rebuilt."
+    )
+
+
+def enqueue_standings_rebuild(contest_ids):
+    """
+    Ставит пересборку таблиц результатов контестов, у которых сменилось окно
+    или состав задач. Уже выполняющаяся пересборка могла прочитать старые
+    данные, поэтому переиспользуется только задача, ещё стоящая в очереди.
+    Контесты без посылок и строк таблицы пропускаются. Возвращает число
+    поставленных задач.
+    """
+    queued = 0
+    for contest in Contest.objects.filter(pk__in=list(contest_ids)):
+        if not has_scoreboard_data(contest):
+            continue
+        payload = {'contest_id': contest.pk}
+        if not Job.objects.filter(kind='rebuild_standings', payload=payload, status=Job.QUEUED).exists():
+            Job.objects.create(kind='rebuild_standings', payload=payload)
+            queued += 1
+    return queued
+
+
+def enqueue_stale_html():
+    """Ставит перерисовку HTML в очередь, если конфигурация рендерера изменилась."""
+    if has_stale_html():
+        return enqueue('prerender_html')
+    return None
@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.db.models import F, Min
+
+from .models import Profile, Submission, UserSolved
+from .problem_stats import bump_problem_stats
+from .standings import refresh_submission_standings, update_standings
+from .throttle import submission_throttle
+
+
+def mark_solved(submission):
+    """Добавляет задачу в решённые пользователем (если её там ещё нет)."""
+    _, created = UserSolved.objects.get_or_create(
+        user_id=submission.author_id,
+        problem_id=submission.problem_id,
+        defaults={'first_solved_at': submission.submitted_at}
+    )
+    if created:
+        Profile.objects.filter(user_id=submission.author_id).update(solved_count=F('solved_count') + 1)
+    return created
+
+
+def refresh_solved(user_id, problem_id):
+    """Пересчитывает запись о решении задачи по посылкам пользователя. Возвращает изменение solved_count."""
+    first_solved_at = Submission.objects.filter(
+        author_id=user_id, problem_id=problem_id, is_correct=True
+    ).order_by('submitted_at').values_list('submitted_at', flat=True).first()
+
+    if first_solved_at is None:
+        deleted, _ = UserSolved.objects.filter(user_id=user_id, problem_id=problem_id).delete()
+        delta = -deleted
+    else:
+        _, created = UserSolved.objects.update_or_create(
+            user_id=user_id, problem_id=problem_id, defaults={'first_solved_at': first_solved_at}
+        )
+        delta = int(created)
+    if delta:
+        Profile.objects.filter(user_id=user_id).update(solved_count=F('solved_count') + delta)
+    return delta
+
+
+def rebuild_problem_solved(problem_id):
+    """
+    Сверяет UserSolved задачи с посылками одним GROUP BY (после массовой перепроверки).
+    Возвращает (добавлено, удалено) решивших; solved_count профилей правится пачками.
+    """
+    first_solved = dict(
+        Submission.objects.filter(problem_id=problem_id, is_correct=True)
+        .values('author_id').annotate(first=Min('submitted_at')).values_list('author_id', 'first')
+    )
+    stored = dict(UserSolved.objects.filter(problem_id=problem_id).values_list('user_id', 'first_solved_at'))
+    added = [user_id for user_id in first_solved if user_id not in stored]
+    removed = [user_id for user_id in stored if user_id not in first_solved]
+    moved = [user_id for user_id in first_solved if user_id in stored and stored[user_id] != first_solved[user_id]]
+
+    with transaction.atomic():
+        UserSolved.objects.bulk_create([
+            UserSolved(user_id=user_id, problem_id=problem_id, first_solved_at=first_solved[user_id])
+            for user_id in added
+        ], batch_size=500)
+        for start in range(0, len(removed), 500):
+            UserSolved.objects.filter(problem_id=problem_id, user_id__in=removed[start:start + 500]).delete()
+        for start in range(0, len(moved), 500):
+            rows = list(UserSolved.objects.filter(problem_id=problem_id, user_id__in=moved[start:start + 500]))
+            for row in rows:
+                row.first_solved_at = first_solved[row.user_id]
+            UserSolved.objects.bulk_update(rows, ['first_solved_at'])
+        for user_ids, delta in ((added, 1), (removed, -1)):
+            for start in range(0, len(user_ids), 500):
+                Profile.objects.filter(user_id__in=user_ids[start:start + 500]).update(
+                    solved_count=F('solved_count') + delta
+                )
+    return len(added), len(removed)
+
+
+def record_submission(submission):
+    """Обновляет производные таблицы после создания посылки (в транзакции вызывающего кода)."""
+    update_standings(submission)
+    new_solver = submission.is_correct and mark_solved(submission)
+    bump_problem_stats(
+        submission.problem_id, attempts=1, accepted=int(submission.is_correct), solvers=int(new_solver)
+    )
+
+
+def set_verdict(submission, is_correct):
+    """Меняет вердикт посылки и пересчитывает всё, что от него зависит."""
+    if submission.is_correct == is_correct:
+        return False
+    with transaction.atomic():
+        submission.is_correct = is_correct
+        submission.save(update_fields=['is_correct'])
+        refresh_submission_standings(submission)
+        solvers = refresh_solved(submission.author_id, submission.problem_id)
+        bump_problem_stats(submission.problem_id, accepted=1 if is_correct else -1, solvers=solvers)
+    submission_throttle.forget([submission])
+    return True
+
+
+def delete_submission(submission):
+    """Удаляет посылку и откатывает её вклад в таблицы результатов, решённые задачи и статистику."""
+    with transaction.atomic():
+        submission.delete()
+        refresh_submission_standings(submission)
+        solvers = refresh_solved(submission.author_id, submission.problem_id)
+        bump_problem_stats(
+            submission.problem_id, attempts=-1, accepted=-int(submission.is_correct), solvers=solvers
+        )
+    submission_throttle.forget([submission])
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from archive.export import EXPORT_FORMATS, export_standings, export_submissions, parse_time, serialize
+from archive.models import Contest
+
+
+class Command(BaseCommand):
+    help = "Streams contest standings or submissions as CSV/JSONL to stdout or a file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['standings', 'submissions'])
+        parser.add_argument('--contest', type=int, help="Contest id (required for standings).")
+        parser.add_argument('--problem', type=int, action='append', help="Problem id; may be repeated.")
+        parser.add_argument('--since', help="Only submissions at or after this ISO datetime.")
+        parser.add_argument('--until', help="Only submissions at or before this ISO datetime.")
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help="Output file (default: stdout).")
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_time(options['since'])
+            until = parse_time(options['until'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        contest = None
+        if options['contest']:
+            try:
+                contest = Contest.objects.get(pk=options['contest'])
+            except Contest.DoesNotExist:
+                raise CommandError(f"Contest {options['contest']} does not exist.")
+
+        problem_ids = options['problem'] or []
+        if options['kind'] == 'standings':
+            if contest is None:
+                raise CommandError("--contest is required for standings.")
+            problems = contest.problems.filter(pk__in=problem_ids) if problem_ids else None
+            header, rows = export_standings(contest, problems, until)
+        else:
+            if len(problem_ids) > 1:
+                raise CommandError("Submissions can be filtered by a single --problem.")
+            header, rows = export_submissions(contest, problem_ids[0] if problem_ids else None, since, until)
+
+        lines = serialize(rows, header, options['format'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+                out.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
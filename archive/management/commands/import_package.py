@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from archive.importer import IMPORT_BATCH_SIZE, PackageError, import_package, read_package
+
+
+class Command(BaseCommand):
+    help = "Imports problems, contests and their links from a JSONL or ZIP package (idempotent upsert by external id)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('package', help="Path to a .jsonl file or a .zip with .jsonl files.")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        def progress(done, total):
+            self.stdout.write(f"{done}/{total}")
+
+        try:
+            with open(options['package'], 'rb') as package:
+                summary = import_package(
+                    read_package(package, options['package']), options['batch_size'], progress
+                )
+        except OSError as e:
+            raise CommandError(e)
+        except PackageError as e:
+            for error in e.errors:
+                self.stderr.write(error)
+            raise CommandError(f"Package rejected: {len(e.errors)} error(s), nothing was imported.")
+
+        self.stdout.write(self.style.SUCCESS(
+            "Problems: {problems_created} created, {problems_updated} updated. "
+            "Contests: {contests_created} created, {contests_updated} updated. "
+            "Links: {links}.".format(**summary)
+        ))
@@ -0,0 +1,99 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from archive.ingest import submission_ingest, submit_answer
+from archive.models import Contest, Problem
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the submission write path (direct writes vs group commit) against the configured "
+        "database and reports submissions/sec. Creates temporary users, a problem and a running contest."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent 'requests'.")
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--mode', choices=['direct', 'ingest', 'both'], default='both')
+        parser.add_argument('--keep', action='store_true', help="Keep the generated data.")
+
+    def handle(self, *args, **options):
+        tag = f"loadtest-{int(time.time())}"
+        now = timezone.now()
+        users = User.objects.bulk_create([User(username=f"{tag}-{i}") for i in range(options['users'])])
+        users = list(User.objects.filter(username__startswith=tag))
+        problem = Problem.objects.create(title=tag, description='Load test', correct_answer='42')
+        contest = Contest.objects.create(title=tag, start_time=now - timedelta(minutes=5), end_time=now + timedelta(hours=2))
+        contest.problems.add(problem)
+        self.stdout.write(f"Journal mode: {self.journal_mode()}")
+
+        try:
+            modes = ['direct', 'ingest'] if options['mode'] == 'both' else [options['mode']]
+            for mode in modes:
+                with override_settings(SUBMISSION_INGEST_ENABLED=(mode == 'ingest')):
+                    self.run(mode, users, problem, options['submissions'], options['threads'])
+        finally:
+            if not options['keep']:
+                contest.delete()
+                problem.delete()
+                User.objects.filter(username__startswith=tag).delete()
+
+    def journal_mode(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
+
+    def run(self, mode, users, problem, total, threads):
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def worker(index):
+            own_latencies = []
+            try:
+                for i in range(index, total, threads):
+                    answer = '42' if i % 3 == 0 else str(i)
+                    started = time.perf_counter()
+                    try:
+                        submit_answer(users[i % len(users)], problem, answer)
+                    except Exception as e:
+                        with lock:
+                            errors.append(e)
+                        continue
+                    own_latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(own_latencies)
+
+        started = time.perf_counter()
+        pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        accepted = time.perf_counter() - started
+        # Для group commit считаем время до фактической записи всей очереди
+        submission_ingest.flush()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        done = len(latencies)
+
+        def percentile(p):
+            return latencies[min(done - 1, int(p * done))] * 1000 if done else 0
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode:>6}: {done} submissions in {elapsed:.2f}s = {done / elapsed:.0f}/s written "
+            f"({done / accepted:.0f}/s accepted), latency p50 {percentile(0.5):.1f}ms "
+            f"p99 {percentile(0.99):.1f}ms, {len(errors)} error(s)"
+        ))
+        if errors:
+            self.stdout.write(self.style.WARNING(f"  first error: {errors[0]!r}"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from archive.prerender import count_stale_html, rerender_stale_html
+
+
+class Command(BaseCommand):
+    help = "Backfills the stored HTML of posts, comments and problem statements rendered by an outdated renderer."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = count_stale_html()
+        self.stdout.write(f"{total} row(s) need re-rendering.")
+
+        def progress(done):
+            self.stdout.write(f"  {done}/{total}")
+
+        done = rerender_stale_html(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Re-rendered {done} row(s)."))
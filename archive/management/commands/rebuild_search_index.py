@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from archive.search import SEARCH_INDEXES
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreates the SQLite FTS5 search indexes and their sync triggers, then rebuilds them from the "
+        "source tables. Run after migrations that rebuild the indexed tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'indexes', nargs='*', metavar='index',
+            help=f"Indexes to rebuild ({', '.join(sorted(SEARCH_INDEXES))}); all by default."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Full-text search indexes are only used on SQLite.")
+        unknown = set(options['indexes']) - set(SEARCH_INDEXES)
+        if unknown:
+            raise CommandError(f"Unknown search index: {', '.join(sorted(unknown))}")
+        for name in options['indexes'] or SEARCH_INDEXES:
+            SEARCH_INDEXES[name].install()
+            self.stdout.write(self.style.SUCCESS(f"{name}: search index rebuilt"))
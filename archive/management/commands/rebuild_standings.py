@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from archive.models import Contest
+from archive.standings import build_scoreboard, rebuild_scoreboard, scoreboard_drift
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the materialized contest standings from submissions and reports drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('contest_ids', nargs='*', type=int, help="Contests to rebuild (default: all).")
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report drift, do not rewrite the standings. Exits with code 1 if drift is found."
+        )
+
+    def handle(self, *args, **options):
+        contests = Contest.objects.order_by('id')
+        if options['contest_ids']:
+            contests = contests.filter(id__in=options['contest_ids'])
+
+        total_drift = 0
+        for contest in contests:
+            if options['check']:
+                entries, cells = build_scoreboard(contest)
+                drift = scoreboard_drift(contest, entries, cells)
+            else:
+                drift = rebuild_scoreboard(contest)
+            total_drift += drift
+            style = self.style.WARNING if drift else self.style.SUCCESS
+            self.stdout.write(style(f"#{contest.id} {contest.title}: {drift} drifted rows"))
+
+        if options['check'] and total_drift:
+            raise SystemExit(1)
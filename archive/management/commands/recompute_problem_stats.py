@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from archive.problem_stats import recompute_problem_stats
+
+
+class Command(BaseCommand):
+    help = "Recomputes per-problem statistics from submissions with a single GROUP BY and reports drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report drift, do not rewrite the statistics. Exits with code 1 if drift is found."
+        )
+
+    def handle(self, *args, **options):
+        drift = recompute_problem_stats(check=options['check'])
+        style = self.style.WARNING if drift else self.style.SUCCESS
+        self.stdout.write(style(f"{drift} drifted problem stats rows"))
+
+        if options['check'] and drift:
+            raise SystemExit(1)
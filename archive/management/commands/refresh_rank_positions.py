@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from archive.rating import refresh_rank_positions
+
+
+class Command(BaseCommand):
+    help = "Recomputes the precomputed global ranking positions (Profile.rank_position)."
+
+    def handle(self, *args, **options):
+        changed = refresh_rank_positions()
+        self.stdout.write(self.style.SUCCESS(f"{changed} profile position(s) updated"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from archive.models import Problem
+from archive.rejudge import REJUDGE_CHUNK_SIZE, rejudge_problem
+
+
+class Command(BaseCommand):
+    help = "Re-judges all submissions of the given problems with their current answer and checker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('problem_ids', nargs='+', type=int)
+        parser.add_argument('--chunk-size', type=int, default=REJUDGE_CHUNK_SIZE)
+        parser.add_argument('--processes', type=int, default=1, help="Judge chunks in a process pool of this size.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the verdicts that would flip.")
+
+    def handle(self, *args, **options):
+        problems = Problem.objects.filter(pk__in=options['problem_ids']).order_by('pk')
+        missing = set(options['problem_ids']) - {problem.pk for problem in problems}
+        if missing:
+            raise CommandError(f"Unknown problem id(s): {', '.join(map(str, sorted(missing)))}")
+
+        total_flipped = 0
+        for problem in problems:
+            summary = rejudge_problem(
+                problem, chunk_size=options['chunk_size'], processes=options['processes'],
+                dry_run=options['dry_run'], progress=lambda done: self.stdout.write(f"  {done} checked")
+            )
+            total_flipped += summary['flipped']
+            style = self.style.WARNING if summary['flipped'] else self.style.SUCCESS
+            self.stdout.write(style(
+                f"#{problem.pk} {problem.title}: {summary['checked']} checked, {summary['flipped']} flipped "
+                f"(+{summary['to_correct']} / -{summary['to_wrong']}), "
+                f"solvers +{summary['solvers_added']} / -{summary['solvers_removed']}, "
+                f"{summary['contests']} standings rebuilt"
+            ))
+        verb = "would flip" if options['dry_run'] else "flipped"
+        self.stdout.write(f"{total_flipped} verdict(s) {verb}.")
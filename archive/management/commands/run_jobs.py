@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from archive.jobs import enqueue_stale_html, run_worker
+
+
+class Command(BaseCommand):
+    help = "Runs the background job worker (rating calculation, standings rebuilds and other staff actions)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Number of worker threads.")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Process the jobs already queued and exit.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Job worker started with {options['workers']} thread(s).")
+        # Новая версия рендерера (белый список, расширения) — перерисовываем сохранённый HTML
+        if enqueue_stale_html():
+            self.stdout.write("Stored HTML is outdated, re-render job queued.")
+        try:
+            processed = run_worker(workers=options['workers'], poll_interval=options['poll'], once=options['once'])
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)."))
@@ -0,0 +1,88 @@
+# Generated by Django 6.0 on 2026-10-18 22:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Штраф за неверную попытку до первого правильного ответа (минуты), как в archive.standings
+WRONG_ATTEMPT_PENALTY = 20
+
+
+def build_standings(apps, schema_editor):
+    """Заполняет таблицы результатов уже существующих контестов по их посылкам."""
+    Contest = apps.get_model('archive', 'Contest')
+    Submission = apps.get_model('archive', 'Submission')
+    StandingsEntry = apps.get_model('archive', 'StandingsEntry')
+    StandingsCell = apps.get_model('archive', 'StandingsCell')
+
+    for contest in Contest.objects.order_by('id').iterator():
+        rows = Submission.objects.filter(
+            problem__in=contest.problems.all(),
+            submitted_at__gte=contest.start_time,
+            submitted_at__lte=contest.end_time,
+        ).order_by('author_id', 'problem_id', 'submitted_at', 'id').values_list(
+            'author_id', 'problem_id', 'submitted_at', 'is_correct'
+        )
+        entries, cells = {}, {}
+        for author_id, problem_id, submitted_at, is_correct in rows.iterator(chunk_size=2000):
+            entry = entries.setdefault(author_id, StandingsEntry(contest=contest, user_id=author_id))
+            cell = cells.get((author_id, problem_id))
+            if cell is None:
+                cell = cells[author_id, problem_id] = StandingsCell(
+                    contest=contest, user_id=author_id, problem_id=problem_id
+                )
+            if cell.first_ac_at is not None:
+                continue
+            if is_correct:
+                minutes = int((submitted_at - contest.start_time).total_seconds() // 60)
+                cell.first_ac_at = submitted_at
+                cell.penalty = minutes + cell.attempts * WRONG_ATTEMPT_PENALTY
+                entry.solved += 1
+                entry.penalty += cell.penalty
+            else:
+                cell.attempts += 1
+        StandingsEntry.objects.bulk_create(entries.values(), batch_size=500)
+        StandingsCell.objects.bulk_create(cells.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0008_blogpost_is_featured'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StandingsCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Failed Attempts')),
+                ('first_ac_at', models.DateTimeField(blank=True, null=True, verbose_name='First Accepted')),
+                ('penalty', models.IntegerField(default=0, verbose_name='Penalty')),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings_cells', to='archive.contest')),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings_cells', to='archive.problem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings_cells', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('contest', 'user', 'problem'), name='unique_standings_cell')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StandingsEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('solved', models.IntegerField(default=0, verbose_name='Solved')),
+                ('penalty', models.IntegerField(default=0, verbose_name='Penalty')),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='archive.contest')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Standings Entry',
+                'verbose_name_plural': 'Standings',
+                'indexes': [models.Index(fields=['contest', '-solved', 'penalty'], name='standings_order_idx')],
+                'constraints': [models.UniqueConstraint(fields=('contest', 'user'), name='unique_standings_entry')],
+            },
+        ),
+        migrations.RunPython(build_standings, migrations.RunPython.noop),
+    ]
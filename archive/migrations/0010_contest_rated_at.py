@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 22:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0009_standings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='rated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Rated At'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 6.0 on 2026-10-18 22:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_solved(apps, schema_editor):
+    Submission = apps.get_model('archive', 'Submission')
+    UserSolved = apps.get_model('archive', 'UserSolved')
+    Profile = apps.get_model('archive', 'Profile')
+
+    solved = (
+        Submission.objects.filter(is_correct=True)
+        .values('author_id', 'problem_id')
+        .annotate(first_solved_at=Min('submitted_at'))
+    )
+    UserSolved.objects.bulk_create(
+        (UserSolved(user_id=row['author_id'], problem_id=row['problem_id'], first_solved_at=row['first_solved_at'])
+         for row in solved.iterator()),
+        batch_size=1000,
+    )
+    counts = UserSolved.objects.filter(user_id=OuterRef('user_id')).values('user_id').annotate(n=Count('id')).values('n')
+    Profile.objects.update(solved_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0014_submission_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='solved_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Solved Problems'),
+        ),
+        migrations.CreateModel(
+            name='UserSolved',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_solved_at', models.DateTimeField(verbose_name='First Solved')),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solved_by', to='archive.problem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solved_problems', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'problem'), name='unique_user_solved')],
+            },
+        ),
+        migrations.RunPython(backfill_solved, migrations.RunPython.noop),
+    ]
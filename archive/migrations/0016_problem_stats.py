@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-18 22:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_problem_stats(apps, schema_editor):
+    Submission = apps.get_model('archive', 'Submission')
+    ProblemStats = apps.get_model('archive', 'ProblemStats')
+
+    rows = Submission.objects.values('problem_id').annotate(
+        attempts=Count('id'),
+        accepted=Count('id', filter=Q(is_correct=True)),
+        solvers=Count('author_id', distinct=True, filter=Q(is_correct=True)),
+    )
+    ProblemStats.objects.bulk_create(
+        (ProblemStats(**row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0015_user_solved'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProblemStats',
+            fields=[
+                ('problem', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='archive.problem')),
+                ('attempts', models.IntegerField(default=0, verbose_name='Attempts')),
+                ('accepted', models.IntegerField(default=0, verbose_name='Accepted')),
+                ('solvers', models.IntegerField(default=0, verbose_name='Solved By')),
+            ],
+            options={
+                'verbose_name': 'Problem Stats',
+                'verbose_name_plural': 'Problem Stats',
+            },
+        ),
+        migrations.RunPython(backfill_problem_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 22:17
+
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+
+
+def backfill_published_at(apps, schema_editor):
+    Problem = apps.get_model('archive', 'Problem')
+    Contest = apps.get_model('archive', 'Contest')
+
+    earliest_start = Contest.problems.through.objects.filter(
+        problem_id=OuterRef('pk')
+    ).values('problem_id').annotate(start=Min('contest__start_time')).values('start')
+    Problem.objects.update(published_at=Subquery(earliest_start))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0016_problem_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='published_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Published At'),
+        ),
+        migrations.RunPython(backfill_published_at, migrations.RunPython.noop),
+    ]
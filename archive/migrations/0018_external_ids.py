@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 22:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0017_problem_published_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='External ID'),
+        ),
+        migrations.AddField(
+            model_name='problem',
+            name='external_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True, verbose_name='External ID'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 22:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0018_external_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problem',
+            name='answer_tolerance',
+            field=models.FloatField(default=1e-06, verbose_name='Tolerance'),
+        ),
+        migrations.AddField(
+            model_name='problem',
+            name='checker',
+            field=models.CharField(choices=[('exact', 'Exact text'), ('numeric', 'Number (with tolerance)'), ('rational', 'Exact rational number'), ('tuple', 'Tuple (ordered, numeric)'), ('set', 'Set (any order, numeric)'), ('symbolic', 'Expression (symbolic equivalence)')], default='exact', max_length=20, verbose_name='Answer Checker'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 22:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rank_positions(apps, schema_editor):
+    Profile = apps.get_model('archive', 'Profile')
+    ranked = Profile.objects.filter(is_disqualified=False).order_by('-rating', 'user__username').values_list('pk', flat=True)
+    Profile.objects.bulk_update(
+        [Profile(pk=pk, rank_position=position) for position, pk in enumerate(ranked.iterator(), start=1)],
+        ['rank_position'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0019_problem_checker'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='rank_position',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='Rank Position'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['-rating', 'user'], name='profile_rating_idx'),
+        ),
+        migrations.RunPython(backfill_rank_positions, migrations.RunPython.noop),
+    ]
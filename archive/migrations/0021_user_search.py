@@ -0,0 +1,71 @@
+# Generated by Django 6.0 on 2026-10-18 22:41
+
+from django.db import migrations, models
+
+
+def backfill_username_lower(apps, schema_editor):
+    Profile = apps.get_model('archive', 'Profile')
+    profiles = Profile.objects.select_related('user').only('pk', 'user__username')
+    Profile.objects.bulk_update(
+        [Profile(pk=profile.pk, username_lower=profile.user.username.lower()) for profile in profiles.iterator()],
+        ['username_lower'],
+        batch_size=500,
+    )
+
+
+# FTS5-индекс имён (триграммы) с триггерами синхронизации. SQL записан здесь
+# буквально: миграция не должна зависеть от того, как archive.search выглядит сейчас
+CREATE_USER_SEARCH = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS archive_user_search USING fts5(
+        username_lower, content='archive_profile', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER archive_user_search_ai AFTER INSERT ON archive_profile BEGIN
+        INSERT INTO archive_user_search(rowid, username_lower) VALUES (new.id, new.username_lower);
+    END""",
+    """CREATE TRIGGER archive_user_search_ad AFTER DELETE ON archive_profile BEGIN
+        INSERT INTO archive_user_search(archive_user_search, rowid, username_lower)
+        VALUES ('delete', old.id, old.username_lower);
+    END""",
+    # Профиль сохраняется целиком при каждом User.save (например, при входе),
+    # поэтому индекс трогаем только если имя действительно изменилось
+    """CREATE TRIGGER archive_user_search_au AFTER UPDATE OF username_lower ON archive_profile
+    WHEN old.username_lower IS NOT new.username_lower BEGIN
+        INSERT INTO archive_user_search(archive_user_search, rowid, username_lower)
+        VALUES ('delete', old.id, old.username_lower);
+        INSERT INTO archive_user_search(rowid, username_lower) VALUES (new.id, new.username_lower);
+    END""",
+    "INSERT INTO archive_user_search(archive_user_search) VALUES ('rebuild')",
+]
+
+DROP_USER_SEARCH = [
+    'DROP TRIGGER IF EXISTS archive_user_search_ai',
+    'DROP TRIGGER IF EXISTS archive_user_search_ad',
+    'DROP TRIGGER IF EXISTS archive_user_search_au',
+    'DROP TABLE IF EXISTS archive_user_search',
+]
+
+
+def run_on_sqlite(statements):
+    # FTS5 есть только в SQLite; на других СУБД поиск обходится без индекса
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0020_profile_rank_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='username_lower',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=150),
+        ),
+        migrations.RunPython(backfill_username_lower, migrations.RunPython.noop),
+        migrations.RunPython(run_on_sqlite(CREATE_USER_SEARCH), run_on_sqlite(DROP_USER_SEARCH)),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 6.0 on 2026-10-18 22:58
+
+from django.db import migrations
+
+# FTS5-индексы условий задач и постов (Porter поверх unicode61) с триггерами
+# синхронизации. SQL записан буквально, как и в 0021
+CREATE_CONTENT_SEARCH = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS archive_problem_search USING fts5(
+        title, description, content='archive_problem', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER archive_problem_search_ai AFTER INSERT ON archive_problem BEGIN
+        INSERT INTO archive_problem_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER archive_problem_search_ad AFTER DELETE ON archive_problem BEGIN
+        INSERT INTO archive_problem_search(archive_problem_search, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER archive_problem_search_au AFTER UPDATE OF title, description ON archive_problem
+    WHEN old.title IS NOT new.title OR old.description IS NOT new.description BEGIN
+        INSERT INTO archive_problem_search(archive_problem_search, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO archive_problem_search(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    "INSERT INTO archive_problem_search(archive_problem_search) VALUES ('rebuild')",
+
+    """CREATE VIRTUAL TABLE IF NOT EXISTS archive_post_search USING fts5(
+        title, content, content='archive_blogpost', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER archive_post_search_ai AFTER INSERT ON archive_blogpost BEGIN
+        INSERT INTO archive_post_search(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    """CREATE TRIGGER archive_post_search_ad AFTER DELETE ON archive_blogpost BEGIN
+        INSERT INTO archive_post_search(archive_post_search, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    """CREATE TRIGGER archive_post_search_au AFTER UPDATE OF title, content ON archive_blogpost
+    WHEN old.title IS NOT new.title OR old.content IS NOT new.content BEGIN
+        INSERT INTO archive_post_search(archive_post_search, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO archive_post_search(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    "INSERT INTO archive_post_search(archive_post_search) VALUES ('rebuild')",
+]
+
+DROP_CONTENT_SEARCH = [
+    'DROP TRIGGER IF EXISTS archive_problem_search_ai',
+    'DROP TRIGGER IF EXISTS archive_problem_search_ad',
+    'DROP TRIGGER IF EXISTS archive_problem_search_au',
+    'DROP TABLE IF EXISTS archive_problem_search',
+    'DROP TRIGGER IF EXISTS archive_post_search_ai',
+    'DROP TRIGGER IF EXISTS archive_post_search_ad',
+    'DROP TRIGGER IF EXISTS archive_post_search_au',
+    'DROP TABLE IF EXISTS archive_post_search',
+]
+
+
+def run_on_sqlite(statements):
+    # FTS5 есть только в SQLite; на других СУБД поиск обходится без индекса
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement, params=None)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0021_user_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_sqlite(CREATE_CONTENT_SEARCH), run_on_sqlite(DROP_CONTENT_SEARCH)),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-19 10:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0022_content_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rank',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, editable=False),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 11:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0023_rank_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='submission',
+            name='submitted_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+def backfill_heartbeat(apps, schema_editor):
+    # Уже выполняющиеся задачи считаем отмеченными в момент запуска
+    Job = apps.get_model('archive', 'Job')
+    Job.objects.filter(status='running').update(heartbeat_at=models.F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0024_submission_time_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_heartbeat, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,30 @@
+import logging
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models import Min, OuterRef, Q, Subquery
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 
+from .checkers import CHECKER_CHOICES, AnswerError, compile_checker
+from .rendering import RENDERER_VERSION, STATEMENT_RENDERER_VERSION, render_markdown, render_statement
+
+logger = logging.getLogger(__name__)
+
 class Problem(models.Model):
     title = models.CharField("Title", max_length=200)
+    # Стабильный ключ из пакета импорта (archive.importer): повторный импорт обновляет ту же задачу
+    external_id = models.CharField("External ID", max_length=100, unique=True, null=True, blank=True)
     description = models.TextField("Problem Statement")
+    # Готовый HTML условия и версия рендерера, которым он получен
+    description_html = models.TextField(blank=True, editable=False)
+    html_version = models.CharField(max_length=16, blank=True, editable=False)
     correct_answer = models.CharField("Correct Answer", max_length=100)
+    # Как сравнивать ответ с эталоном (archive.checkers); допуск — для числовых проверок
+    checker = models.CharField("Answer Checker", max_length=20, choices=CHECKER_CHOICES, default='exact')
+    answer_tolerance = models.FloatField("Tolerance", default=1e-6)
     difficulty = models.IntegerField("Difficulty Rating", default=0)
     
     DIFFICULTY_CHOICES = [
@@ -24,22 +41,72 @@ class Problem(models.Model):
         choices=DIFFICULTY_CHOICES, 
         default='bg-primary'
     )
+    # Старт самого раннего контеста с этой задачей (None — задача вне контестов, видна сразу).
+    # Поддерживается сигналами Contest, см. refresh_published_at
+    published_at = models.DateTimeField("Published At", null=True, blank=True, editable=False, db_index=True)
+
+    @staticmethod
+    def published_q(prefix='', now=None):
+        """Условие видимости задачи для обычных пользователей; prefix — путь до задачи, например 'problem__'."""
+        now = now or timezone.now()
+        return Q(**{f'{prefix}published_at__isnull': True}) | Q(**{f'{prefix}published_at__lte': now})
+
+    @property
+    def is_published(self):
+        return self.published_at is None or self.published_at <= timezone.now()
+
+    def clean(self):
+        try:
+            self.answer_checker()
+        except AnswerError as e:
+            raise ValidationError({'correct_answer': f"The answer does not fit the {self.checker} checker: {e}"})
+
+    def answer_checker(self):
+        """Проверка с уже разобранным эталоном (общая для всех посылок задачи)."""
+        return compile_checker(self.checker, (self.correct_answer or '').strip(), self.answer_tolerance)
+
+    def check_answer(self, answer):
+        try:
+            answer_checker = self.answer_checker()
+        except AnswerError:
+            # Эталон не разбирается выбранной проверкой (например, задача импортирована в обход clean)
+            logger.warning("Problem %s: invalid answer for %s checker, falling back to exact", self.pk, self.checker)
+            answer_checker = compile_checker('exact', (self.correct_answer or '').strip(), self.answer_tolerance)
+        return answer_checker(answer)
 
     def save(self, *args, **kwargs):
         # Автоматически убираем лишние пробелы при сохранении ответа в админке
         if self.correct_answer:
             self.correct_answer = self.correct_answer.strip()
+        self.description_html = render_statement(self.description)
+        self.html_version = STATEMENT_RENDERER_VERSION
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # published_at ведут сигналы Contest: у загруженного раньше экземпляра
+            # оно может быть устаревшим, поэтому обычное сохранение его не пишет
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'published_at'
+            ]
         super().save(*args, **kwargs)
 
+    @property
+    def rendered_description(self):
+        if self.html_version == STATEMENT_RENDERER_VERSION:
+            return self.description_html
+        return render_statement(self.description)
+
     def __str__(self):
         return self.title
 
 class Contest(models.Model):
     title = models.CharField("Contest Title", max_length=200)
+    external_id = models.CharField("External ID", max_length=100, unique=True, null=True, blank=True)
     description = models.TextField("Description/Rules", blank=True)
     start_time = models.DateTimeField("Start Time")
     end_time = models.DateTimeField("End Time")
     problems = models.ManyToManyField(Problem, related_name='contests', blank=True)
+    # Когда был применён рейтинг; повторный пересчёт запрещён
+    rated_at = models.DateTimeField("Rated At", null=True, blank=True, editable=False)
 
     def is_active(self):
         now = timezone.now()
@@ -52,21 +119,164 @@ class Contest(models.Model):
         verbose_name = "Contest"
         verbose_name_plural = "Contests"
 
+def refresh_published_at(problems):
+    """Пересчитывает published_at одним UPDATE для задач из problems (queryset или список id)."""
+    earliest_start = Contest.problems.through.objects.filter(
+        problem_id=OuterRef('pk')
+    ).values('problem_id').annotate(start=Min('contest__start_time')).values('start')
+    Problem.objects.filter(pk__in=problems).update(published_at=Subquery(earliest_start))
+
+def contests_changed(contest_ids):
+    # Таблицы результатов строит archive.standings поверх этих моделей,
+    # поэтому пересборка импортируется здесь, а не на уровне модуля
+    from .jobs import enqueue_standings_rebuild
+    enqueue_standings_rebuild(contest_ids)
+
+@receiver(pre_save, sender=Contest)
+def contest_saving(sender, instance, **kwargs):
+    instance._saved_window = None
+    if instance.pk is not None:
+        instance._saved_window = Contest.objects.filter(pk=instance.pk).values_list('start_time', 'end_time').first()
+
+@receiver(post_save, sender=Contest)
+def contest_saved(sender, instance, created, **kwargs):
+    refresh_published_at(instance.problems.values('pk'))
+    # Окно контеста сдвинулось — в таблицу результатов попадают уже другие посылки
+    saved_window = getattr(instance, '_saved_window', None)
+    if saved_window is not None and saved_window != (instance.start_time, instance.end_time):
+        contests_changed([instance.pk])
+
+@receiver(pre_delete, sender=Contest)
+def contest_deleting(sender, instance, **kwargs):
+    # После удаления связи с задачами уже исчезнут — запоминаем их заранее
+    instance._published_problem_ids = list(instance.problems.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Contest)
+def contest_deleted(sender, instance, **kwargs):
+    refresh_published_at(getattr(instance, '_published_problem_ids', []))
+
+@receiver(m2m_changed, sender=Contest.problems.through)
+def contest_problems_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # problem.contests.add(...) и т.п.: меняется только эта задача, а составы — контестам из pk_set
+        if action == 'pre_clear':
+            instance._cleared_contest_ids = list(instance.contests.values_list('pk', flat=True))
+        elif action in ('post_add', 'post_remove', 'post_clear'):
+            refresh_published_at([instance.pk])
+            contests_changed(getattr(instance, '_cleared_contest_ids', []) if action == 'post_clear' else pk_set)
+    elif action == 'pre_clear':
+        instance._published_problem_ids = list(instance.problems.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        refresh_published_at(getattr(instance, '_published_problem_ids', []))
+        contests_changed([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        refresh_published_at(list(pk_set))
+        contests_changed([instance.pk])
+
 class Submission(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     problem = models.ForeignKey(Problem, on_delete=models.CASCADE)
     user_answer = models.CharField("User Answer", max_length=100)
     solution_text = models.TextField("Solution/Thinking", blank=True, null=True)
     is_correct = models.BooleanField("Is Correct?", default=False)
-    submitted_at = models.DateTimeField(auto_now_add=True)
+    # Время запроса, а не записи: посылка из очереди ingest пишется позже
+    submitted_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            # Окно контеста по задачам: таблица результатов, рейтинг, выгрузки
+            models.Index(fields=['problem', 'submitted_at'], name='submission_problem_time_idx'),
+            # Последние посылки пользователя и пересчёт его ячеек в таблице
+            models.Index(fields=['author', 'submitted_at'], name='submission_author_time_idx'),
+            # Общая лента посылок
+            models.Index(fields=['submitted_at'], name='submission_time_idx'),
+            # Django пишет is_correct=True как голое "is_correct" в WHERE, которое SQLite не
+            # использует как ключ составного индекса, поэтому вердикт — условие частичных индексов
+            models.Index(
+                fields=['author', 'problem'], condition=models.Q(is_correct=True), name='submission_author_solved_idx'
+            ),
+            models.Index(
+                fields=['submitted_at'], condition=models.Q(is_correct=True), name='submission_correct_time_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.author.username} - {self.problem.title} ({'OK' if self.is_correct else 'WA'})"
 
+class UserSolved(models.Model):
+    """Задача, решённая пользователем, и время первого правильного ответа."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='solved_problems')
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='solved_by')
+    first_solved_at = models.DateTimeField("First Solved")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'problem'], name='unique_user_solved'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} solved {self.problem.title}"
+
+class ProblemStats(models.Model):
+    """Агрегаты по задаче: поддерживаются при каждой посылке и смене вердикта."""
+    problem = models.OneToOneField(Problem, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.IntegerField("Attempts", default=0)
+    accepted = models.IntegerField("Accepted", default=0)
+    solvers = models.IntegerField("Solved By", default=0)
+
+    class Meta:
+        verbose_name = "Problem Stats"
+        verbose_name_plural = "Problem Stats"
+
+    @property
+    def acceptance(self):
+        """Доля правильных посылок в процентах."""
+        return round(100 * self.accepted / self.attempts) if self.attempts else 0
+
+    def __str__(self):
+        return f"{self.problem.title}: {self.solvers} solvers, {self.accepted}/{self.attempts}"
+
+class StandingsEntry(models.Model):
+    """Строка таблицы результатов: итог участника в контесте."""
+    contest = models.ForeignKey(Contest, on_delete=models.CASCADE, related_name='standings')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='standings_entries')
+    solved = models.IntegerField("Solved", default=0)
+    penalty = models.IntegerField("Penalty", default=0)
+
+    class Meta:
+        verbose_name = "Standings Entry"
+        verbose_name_plural = "Standings"
+        constraints = [
+            models.UniqueConstraint(fields=['contest', 'user'], name='unique_standings_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['contest', '-solved', 'penalty'], name='standings_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} @ {self.contest.title}: {self.solved} / {self.penalty}"
+
+class StandingsCell(models.Model):
+    """Ячейка таблицы результатов: попытки участника по одной задаче контеста."""
+    contest = models.ForeignKey(Contest, on_delete=models.CASCADE, related_name='standings_cells')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='standings_cells')
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='standings_cells')
+    # Неверные попытки до первого правильного ответа (или все, если задача не решена)
+    attempts = models.IntegerField("Failed Attempts", default=0)
+    first_ac_at = models.DateTimeField("First Accepted", null=True, blank=True)
+    penalty = models.IntegerField("Penalty", default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['contest', 'user', 'problem'], name='unique_standings_cell'),
+        ]
+
 class Rank(models.Model):
     title = models.CharField("Rank Title", max_length=50)
     min_rating = models.IntegerField("Minimum Rating", default=0)
     color_code = models.CharField("Color (HEX)", max_length=7, default="#808080")
+    # Вместе с числом рангов и max(id) — версия таблицы для RankResolver
+    updated_at = models.DateTimeField(auto_now=True, editable=False)
 
     class Meta:
         verbose_name = "Rank Setting"
@@ -76,12 +286,29 @@ class Rank(models.Model):
     def __str__(self):
         return f"{self.title} (from {self.min_rating})"
 
+def normalize_username(username):
+    return username.lower()
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     is_disqualified = models.BooleanField(default=False, verbose_name="Disqualified")
     reason = models.CharField(max_length=255, blank=True, verbose_name="Ban Reason")
     rating = models.IntegerField(default=0, verbose_name="Rating")
+    # Число различных решённых задач; поддерживается вместе с UserSolved
+    solved_count = models.IntegerField(default=0, verbose_name="Solved Problems", editable=False)
+    # Место в общем рейтинге (порядок -rating, username); пересчитывается
+    # refresh_rank_positions после каждого применения рейтинга. None — дисквалифицирован
+    # или зарегистрировался после последнего пересчёта
+    rank_position = models.IntegerField(null=True, blank=True, db_index=True, editable=False, verbose_name="Rank Position")
     friends = models.ManyToManyField(User, related_name='user_friends', blank=True)
+    # Имя в нижнем регистре для поиска: префикс — диапазоном по индексу,
+    # подстрока — через FTS5-таблицу archive_user_search (см. archive.search)
+    username_lower = models.CharField(max_length=150, db_index=True, editable=False, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating', 'user'], name='profile_rating_idx'),
+        ]
     
     def __str__(self):
         return f"Profile: {self.user.username}"
@@ -89,12 +316,19 @@ class Profile(models.Model):
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
-        Profile.objects.get_or_create(user=instance)
+        # Место в рейтинге новичок получит при следующем refresh_rank_positions:
+        # «последний + 1» при одновременных регистрациях давал одинаковые места
+        Profile.objects.get_or_create(
+            user=instance, defaults={'username_lower': normalize_username(instance.username)}
+        )
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     if hasattr(instance, 'profile'):
-        instance.profile.save()
+        # Только имя: закешированный instance.profile может быть устаревшим (например,
+        # rank_position после пересчёта), а User сохраняется при каждом входе
+        instance.profile.username_lower = normalize_username(instance.username)
+        instance.profile.save(update_fields=['username_lower'])
 
 class RatingHistory(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='rating_history')
@@ -108,6 +342,8 @@ class RatingHistory(models.Model):
 class BlogPost(models.Model):
     title = models.CharField("Title", max_length=250)
     content = models.TextField("Content")
+    content_html = models.TextField(blank=True, editable=False)
+    html_version = models.CharField(max_length=16, blank=True, editable=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blog_posts')
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -118,6 +354,23 @@ class BlogPost(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Ключи keyset-пагинации ленты сообщества
+            models.Index(fields=['-created_at', '-id'], name='blogpost_feed_idx'),
+            models.Index(fields=['is_featured', '-created_at', '-id'], name='blogpost_featured_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.content_html = render_markdown(self.content)
+        self.html_version = RENDERER_VERSION
+        super().save(*args, **kwargs)
+
+    @property
+    def rendered_content(self):
+        # Устаревший HTML (другая версия рендерера) не отдаём — рендерим через кеш до фоновой перерисовки
+        if self.html_version == RENDERER_VERSION:
+            return self.content_html
+        return render_markdown(self.content)
 
     def __str__(self):
         return f"{self.title} by {self.author.username}"
@@ -126,9 +379,72 @@ class Comment(models.Model):
     post = models.ForeignKey(BlogPost, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField("Comment")
+    text_html = models.TextField(blank=True, editable=False)
+    html_version = models.CharField(max_length=16, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 # Новое поле для ответов
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies')
 
+    def save(self, *args, **kwargs):
+        self.text_html = render_markdown(self.text)
+        self.html_version = RENDERER_VERSION
+        super().save(*args, **kwargs)
+
+    @property
+    def rendered_text(self):
+        if self.html_version == RENDERER_VERSION:
+            return self.text_html
+        return render_markdown(self.text)
+
+    def __str__(self):
+        return f"Comment by {self.author.username} on {self.post.title}"
+
+class Job(models.Model):
+    """Фоновая задача для тяжёлых действий персонала (рейтинг, пересборка таблиц и т.п.)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField("Kind", max_length=50)
+    payload = models.JSONField("Payload", default=dict, blank=True)
+    status = models.CharField("Status", max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    progress = models.IntegerField("Progress", default=0)
+    total = models.IntegerField("Total", default=0)
+    result = models.CharField("Result", max_length=255, blank=True)
+    error = models.TextField("Error", blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Последняя отметка воркера о выполнении (аренда); давно не обновлявшаяся
+    # RUNNING-задача брошена упавшим воркером, см. jobs.fail_abandoned_jobs
+    heartbeat_at = models.DateTimeField(null=True, blank=True, editable=False)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='job_queue_idx'),
+        ]
+
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    def duration(self):
+        if not self.started_at:
+            return None
+        return (self.finished_at or timezone.now()) - self.started_at
+
+    def percent(self):
+        if not self.total:
+            return 100 if self.status == self.DONE else 0
+        return min(100, self.progress * 100 // self.total)
+
     def __str__(self):
-        return f"Comment by {self.author.username} on {self.post.title}"
\ No newline at end of file
+        return f"#{self.id} {self.kind} ({self.status})"
\ No newline at end of file
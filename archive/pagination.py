@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    """Курсор keyset-пагинации: значения ключа сортировки последней строки страницы."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, types):
+    """Разбирает курсор; при любой ошибке возвращает None (то есть первую страницу)."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if len(values) != len(types):
+            return None
+        return [datetime.fromisoformat(v) if t is datetime else t(v) for v, t in zip(values, types)]
+    except (ValueError, TypeError):
+        return None
+
+
+def after_cursor(fields, values):
+    """
+    Условие "строго после курсора" для сортировки по убыванию всех полей:
+    (a < x) OR (a = x AND b < y) OR (a = x AND b = y AND c < z) ...
+    """
+    condition = Q()
+    for i, field in enumerate(fields):
+        step = Q(**{f'{field}__lt': values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            step &= Q(**{prev_field: prev_value})
+        condition |= step
+    return condition
+
+
+def keyset_page(queryset, fields, token, types, page_size):
+    """
+    Одна страница keyset-пагинации по убыванию ``fields``.
+
+    Возвращает (строки, курсор следующей страницы или None). Последнее поле
+    должно быть уникальным (обычно id), чтобы порядок был однозначным.
+    """
+    cursor = decode_cursor(token, types)
+    if cursor is not None:
+        queryset = queryset.filter(after_cursor(fields, cursor))
+    rows = list(queryset.order_by(*[f'-{field}' for field in fields])[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor([getattr(rows[-1], field) for field in fields])
+    return rows, next_cursor
@@ -0,0 +1,52 @@
+from django.db import transaction
+
+from .models import BlogPost, Comment, Problem
+from .rendering import RENDERER_VERSION, STATEMENT_RENDERER_VERSION, render_markdown_many, render_statement_many
+
+# (модель, поле с исходником, поле с HTML, пакетный рендерер, текущая версия рендерера)
+PRERENDERED_FIELDS = [
+    (BlogPost, 'content', 'content_html', render_markdown_many, RENDERER_VERSION),
+    (Comment, 'text', 'text_html', render_markdown_many, RENDERER_VERSION),
+    (Problem, 'description', 'description_html', render_statement_many, STATEMENT_RENDERER_VERSION),
+]
+
+
+def stale_rows(model, version):
+    return model.objects.exclude(html_version=version)
+
+
+def has_stale_html():
+    return any(stale_rows(model, version).exists() for model, _, _, _, version in PRERENDERED_FIELDS)
+
+
+def count_stale_html():
+    return sum(stale_rows(model, version).count() for model, _, _, _, version in PRERENDERED_FIELDS)
+
+
+def rerender_stale_html(batch_size=500, progress=None):
+    """
+    Перерисовывает HTML всех строк, отрендеренных другой версией рендерера.
+
+    Строки обрабатываются пачками по первичному ключу; каждая пачка пишется
+    одним bulk_update в своей транзакции. progress(done) вызывается после
+    каждой пачки. Возвращает число обновлённых строк.
+    """
+    done = 0
+    for model, source, target, render_many, version in PRERENDERED_FIELDS:
+        last_pk = 0
+        while True:
+            batch = list(
+                stale_rows(model, version).filter(pk__gt=last_pk).order_by('pk').only('pk', source)[:batch_size]
+            )
+            if not batch:
+                break
+            for obj, html in zip(batch, render_many([getattr(obj, source) for obj in batch])):
+                setattr(obj, target, html)
+                obj.html_version = version
+            with transaction.atomic():
+                model.objects.bulk_update(batch, [target, 'html_version'])
+            last_pk = batch[-1].pk
+            done += len(batch)
+            if progress:
+                progress(done)
+    return done
@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Problem, ProblemStats, Submission
+
+STATS_FIELDS = ('attempts', 'accepted', 'solvers')
+
+
+def bump_problem_stats(problem_id, **deltas):
+    """Прибавляет deltas (attempts/accepted/solvers) к статистике задачи, создавая строку при необходимости."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    if not ProblemStats.objects.filter(problem_id=problem_id).update(**changes):
+        ProblemStats.objects.get_or_create(problem_id=problem_id)
+        ProblemStats.objects.filter(problem_id=problem_id).update(**changes)
+
+
+def compute_problem_stats(problems=None):
+    """Статистика задач (по умолчанию всех) по посылкам одним GROUP BY: {problem_id: (attempts, accepted, solvers)}."""
+    submissions = Submission.objects.all()
+    if problems is not None:
+        submissions = submissions.filter(problem__in=problems)
+    rows = submissions.values('problem_id').annotate(
+        attempts=Count('id'),
+        accepted=Count('id', filter=Q(is_correct=True)),
+        solvers=Count('author_id', distinct=True, filter=Q(is_correct=True)),
+    ).values_list('problem_id', *STATS_FIELDS)
+    return {problem_id: tuple(values) for problem_id, *values in rows}
+
+
+def problem_stats_drift(computed):
+    """Строки ProblemStats, расходящиеся с посылками (включая недостающие)."""
+    stored = {
+        problem_id: tuple(values)
+        for problem_id, *values in ProblemStats.objects.values_list('problem_id', *STATS_FIELDS)
+    }
+    return [
+        ProblemStats(problem_id=problem_id, **dict(zip(STATS_FIELDS, computed.get(problem_id, (0, 0, 0)))))
+        for problem_id in Problem.objects.values_list('id', flat=True)
+        if stored.get(problem_id) != computed.get(problem_id, (0, 0, 0))
+    ]
+
+
+def recompute_problem_stats(check=False):
+    """Пересчитывает статистику задач целиком и переписывает только разошедшиеся строки. Возвращает их число."""
+    with transaction.atomic():
+        drifted = problem_stats_drift(compute_problem_stats())
+        if drifted and not check:
+            ProblemStats.objects.bulk_create(
+                drifted, batch_size=500,
+                update_conflicts=True, unique_fields=['problem'], update_fields=list(STATS_FIELDS)
+            )
+    return len(drifted)
+
+
+def refresh_problem_stats(problem_id):
+    """Пересчитывает статистику одной задачи (например, после перепроверки)."""
+    attempts, accepted, solvers = compute_problem_stats([problem_id]).get(problem_id, (0, 0, 0))
+    ProblemStats.objects.update_or_create(
+        problem_id=problem_id, defaults={'attempts': attempts, 'accepted': accepted, 'solvers': solvers}
+    )
@@ -0,0 +1,130 @@
+import threading
+from bisect import bisect_right
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Profile, Rank
+
+# Версия таблицы рангов в кеше Django: пока ключ жив, resolve не ходит в БД
+RANK_VERSION_KEY = 'ranks:version'
+
+
+class RankResolver:
+    """
+    Пороги Rank в памяти процесса: отсортированный список min_rating и
+    соответствующие ранги, звание по рейтингу ищется bisect'ом.
+
+    Версия таблицы — число рангов, наибольший id и Rank.updated_at — считается
+    одним агрегатом и хранится в кеше Django RANK_VERSION_TIMEOUT секунд, так
+    что обычный resolve обходится без запросов. Сохранение или удаление Rank
+    удаляет ключ: с общим кешем все процессы видят изменение сразу, с кешем в
+    памяти процесса (LocMem) — не позже чем через RANK_VERSION_TIMEOUT; так же
+    подхватываются и правки в обход сигналов (queryset.update).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._thresholds = []
+        self._ranks = []
+        self.stats = {'lookups': 0, 'loads': 0}
+
+    @staticmethod
+    def version():
+        version = cache.get(RANK_VERSION_KEY)
+        if version is None:
+            stamp = Rank.objects.aggregate(count=Count('id'), top=Max('id'), updated=Max('updated_at'))
+            version = stamp['count'], stamp['top'], stamp['updated']
+            cache.set(RANK_VERSION_KEY, version, getattr(settings, 'RANK_VERSION_TIMEOUT', 60))
+        return version
+
+    def _table(self):
+        version = self.version()
+        with self._lock:
+            if version == self._version:
+                return self._thresholds, self._ranks
+        ranks = list(Rank.objects.order_by('min_rating', 'pk'))
+        with self._lock:
+            self._thresholds = [rank.min_rating for rank in ranks]
+            self._ranks = ranks
+            self._version = version
+            self.stats['loads'] += 1
+            return self._thresholds, self._ranks
+
+    @staticmethod
+    def _find(thresholds, ranks, rating):
+        # Последний порог <= rating (при равных порогах — ранг с большим id)
+        i = bisect_right(thresholds, rating)
+        return ranks[i - 1] if i else None
+
+    def resolve(self, rating):
+        """Rank для рейтинга или None, если рейтинг ниже всех порогов."""
+        thresholds, ranks = self._table()
+        with self._lock:
+            self.stats['lookups'] += 1
+        return self._find(thresholds, ranks, rating)
+
+    def annotate(self, items):
+        """
+        Проставляет profile.rank всем элементам списка за один проход.
+
+        Элементы — Profile, User (берётся user.profile) или строки с ключом
+        'user', как у scoreboard_rows. Профили должны быть уже загружены
+        (select_related), иначе каждый элемент потянет свой запрос.
+        """
+        items = list(items)
+        thresholds, ranks = self._table()
+        for item in items:
+            profile = _profile_of(item)
+            if profile is not None:
+                profile.rank = self._find(thresholds, ranks, profile.rating)
+        with self._lock:
+            self.stats['lookups'] += len(items)
+        return items
+
+    def clear(self):
+        cache.delete(RANK_VERSION_KEY)
+        with self._lock:
+            self._version = None
+            for stat in self.stats:
+                self.stats[stat] = 0
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, ranks=len(self._ranks), version=self._version)
+
+
+def _profile_of(item):
+    if isinstance(item, Profile):
+        return item
+    if isinstance(item, dict):
+        item = item.get('user')
+    if isinstance(item, User):
+        return getattr(item, 'profile', None)
+    return None
+
+
+rank_resolver = RankResolver()
+
+
+def _forget_rank_version():
+    cache.delete(RANK_VERSION_KEY)
+
+
+@receiver(post_save, sender=Rank)
+@receiver(post_delete, sender=Rank)
+def rank_changed(sender, **kwargs):
+    # Сразу и ещё раз после коммита: иначе другой процесс успел бы закешировать
+    # версию, посчитанную до коммита, на весь RANK_VERSION_TIMEOUT
+    _forget_rank_version()
+    transaction.on_commit(_forget_rank_version)
+
+
+def annotate_ranks(items):
+    return rank_resolver.annotate(items)
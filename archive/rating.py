@@ -0,0 +1,135 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Contest, Profile, RatingHistory
+from .standings import compute_standings, contest_submissions
+
+# Коэффициент Эло: максимальное изменение рейтинга за одну "партию"
+K_FACTOR = 30
+
+# Бонус за первый и второй рейтинговый контест (если решена хотя бы одна задача)
+NEWCOMER_BONUS = {0: 50, 1: 25}
+
+# Сколько строк попарной матрицы считаем за раз, чтобы память не росла как n²
+BLOCK_SIZE = 1024
+
+# Размер пачки bulk_update при пересчёте мест в общем рейтинге
+RANK_BATCH_SIZE = 500
+
+
+def rating_changes(ratings, solved, penalty, k=K_FACTOR):
+    """
+    Изменения рейтинга для всех участников контеста.
+
+    Каждый участник сравнивается с каждым: ожидаемый счёт по формуле Эло,
+    фактический — 1/0 по числу решённых задач, а при равенстве 0.75/0.25
+    по штрафу (0.5 при полном равенстве). Попарные матрицы строятся блоками
+    строк и сворачиваются по строке одним broadcast-шагом на блок.
+    """
+    ratings = np.asarray(ratings, dtype=np.float64)
+    solved = np.asarray(solved, dtype=np.int64)
+    penalty = np.asarray(penalty, dtype=np.int64)
+    n = len(ratings)
+    changes = np.zeros(n, dtype=np.float64)
+
+    # 1 / (1 + 10^((r_j - r_i) / 400)) == q_i / (q_i + q_j), где q = 10^(r / 400)
+    strength = 10 ** (ratings / 400)
+
+    for start in range(0, n, BLOCK_SIZE):
+        rows = slice(start, min(start + BLOCK_SIZE, n))
+        q_i, q_j = strength[rows, None], strength[None, :]
+        s_i, s_j = solved[rows, None], solved[None, :]
+        p_i, p_j = penalty[rows, None], penalty[None, :]
+
+        expected = (q_i / (q_i + q_j)).sum(axis=1)
+
+        same_solved = s_i == s_j
+        wins = np.count_nonzero(s_i > s_j, axis=1)
+        better_penalty = np.count_nonzero(same_solved & (p_i < p_j), axis=1)
+        worse_penalty = np.count_nonzero(same_solved & (p_i > p_j), axis=1)
+        full_ties = np.count_nonzero(same_solved & (p_i == p_j), axis=1)
+        actual = wins + 0.75 * better_penalty + 0.25 * worse_penalty + 0.5 * full_ties
+
+        # Диагональ (участник против себя) даёт 0.5 в обеих суммах и взаимно сокращается
+        changes[rows] = k * (actual - expected)
+
+    return changes
+
+
+def newcomer_bonus(solved, past_contests):
+    if solved > 0:
+        return NEWCOMER_BONUS.get(past_contests, 0)
+    return 0
+
+
+class ContestAlreadyRated(Exception):
+    pass
+
+
+def apply_contest_rating(contest):
+    """
+    Считает и применяет рейтинг за контест одной транзакцией.
+
+    Отметка Contest.rated_at ставится условным UPDATE в начале транзакции,
+    поэтому повторный (в том числе параллельный) запуск получает
+    ContestAlreadyRated и ничего не меняет. Возвращает число участников.
+    """
+    rated_at = timezone.now()
+    with transaction.atomic():
+        marked = Contest.objects.filter(pk=contest.pk, rated_at__isnull=True).update(rated_at=rated_at)
+        if not marked:
+            raise ContestAlreadyRated(contest.title)
+
+        participants = compute_standings(contest)
+        if not participants:
+            transaction.set_rollback(True)
+            return 0
+
+        profiles = [p['user'].profile for p in participants]
+        changes = rating_changes(
+            [profile.rating for profile in profiles],
+            [p['solved'] for p in participants],
+            [p['penalty'] for p in participants]
+        )
+        # Один GROUP BY по всем участникам; подзапрос вместо списка id из-за лимита параметров SQLite
+        past_contests = dict(
+            RatingHistory.objects.filter(user__in=contest_submissions(contest).values('author_id'))
+            .values('user_id').annotate(count=Count('id')).values_list('user_id', 'count')
+        )
+
+        history = []
+        for p, profile, change in zip(participants, profiles, changes):
+            bonus = newcomer_bonus(p['solved'], past_contests.get(profile.user_id, 0))
+            profile.rating += int(change + bonus)
+            history.append(RatingHistory(user_id=profile.user_id, rating=profile.rating, contest=contest))
+
+        Profile.objects.bulk_update(profiles, ['rating'], batch_size=500)
+        RatingHistory.objects.bulk_create(history, batch_size=500)
+        refresh_rank_positions()
+
+    contest.rated_at = rated_at
+    return len(participants)
+
+
+def refresh_rank_positions():
+    """
+    Пересчитывает Profile.rank_position: места 1..n в порядке (-rating, username)
+    среди недисквалифицированных, у дисквалифицированных — None.
+
+    Профили читаются одним проходом по индексу рейтинга, а записываются только
+    те, чьё место изменилось. Возвращает число обновлённых профилей.
+    """
+    ranked = Profile.objects.filter(is_disqualified=False).order_by('-rating', 'user__username').values_list(
+        'pk', 'rank_position'
+    )
+    changed = [
+        Profile(pk=pk, rank_position=position)
+        for position, (pk, current) in enumerate(ranked.iterator(chunk_size=2000), start=1)
+        if current != position
+    ]
+    with transaction.atomic():
+        Profile.objects.bulk_update(changed, ['rank_position'], batch_size=RANK_BATCH_SIZE)
+        unranked = Profile.objects.filter(is_disqualified=True, rank_position__isnull=False).update(rank_position=None)
+    return len(changed) + unranked
@@ -0,0 +1,87 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.db import transaction
+
+from .checkers import judge_chunk
+from .judging import rebuild_problem_solved
+from .models import Submission
+from .problem_stats import refresh_problem_stats
+from .standings import rebuild_scoreboard
+from .throttle import submission_throttle
+
+# Посылок в одной пачке: столько читается из БД, проверяется и пишется за раз
+REJUDGE_CHUNK_SIZE = 5000
+# Сколько id передаём в одном UPDATE (ниже лимита параметров SQLite)
+WRITE_BATCH_SIZE = 900
+
+
+def _chunks(rows, size):
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _judged(problem, chunks, processes):
+    """Результаты judge_chunk по пачкам; с processes > 1 — в пуле процессов, не больше 2 пачек на процесс в работе."""
+    args = (problem.checker, problem.correct_answer.strip(), problem.answer_tolerance)
+    if processes <= 1:
+        for chunk in chunks:
+            yield len(chunk), judge_chunk(*args, chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        pending = []
+        for chunk in chunks:
+            pending.append((len(chunk), pool.submit(judge_chunk, *args, chunk)))
+            if len(pending) >= 2 * processes:
+                size, future = pending.pop(0)
+                yield size, future.result()
+        for size, future in pending:
+            yield size, future.result()
+
+
+def rejudge_problem(problem, chunk_size=REJUDGE_CHUNK_SIZE, processes=1, dry_run=False, progress=None):
+    """
+    Перепроверяет все посылки задачи текущей проверкой и эталоном.
+
+    Посылки читаются потоком (id, ответ, вердикт) пачками по chunk_size,
+    изменившиеся вердикты пишутся в транзакции на пачку. После
+    этого пересобираются производные данные задачи: UserSolved и solved_count,
+    ProblemStats и таблицы результатов контестов с этой задачей (рейтинг уже
+    рассчитанных контестов не пересчитывается). progress(done) вызывается
+    после каждой пачки. Возвращает сводку со счётчиками.
+    """
+    rows = Submission.objects.filter(problem=problem).order_by('id').values_list(
+        'id', 'user_answer', 'is_correct'
+    ).iterator(chunk_size=chunk_size)
+
+    checked = to_correct = to_wrong = 0
+    for size, flipped in _judged(problem, _chunks(rows, chunk_size), processes):
+        checked += size
+        to_correct += sum(1 for _, is_correct in flipped if is_correct)
+        to_wrong += sum(1 for _, is_correct in flipped if not is_correct)
+        if flipped and not dry_run:
+            # Вердикт булев, поэтому вместо bulk_update (CASE WHEN на каждую строку)
+            # хватает двух UPDATE ... WHERE id IN (...) на пачку
+            with transaction.atomic():
+                for is_correct in (True, False):
+                    pks = [pk for pk, verdict in flipped if verdict is is_correct]
+                    for start in range(0, len(pks), WRITE_BATCH_SIZE):
+                        Submission.objects.filter(pk__in=pks[start:start + WRITE_BATCH_SIZE]).update(
+                            is_correct=is_correct
+                        )
+        if progress:
+            progress(checked)
+
+    summary = {
+        'checked': checked, 'flipped': to_correct + to_wrong, 'to_correct': to_correct, 'to_wrong': to_wrong,
+        'solvers_added': 0, 'solvers_removed': 0, 'contests': 0,
+    }
+    if summary['flipped'] and not dry_run:
+        summary['solvers_added'], summary['solvers_removed'] = rebuild_problem_solved(problem.pk)
+        refresh_problem_stats(problem.pk)
+        submission_throttle.forget_recent(problem.pk)
+        for contest in problem.contests.all():
+            rebuild_scoreboard(contest)
+            summary['contests'] += 1
+    return summary
@@ -0,0 +1,200 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import bleach
+import bleach.sanitizer
+import markdown
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.html import linebreaks
+
+ALLOWED_TAGS = [
+    'p', 'br', 'strong', 'em', 'u', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'blockquote', 'code', 'pre', 'hr', 'ul', 'ol', 'li', 'a', 'img',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td', 'sup', 'sub'
+]
+
+ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title'],
+    'img': ['src', 'alt', 'title'],
+    '*': []
+}
+
+MARKDOWN_EXTENSIONS = ['tables', 'fenced_code', 'codehilite']
+MARKDOWN_EXTENSION_CONFIGS = {
+    'codehilite': {'use_pygments': False}
+}
+
+# Версия рендерера: меняется вместе с белым списком, расширениями и версиями библиотек,
+# поэтому закешированный HTML старой конфигурации просто перестаёт находиться
+RENDERER_VERSION = hashlib.sha1(repr((
+    ALLOWED_TAGS, sorted(ALLOWED_ATTRIBUTES.items()), MARKDOWN_EXTENSIONS,
+    sorted(MARKDOWN_EXTENSION_CONFIGS.items()), markdown.__version__, bleach.__version__
+)).encode()).hexdigest()[:12]
+
+
+_thread_state = threading.local()
+
+
+def _converter():
+    """Markdown-конвертер текущего потока: расширения регистрируются один раз."""
+    converter = getattr(_thread_state, 'converter', None)
+    if converter is None:
+        converter = _thread_state.converter = markdown.Markdown(
+            extensions=MARKDOWN_EXTENSIONS,
+            extension_configs=MARKDOWN_EXTENSION_CONFIGS
+        )
+    return converter
+
+
+def _cleaner():
+    """bleach.Cleaner текущего потока (экземпляр не потокобезопасен)."""
+    cleaner = getattr(_thread_state, 'cleaner', None)
+    if cleaner is None:
+        cleaner = _thread_state.cleaner = bleach.sanitizer.Cleaner(
+            tags=ALLOWED_TAGS,
+            attributes=ALLOWED_ATTRIBUTES,
+            strip=True
+        )
+    return cleaner
+
+
+def render_uncached(text):
+    """Преобразует Markdown в HTML и очищает опасное содержимое."""
+    converter = _converter()
+    try:
+        html = converter.convert(text)
+    finally:
+        # Сбрасываем состояние (сноски, ссылки и т.п.), чтобы оно не протекло в следующий текст
+        converter.reset()
+    return _cleaner().clean(html)
+
+
+class RenderCache:
+    """
+    Двухуровневый кеш очищенного HTML по хешу текста.
+
+    Первый уровень — ограниченный LRU в памяти процесса, второй — кеш Django
+    (общий для процессов, если настроен соответствующий бэкенд).
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    @staticmethod
+    def key(text):
+        return f"markdown:{RENDERER_VERSION}:{hashlib.sha256(text.encode()).hexdigest()}"
+
+    @property
+    def shared(self):
+        return caches[getattr(settings, 'MARKDOWN_CACHE_ALIAS', 'default')]
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get_local(self, key):
+        with self._lock:
+            html = self._local.get(key)
+            if html is not None:
+                self._local.move_to_end(key)
+                self.stats['local_hits'] += 1
+            return html
+
+    def put_local(self, key, html):
+        with self._lock:
+            self._local[key] = html
+            self._local.move_to_end(key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def render(self, text):
+        key = self.key(text)
+        html = self.get_local(key)
+        if html is not None:
+            return html
+        html = self.shared.get(key)
+        if html is not None:
+            self._count('shared_hits')
+        else:
+            self._count('misses')
+            html = render_uncached(text)
+            self.shared.set(key, html, getattr(settings, 'MARKDOWN_CACHE_TIMEOUT', 24 * 60 * 60))
+        self.put_local(key, html)
+        return html
+
+    def render_many(self, texts):
+        """Рендерит список текстов: один проход по LRU, один get_many/set_many к общему кешу."""
+        keys = [self.key(text) for text in texts]
+        found = {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            html = self.get_local(key)
+            if html is not None:
+                found[key] = html
+            else:
+                missing[key] = text
+
+        if missing:
+            shared = self.shared.get_many(list(missing))
+            with self._lock:
+                self.stats['shared_hits'] += len(shared)
+                self.stats['misses'] += len(missing) - len(shared)
+            rendered = {key: render_uncached(text) for key, text in missing.items() if key not in shared}
+            if rendered:
+                self.shared.set_many(rendered, getattr(settings, 'MARKDOWN_CACHE_TIMEOUT', 24 * 60 * 60))
+            for key, html in {**shared, **rendered}.items():
+                self.put_local(key, html)
+                found[key] = html
+
+        return [found[key] for key in keys]
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+            for stat in self.stats:
+                self.stats[stat] = 0
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats, local_size=len(self._local), maxsize=self.maxsize)
+
+
+render_cache = RenderCache(getattr(settings, 'MARKDOWN_CACHE_SIZE', 2048))
+
+
+def render_markdown(text):
+    """Очищенный HTML для Markdown-текста (через кеш)."""
+    if not text:
+        return ''
+    return render_cache.render(text)
+
+
+def render_markdown_many(texts):
+    """Пакетный вариант render_markdown для списков: порядок результатов совпадает с texts."""
+    texts = [text or '' for text in texts]
+    non_empty = [text for text in texts if text]
+    rendered = iter(render_cache.render_many(non_empty)) if non_empty else iter(())
+    return [next(rendered) if text else '' for text in texts]
+
+
+# Условия задач выводятся не через Markdown, а как текст с переносами строк
+# (формулы обрабатывает MathJax на клиенте), поэтому у них своя версия
+STATEMENT_RENDERER_VERSION = 'linebreaks-1'
+
+
+def render_statement(text):
+    """HTML условия задачи: экранированный текст с абзацами и переносами."""
+    if not text:
+        return ''
+    return linebreaks(text, autoescape=True)
+
+
+def render_statement_many(texts):
+    return [render_statement(text) for text in texts]
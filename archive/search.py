@@ -0,0 +1,250 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+from .models import BlogPost, Problem, Profile, normalize_username
+
+# Сколько пользователей отдаёт поиск (и подсказки в строке поиска)
+USER_SEARCH_LIMIT = 20
+TYPEAHEAD_LIMIT = 8
+
+# Триграммный токенизатор не находит запросы короче трёх символов
+TRIGRAM_MIN_LENGTH = 3
+
+# Поиск по задачам и постам: результатов на странице и сколько страниц вглубь
+# отдаём (OFFSET по ранжированной выдаче дорожает с глубиной)
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGES = 50
+# Длина фрагмента с подсветкой в токенах и максимум слов в запросе
+SNIPPET_TOKENS = 16
+MAX_QUERY_TERMS = 8
+
+# Маркеры подсветки в snippet(): управляющие символы не встречаются в тексте,
+# поэтому фрагмент можно целиком экранировать и лишь потом вставить <mark>
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+
+class FtsIndex:
+    """
+    FTS5-таблица с внешним содержимым (content=source) и триггерами синхронизации.
+
+    Индекс хранит только токены: текст берётся из исходной таблицы по rowid = id.
+    Триггеры на INSERT/DELETE и на UPDATE индексируемых колонок обновляют
+    индекс в той же транзакции, что и запись строки, включая bulk_create и UPDATE
+    из миграций. Есть только на SQLite; SQLite удаляет триггеры вместе с
+    таблицей, поэтому после миграций, пересобирающих source, индекс нужно
+    переустановить командой rebuild_search_index.
+    """
+
+    def __init__(self, table, source, columns, tokenize, weights=None):
+        self.table = table
+        self.source = source
+        self.columns = columns
+        self.tokenize = tokenize
+        self.weights = weights
+
+    def _values(self, row):
+        return ', '.join(f'{row}.{column}' for column in self.columns)
+
+    def triggers(self):
+        columns = ', '.join(self.columns)
+        insert = f"INSERT INTO {self.table}(rowid, {columns}) VALUES (new.id, {self._values('new')});"
+        delete = (
+            f"INSERT INTO {self.table}({self.table}, rowid, {columns}) "
+            f"VALUES ('delete', old.id, {self._values('old')});"
+        )
+        # Строка сохраняется целиком и при изменении неиндексируемых полей,
+        # поэтому индекс трогаем только если текст действительно изменился
+        changed = ' OR '.join(f'old.{column} IS NOT new.{column}' for column in self.columns)
+        return {
+            f'{self.table}_ai': f"AFTER INSERT ON {self.source} BEGIN {insert} END",
+            f'{self.table}_ad': f"AFTER DELETE ON {self.source} BEGIN {delete} END",
+            f'{self.table}_au': (
+                f"AFTER UPDATE OF {columns} ON {self.source} WHEN {changed} BEGIN {delete} {insert} END"
+            ),
+        }
+
+    def install(self, conn=connection):
+        """Создаёт таблицу, пересоздаёт триггеры и заполняет индекс заново из source."""
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5({', '.join(self.columns)}, "
+                f"content='{self.source}', content_rowid='id', tokenize='{self.tokenize}')"
+            )
+            for name, body in self.triggers().items():
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                cursor.execute(f'CREATE TRIGGER {name} {body}')
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')")
+        _fts_tables.pop((conn.alias, self.table), None)
+
+    def drop(self, conn=connection):
+        with conn.cursor() as cursor:
+            for name in self.triggers():
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+        _fts_tables.pop((conn.alias, self.table), None)
+
+    def available(self):
+        return fts_available(self.table)
+
+    def search(self, match, restrict, limit, offset=0):
+        """
+        (rowid, фрагмент) лучших по BM25 совпадений среди строк из restrict
+        (queryset исходной модели, по которому отбираются допустимые id).
+        """
+        weights = ''.join(f', {weight}' for weight in self.weights or ())
+        restrict_sql, restrict_params = restrict.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({self.table}, -1, %s, %s, '…', %s) FROM {self.table} "
+                f"WHERE {self.table} MATCH %s AND rowid IN ({restrict_sql}) "
+                f"ORDER BY bm25({self.table}{weights}) LIMIT %s OFFSET %s",
+                [_MARK_START, _MARK_END, SNIPPET_TOKENS, match, *restrict_params, limit, offset]
+            )
+            return cursor.fetchall()
+
+
+SEARCH_INDEXES = {
+    # Имена пользователей: триграммы дают поиск по подстроке
+    'users': FtsIndex('archive_user_search', 'archive_profile', ['username_lower'], 'trigram'),
+    # Тексты: стемминг Porter поверх unicode61; совпадение в заголовке весит в 10 раз больше
+    'problems': FtsIndex(
+        'archive_problem_search', 'archive_problem', ['title', 'description'],
+        'porter unicode61 remove_diacritics 2', weights=(10.0, 1.0)
+    ),
+    'posts': FtsIndex(
+        'archive_post_search', 'archive_blogpost', ['title', 'content'],
+        'porter unicode61 remove_diacritics 2', weights=(10.0, 1.0)
+    ),
+}
+
+_fts_tables = {}
+
+
+def fts_available(table):
+    """Есть ли FTS-таблица в текущей БД (проверяется один раз на процесс и алиас)."""
+    key = (connection.alias, table)
+    if key not in _fts_tables:
+        _fts_tables[key] = connection.vendor == 'sqlite' and table in connection.introspection.table_names()
+    return _fts_tables[key]
+
+
+def fts_phrase(text):
+    """Текст как одна фраза FTS5: кавычки внутри удваиваются, операторы не разбираются."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def query_terms(text):
+    return re.findall(r'\w+', text)[:MAX_QUERY_TERMS]
+
+
+def fts_query(text):
+    """
+    Запрос пользователя как выражение FTS5: все слова обязательны, последнее —
+    ещё и как префикс (поиск по мере набора). Синтаксис FTS5 из ввода не разбирается.
+    """
+    terms = query_terms(text)
+    if not terms:
+        return ''
+    return ' '.join(fts_phrase(term) for term in terms[:-1]) + f' {fts_phrase(terms[-1])}*'
+
+
+def snippet_html(snippet):
+    return mark_safe(escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+
+def _prefix_matches(query, limit):
+    # Диапазон [q, q + U+FFFF) идёт по индексу username_lower; LIKE 'q%' на SQLite индекс не использует
+    return list(
+        Profile.objects.filter(username_lower__gte=query, username_lower__lt=query + '\uffff')
+        .order_by('username_lower').values_list('pk', flat=True)[:limit]
+    )
+
+
+def _substring_matches(query, limit):
+    index = SEARCH_INDEXES['users']
+    if index.available():
+        if len(query) < TRIGRAM_MIN_LENGTH:
+            return []
+        with connection.cursor() as cursor:
+            # Без ORDER BY: FTS5 останавливается на первых limit совпадениях, ранжируем сами
+            cursor.execute(
+                f'SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s LIMIT %s',
+                [fts_phrase(query), limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+    return list(Profile.objects.filter(username_lower__contains=query).values_list('pk', flat=True)[:limit])
+
+
+def search_users(query, limit=USER_SEARCH_LIMIT):
+    """
+    Пользователи, чьё имя начинается с query или содержит его (без учёта регистра).
+
+    Сначала точное совпадение, затем префиксные (по алфавиту), затем прочие
+    вхождения — чем раньше в имени и чем короче имя, тем выше. Дисквалифицированные
+    не показываются. Возвращает не больше limit профилей с загруженным user.
+    """
+    query = normalize_username(query.strip())
+    if not query:
+        return []
+    # Берём с запасом на дисквалифицированных, которых отсеиваем уже после поиска
+    ids = _prefix_matches(query, limit * 2)
+    if len(ids) < limit * 2:
+        ids = list(dict.fromkeys(ids + _substring_matches(query, limit * 4)))
+
+    def relevance(profile):
+        name = profile.username_lower
+        return name != query, not name.startswith(query), name.find(query), len(name), name
+
+    profiles = Profile.objects.filter(pk__in=ids, is_disqualified=False).select_related('user')
+    return sorted(profiles, key=relevance)[:limit]
+
+
+def _search_page(index, queryset, fields, query, page):
+    """
+    Страница выдачи: (объекты с атрибутом snippet_html, есть ли следующая страница).
+
+    С FTS — ранжирование BM25 и фрагменты с подсветкой; без него (не SQLite) —
+    icontains по каждому слову, новые сверху, фрагмент — начало текста.
+    """
+    offset = (page - 1) * SEARCH_PAGE_SIZE
+    if index.available():
+        match = fts_query(query)
+        if not match:
+            return [], False
+        rows = index.search(match, queryset, SEARCH_PAGE_SIZE + 1, offset)
+        objects = queryset.in_bulk([pk for pk, _ in rows])
+        results = []
+        for pk, snippet in rows[:SEARCH_PAGE_SIZE]:
+            obj = objects[pk]
+            obj.snippet_html = snippet_html(snippet)
+            results.append(obj)
+        return results, len(rows) > SEARCH_PAGE_SIZE
+
+    terms = query_terms(query)
+    if not terms:
+        return [], False
+    for term in terms:
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': term})
+        queryset = queryset.filter(condition)
+    results = list(queryset.order_by('-pk')[offset:offset + SEARCH_PAGE_SIZE + 1])
+    for obj in results:
+        obj.snippet_html = escape(Truncator(getattr(obj, fields[-1])).words(SNIPPET_TOKENS))
+    return results[:SEARCH_PAGE_SIZE], len(results) > SEARCH_PAGE_SIZE
+
+
+def search_problems(query, page=1, include_unpublished=False):
+    """Задачи по заголовку и условию; неопубликованные — только при include_unpublished (как в problem_list)."""
+    problems = Problem.objects.all() if include_unpublished else Problem.objects.filter(Problem.published_q())
+    return _search_page(SEARCH_INDEXES['problems'], problems, ['title', 'description'], query, page)
+
+
+def search_posts(query, page=1):
+    posts = BlogPost.objects.select_related('author')
+    return _search_page(SEARCH_INDEXES['posts'], posts, ['title', 'content'], query, page)
@@ -0,0 +1,251 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Contest, StandingsCell, StandingsEntry, Submission
+
+# Штраф за каждую неверную попытку до первого правильного ответа (в минутах)
+WRONG_ATTEMPT_PENALTY = 20
+
+
+def contest_submissions(contest, problems=None, include_disqualified=False, until=None):
+    """Все посылки окна контеста (по умолчанию без дисквалифицированных); until обрезает окно раньше конца."""
+    if problems is None:
+        problems = contest.problems.all()
+    submissions = Submission.objects.filter(
+        problem__in=problems,
+        submitted_at__gte=contest.start_time,
+        submitted_at__lte=min(contest.end_time, until) if until else contest.end_time
+    )
+    if not include_disqualified:
+        submissions = submissions.filter(author__profile__is_disqualified=False)
+    return submissions
+
+
+def solve_minutes(contest, submitted_at):
+    return int((submitted_at - contest.start_time).total_seconds() // 60)
+
+
+def compute_standings(contest, problems=None, include_disqualified=False, until=None):
+    """
+    Считает таблицу результатов контеста за один проход по посылкам.
+
+    Посылки читаются одним запросом в виде кортежей
+    (author_id, problem_id, submitted_at, is_correct), отсортированных по
+    автору, задаче и времени, поэтому число запросов не зависит от
+    количества участников. Возвращает список словарей
+    {'user', 'solved', 'penalty', 'problems'}, отсортированный по
+    (-solved, penalty); 'problems' идёт в порядке ``problems``.
+    until — момент, на который нужна таблица (по умолчанию конец контеста).
+    """
+    if problems is None:
+        problems = list(contest.problems.all())
+    column = {problem.id: i for i, problem in enumerate(problems)}
+
+    submissions = contest_submissions(contest, problems, include_disqualified, until)
+    rows = submissions.order_by(
+        'author_id', 'problem_id', 'submitted_at', 'id'
+    ).values_list('author_id', 'problem_id', 'submitted_at', 'is_correct')
+
+    results = {}
+    for author_id, problem_id, submitted_at, is_correct in rows.iterator(chunk_size=2000):
+        row = results.get(author_id)
+        if row is None:
+            row = results[author_id] = {
+                'user_id': author_id,
+                'solved': 0,
+                'penalty': 0,
+                'problems': [{'status': 'WA', 'failed': 0} for _ in problems],
+            }
+        cell = row['problems'][column[problem_id]]
+        if cell['status'] == 'OK':
+            # Посылки после первого правильного ответа не учитываются
+            continue
+        if is_correct:
+            minutes = solve_minutes(contest, submitted_at)
+            cell['status'] = 'OK'
+            cell['time'] = minutes
+            cell['at'] = submitted_at
+            row['solved'] += 1
+            row['penalty'] += minutes + cell['failed'] * WRONG_ATTEMPT_PENALTY
+        else:
+            cell['failed'] += 1
+
+    # Участников подтягиваем подзапросом, а не списком id, чтобы не упираться
+    # в лимит параметров SQLite на больших раундах
+    users = User.objects.select_related('profile').filter(
+        id__in=submissions.values('author_id')
+    ).in_bulk()
+    standings = []
+    for author_id, row in results.items():
+        row['user'] = users[author_id]
+        standings.append(row)
+    standings.sort(key=lambda x: (-x['solved'], x['penalty']))
+    return standings
+
+
+# --- MATERIALIZED SCOREBOARD ---
+# StandingsEntry/StandingsCell обновляются на каждую посылку, чтобы страница
+# результатов читала готовые строки, а не пересчитывала окно контеста.
+
+def contests_for_submission(submission):
+    """Контесты, в окно которых попадает посылка."""
+    return Contest.objects.filter(
+        problems=submission.problem_id,
+        start_time__lte=submission.submitted_at,
+        end_time__gte=submission.submitted_at
+    )
+
+
+def update_standings(submission):
+    """Учитывает новую посылку в таблицах результатов всех её контестов."""
+    for contest in contests_for_submission(submission):
+        cell, _ = StandingsCell.objects.get_or_create(
+            contest=contest, user_id=submission.author_id, problem_id=submission.problem_id
+        )
+        entry, _ = StandingsEntry.objects.get_or_create(contest=contest, user_id=submission.author_id)
+        if cell.first_ac_at is not None:
+            # После первого правильного ответа посылки по задаче не считаются
+            continue
+        if submission.is_correct:
+            cell.first_ac_at = submission.submitted_at
+            cell.penalty = solve_minutes(contest, submission.submitted_at) + cell.attempts * WRONG_ATTEMPT_PENALTY
+            cell.save(update_fields=['first_ac_at', 'penalty'])
+            StandingsEntry.objects.filter(pk=entry.pk).update(
+                solved=F('solved') + 1, penalty=F('penalty') + cell.penalty
+            )
+        else:
+            StandingsCell.objects.filter(pk=cell.pk).update(attempts=F('attempts') + 1)
+
+
+def refresh_standings(contest, user_id, problem_id):
+    """Пересчитывает ячейку (и строку) участника по его посылкам, например после смены вердикта."""
+    attempts = Submission.objects.filter(
+        author_id=user_id,
+        problem_id=problem_id,
+        submitted_at__gte=contest.start_time,
+        submitted_at__lte=contest.end_time
+    ).order_by('submitted_at', 'id').values_list('submitted_at', 'is_correct')
+
+    failed, first_ac_at, penalty = 0, None, 0
+    for submitted_at, is_correct in attempts:
+        if is_correct:
+            first_ac_at = submitted_at
+            penalty = solve_minutes(contest, submitted_at) + failed * WRONG_ATTEMPT_PENALTY
+            break
+        failed += 1
+
+    if attempts:
+        StandingsCell.objects.update_or_create(
+            contest=contest, user_id=user_id, problem_id=problem_id,
+            defaults={'attempts': failed, 'first_ac_at': first_ac_at, 'penalty': penalty}
+        )
+    else:
+        # Посылок по задаче не осталось (удалены) — ячейки нет, как и при пересборке
+        StandingsCell.objects.filter(contest=contest, user_id=user_id, problem_id=problem_id).delete()
+        if not StandingsCell.objects.filter(contest=contest, user_id=user_id).exists():
+            StandingsEntry.objects.filter(contest=contest, user_id=user_id).delete()
+            return
+    totals = StandingsCell.objects.filter(contest=contest, user_id=user_id).aggregate(
+        solved=Count('id', filter=Q(first_ac_at__isnull=False)),
+        penalty=Sum('penalty', filter=Q(first_ac_at__isnull=False))
+    )
+    StandingsEntry.objects.update_or_create(
+        contest=contest, user_id=user_id,
+        defaults={'solved': totals['solved'], 'penalty': totals['penalty'] or 0}
+    )
+
+
+def has_scoreboard_data(contest):
+    """Есть ли у контеста что пересчитывать: сохранённые строки или посылки в окне."""
+    return contest.standings.exists() or contest_submissions(contest, include_disqualified=True).exists()
+
+
+def refresh_submission_standings(submission):
+    for contest in contests_for_submission(submission):
+        refresh_standings(contest, submission.author_id, submission.problem_id)
+
+
+def build_scoreboard(contest, problems=None):
+    """Строит строки и ячейки таблицы результатов с нуля однопроходным движком."""
+    if problems is None:
+        problems = list(contest.problems.all())
+    entries, cells = [], []
+    for row in compute_standings(contest, problems, include_disqualified=True):
+        entries.append(StandingsEntry(
+            contest=contest, user_id=row['user_id'], solved=row['solved'], penalty=row['penalty']
+        ))
+        for problem, stat in zip(problems, row['problems']):
+            if stat['status'] == 'OK':
+                penalty = stat['time'] + stat['failed'] * WRONG_ATTEMPT_PENALTY
+                cells.append(StandingsCell(
+                    contest=contest, user_id=row['user_id'], problem=problem,
+                    attempts=stat['failed'], first_ac_at=stat['at'], penalty=penalty
+                ))
+            elif stat['failed']:
+                cells.append(StandingsCell(
+                    contest=contest, user_id=row['user_id'], problem=problem, attempts=stat['failed']
+                ))
+    return entries, cells
+
+
+def scoreboard_drift(contest, entries, cells):
+    """Число расхождений между сохранённой таблицей и пересчитанной с нуля."""
+    def cell_key(cell):
+        return (cell.attempts, cell.first_ac_at, cell.penalty)
+
+    stored_entries = {
+        user_id: (solved, penalty)
+        for user_id, solved, penalty in contest.standings.values_list('user_id', 'solved', 'penalty')
+    }
+    stored_cells = {
+        (cell.user_id, cell.problem_id): cell_key(cell)
+        for cell in contest.standings_cells.all()
+        # Пустые ячейки (например, после отмены вердикта) равносильны отсутствующим
+        if cell.attempts or cell.first_ac_at
+    }
+    expected_entries = {entry.user_id: (entry.solved, entry.penalty) for entry in entries}
+    expected_cells = {(cell.user_id, cell.problem_id): cell_key(cell) for cell in cells}
+
+    drift = 0
+    for stored, expected in ((stored_entries, expected_entries), (stored_cells, expected_cells)):
+        for key in stored.keys() | expected.keys():
+            if stored.get(key) != expected.get(key):
+                drift += 1
+    return drift
+
+
+def rebuild_scoreboard(contest):
+    """Перестраивает таблицу результатов контеста и возвращает найденный дрейф."""
+    entries, cells = build_scoreboard(contest)
+    with transaction.atomic():
+        drift = scoreboard_drift(contest, entries, cells)
+        contest.standings.all().delete()
+        contest.standings_cells.all().delete()
+        StandingsEntry.objects.bulk_create(entries, batch_size=500)
+        StandingsCell.objects.bulk_create(cells, batch_size=500)
+    return drift
+
+
+def scoreboard_rows(contest, problems, entries):
+    """Собирает строки для шаблона из страницы StandingsEntry одним запросом на ячейки."""
+    entries = list(entries)
+    column = {problem.id: i for i, problem in enumerate(problems)}
+    cells = {}
+    for cell in StandingsCell.objects.filter(contest=contest, user_id__in=[e.user_id for e in entries]):
+        if cell.problem_id in column:
+            cells[cell.user_id, cell.problem_id] = cell
+
+    results = []
+    for entry in entries:
+        user_problems = []
+        for problem in problems:
+            cell = cells.get((entry.user_id, problem.id))
+            if cell is not None and cell.first_ac_at is not None:
+                user_problems.append({
+                    'status': 'OK', 'failed': cell.attempts, 'time': solve_minutes(contest, cell.first_ac_at)
+                })
+            else:
+                user_problems.append({'status': 'WA', 'failed': cell.attempts if cell else 0})
+        results.append({'user': entry.user, 'solved': entry.solved, 'penalty': entry.penalty, 'problems': user_problems})
+    return results
@@ -0,0 +1,17 @@
+from django import template
+
+from archive.ranks import annotate_ranks, rank_resolver
+
+register = template.Library()
+
+
+@register.filter
+def with_ranks(items):
+    """Список пользователей/профилей/строк таблицы с проставленным profile.rank (один проход)."""
+    return annotate_ranks(items)
+
+
+@register.filter
+def rank_tier(rating):
+    """Rank для рейтинга или None."""
+    return rank_resolver.resolve(rating)
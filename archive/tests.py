@@ -1,3 +1,1667 @@
-from django.test import TestCase
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import connection
+from django.db.models import Count
+import bleach
+import markdown
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .checkers import compile_checker
+from .importer import PackageError, import_package, read_package
+from .ingest import SubmissionIngest, submission_ingest
+from .jobs import JOB_HANDLERS, claim_next, enqueue, fail_abandoned_jobs, heartbeat, job_handler, run_job, run_worker
+from .judging import rebuild_problem_solved, set_verdict
+from .models import (
+    BlogPost, Comment, Contest, Job, Problem, ProblemStats, Profile, Rank, RatingHistory, Submission, UserSolved
+)
+from .problem_stats import compute_problem_stats, recompute_problem_stats
+from .prerender import has_stale_html, rerender_stale_html
+from .rendering import (
+    ALLOWED_ATTRIBUTES, ALLOWED_TAGS, MARKDOWN_EXTENSION_CONFIGS, MARKDOWN_EXTENSIONS, RENDERER_VERSION,
+    RenderCache, render_cache, render_markdown, render_markdown_many, render_uncached,
+)
+from .rejudge import rejudge_problem
+from .ranks import RANK_VERSION_KEY, RankResolver, rank_resolver
+from .search import SEARCH_INDEXES, search_posts, search_problems, search_users
+from .rating import ContestAlreadyRated, apply_contest_rating, newcomer_bonus, rating_changes, refresh_rank_positions
+from .throttle import submission_throttle
+from .standings import build_scoreboard, compute_standings, contest_submissions, rebuild_scoreboard, scoreboard_drift
+from .views import submission_feed
+
+
+# Для тестов судейства ограничение частоты посылок не нужно (и не должно протекать между тестами через кеш)
+unthrottled = override_settings(SUBMISSION_RATE_CAPACITY=10 ** 6, SUBMISSION_DEDUPE_WINDOW=0)
+
+# Замеры времени зависят от машины и её загрузки; запускаются только с ARCHIVE_BENCHMARKS=1
+benchmark = skipUnless(os.environ.get('ARCHIVE_BENCHMARKS'), "set ARCHIVE_BENCHMARKS=1 to run timing checks")
+
+
+def make_submission(author, problem, at, is_correct=False):
+    return Submission.objects.create(
+        author=author, problem=problem, user_answer='x', is_correct=is_correct, submitted_at=at
+    )
+
+
+class StandingsTests(TestCase):
+    def setUp(self):
+        self.start = timezone.now() - timedelta(hours=2)
+        self.contest = Contest.objects.create(
+            title='Round 1', start_time=self.start, end_time=self.start + timedelta(hours=3)
+        )
+        self.p1 = Problem.objects.create(title='A', description='a', correct_answer='1')
+        self.p2 = Problem.objects.create(title='B', description='b', correct_answer='2')
+        self.contest.problems.add(self.p1, self.p2)
+
+    def add_users(self, count):
+        users = []
+        for i in range(count):
+            user = User.objects.create_user(f'user_{count}_{i}')
+            make_submission(user, self.p1, self.start + timedelta(minutes=5), is_correct=False)
+            make_submission(user, self.p1, self.start + timedelta(minutes=10 + i), is_correct=True)
+            make_submission(user, self.p2, self.start + timedelta(minutes=15), is_correct=False)
+            users.append(user)
+        return users
+
+    def test_penalty_and_cells(self):
+        alice = User.objects.create_user('alice')
+        bob = User.objects.create_user('bob')
+        make_submission(alice, self.p1, self.start + timedelta(minutes=3), is_correct=False)
+        make_submission(alice, self.p1, self.start + timedelta(minutes=7, seconds=59), is_correct=True)
+        make_submission(alice, self.p1, self.start + timedelta(minutes=9), is_correct=False)
+        make_submission(alice, self.p2, self.start + timedelta(minutes=30), is_correct=True)
+        make_submission(bob, self.p2, self.start + timedelta(minutes=1), is_correct=False)
+        make_submission(bob, self.p2, self.start + timedelta(minutes=2), is_correct=False)
+        # Посылка вне окна контеста не учитывается
+        make_submission(bob, self.p1, self.start - timedelta(minutes=1), is_correct=True)
+
+        results = compute_standings(self.contest, [self.p1, self.p2])
+
+        self.assertEqual([row['user'] for row in results], [alice, bob])
+        self.assertEqual(results[0]['solved'], 2)
+        self.assertEqual(results[0]['penalty'], 7 + 20 + 30)
+        self.assertEqual(results[0]['problems'], [
+            {'status': 'OK', 'failed': 1, 'time': 7, 'at': self.start + timedelta(minutes=7, seconds=59)},
+            {'status': 'OK', 'failed': 0, 'time': 30, 'at': self.start + timedelta(minutes=30)},
+        ])
+        self.assertEqual(results[1]['problems'], [
+            {'status': 'WA', 'failed': 0},
+            {'status': 'WA', 'failed': 2},
+        ])
+
+    def test_disqualified_users_are_skipped(self):
+        cheater = User.objects.create_user('cheater')
+        cheater.profile.is_disqualified = True
+        cheater.profile.save()
+        make_submission(cheater, self.p1, self.start + timedelta(minutes=1), is_correct=True)
+        self.assertEqual(compute_standings(self.contest), [])
+
+    def test_query_count_does_not_depend_on_participants(self):
+        self.add_users(2)
+        with CaptureQueriesContext(connection) as small:
+            compute_standings(self.contest)
+        self.add_users(20)
+        with CaptureQueriesContext(connection) as large:
+            results = compute_standings(self.contest)
+            for row in results:
+                row['user'].profile.rating
+        self.assertEqual(len(results), 22)
+        self.assertEqual(len(small), len(large))
+
+    def test_standings_page(self):
+        self.add_users(3)
+        rebuild_scoreboard(self.contest)
+        response = self.client.get(reverse('contest_standings', args=[self.contest.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['results']), 3)
+
+    def assert_rebuild_queued(self):
+        job = claim_next()
+        self.assertEqual((job.kind, job.payload), ('rebuild_standings', {'contest_id': self.contest.pk}))
+        self.assertIsNone(claim_next())
+        run_job(job)
+        entries, cells = build_scoreboard(self.contest)
+        self.assertEqual(scoreboard_drift(self.contest, entries, cells), 0)
+
+    def test_contest_changes_rebuild_scoreboard(self):
+        self.add_users(2)
+        rebuild_scoreboard(self.contest)
+        self.contest.title = 'Round 1 (renamed)'
+        self.contest.save()
+        self.assertFalse(Job.objects.exists())
+
+        # Окно сократилось: правильные ответы на 10-й минуте больше не считаются
+        self.contest.end_time = self.start + timedelta(minutes=8)
+        self.contest.save()
+        self.assert_rebuild_queued()
+        self.assertEqual(list(self.contest.standings.values_list('solved', flat=True)), [0, 0])
+
+        self.contest.end_time = self.start + timedelta(hours=3)
+        self.contest.save()
+        self.contest.problems.remove(self.p1)
+        self.assert_rebuild_queued()
+        self.assertEqual(list(self.contest.standings_cells.values_list('problem_id', flat=True)), [self.p2.pk] * 2)
+
+        self.p1.contests.add(self.contest)
+        self.assert_rebuild_queued()
+        self.assertEqual(list(self.contest.standings.values_list('solved', flat=True)), [1, 1])
+
+        # Контест без посылок пересобирать нечего
+        empty = Contest.objects.create(title='Empty', start_time=self.start, end_time=self.start + timedelta(hours=1))
+        empty.problems.add(Problem.objects.create(title='C', description='c', correct_answer='3'))
+        self.assertIsNone(claim_next())
+
+
+@unthrottled
+class ScoreboardTests(TestCase):
+    def setUp(self):
+        self.start = timezone.now() - timedelta(minutes=30)
+        self.contest = Contest.objects.create(
+            title='Live', start_time=self.start, end_time=self.start + timedelta(hours=2)
+        )
+        self.problem = Problem.objects.create(title='A', description='a', correct_answer='42')
+        self.contest.problems.add(self.problem)
+        self.user = User.objects.create_user('alice', password='pw')
+        self.staff = User.objects.create_user('admin', password='pw', is_staff=True)
+
+    def submit(self, answer):
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('contest_problem_detail', args=[self.contest.pk, self.problem.pk]),
+            {'answer': answer, 'solution': 'idea'}
+        )
+
+    def assert_in_sync(self):
+        entries, cells = build_scoreboard(self.contest)
+        self.assertEqual(scoreboard_drift(self.contest, entries, cells), 0)
+
+    def test_submissions_update_scoreboard(self):
+        self.submit('41')
+        self.submit('42')
+        self.submit('40')
+        entry = self.contest.standings.get(user=self.user)
+        self.assertEqual(entry.solved, 1)
+        self.assertEqual(entry.penalty, 30 + 20)
+        self.assert_in_sync()
+
+    def test_manual_verdict_flip_refreshes_scoreboard(self):
+        self.submit('41')
+        self.submit('43')
+        wrong = Submission.objects.filter(author=self.user).order_by('id').last()
+        self.client.force_login(self.staff)
+        self.client.get(reverse('manual_update_submission', args=[wrong.pk, 'make_correct']))
+        self.assertEqual(self.contest.standings.get(user=self.user).solved, 1)
+        self.assert_in_sync()
+
+        self.client.get(reverse('manual_update_submission', args=[wrong.pk, 'make_incorrect']))
+        self.assertEqual(self.contest.standings.get(user=self.user).solved, 0)
+        self.assert_in_sync()
+
+    def test_rebuild_repairs_drift(self):
+        self.submit('42')
+        self.contest.standings.update(solved=5)
+        self.assertEqual(rebuild_scoreboard(self.contest), 1)
+        self.assertEqual(self.contest.standings.get(user=self.user).solved, 1)
+
+
+def reference_rating_changes(participants, k=30):
+    """Исходный попарный цикл из calculate_contest_rating."""
+    changes = [0] * len(participants)
+    for i, p1 in enumerate(participants):
+        for j, p2 in enumerate(participants):
+            if i == j:
+                continue
+            expected = 1 / (1 + 10 ** ((p2['rating'] - p1['rating']) / 400))
+            if p1['solved'] > p2['solved']:
+                actual = 1
+            elif p1['solved'] < p2['solved']:
+                actual = 0
+            elif p1['penalty'] < p2['penalty']:
+                actual = 0.75
+            elif p1['penalty'] > p2['penalty']:
+                actual = 0.25
+            else:
+                actual = 0.5
+            changes[i] += k * (actual - expected)
+    return changes
+
+
+class RatingTests(TestCase):
+    def random_participants(self, n, seed):
+        rng = random.Random(seed)
+        return [
+            {
+                'rating': rng.choice([0, 0, 1200, 1500]) + rng.randint(-300, 300),
+                'solved': rng.randint(0, 4),
+                # Маленький диапазон штрафа, чтобы было много полных совпадений
+                'penalty': rng.choice([0, 20, 45, 45, 100]),
+                'past': rng.randint(0, 3),
+            }
+            for _ in range(n)
+        ]
+
+    def test_matches_reference_formula(self):
+        for seed in range(5):
+            participants = self.random_participants(60, seed)
+            expected = reference_rating_changes(participants)
+            changes = rating_changes(
+                [p['rating'] for p in participants],
+                [p['solved'] for p in participants],
+                [p['penalty'] for p in participants]
+            )
+            for p, old, new in zip(participants, expected, changes):
+                bonus = newcomer_bonus(p['solved'], p['past'])
+                self.assertAlmostEqual(old, new, places=9)
+                self.assertEqual(int(old + bonus), int(new + bonus))
+
+    def test_tie_breaks(self):
+        changes = rating_changes([1500, 1500, 1500], [2, 2, 2], [10, 30, 30])
+        self.assertAlmostEqual(changes[0], 30 * (0.25 + 0.25))
+        self.assertAlmostEqual(changes[1], 30 * (-0.25 + 0))
+        self.assertAlmostEqual(changes[1], changes[2])
+
+    def test_newcomer_bonus(self):
+        self.assertEqual(newcomer_bonus(1, 0), 50)
+        self.assertEqual(newcomer_bonus(3, 1), 25)
+        self.assertEqual(newcomer_bonus(3, 2), 0)
+        self.assertEqual(newcomer_bonus(0, 0), 0)
+
+    def large_contest_changes(self):
+        participants = self.random_participants(5000, seed=1)
+        return rating_changes(
+            [p['rating'] for p in participants],
+            [p['solved'] for p in participants],
+            [p['penalty'] for p in participants]
+        )
+
+    def test_large_contest(self):
+        self.assertEqual(len(self.large_contest_changes()), 5000)
+
+    @benchmark
+    def test_large_contest_is_fast(self):
+        started = time.perf_counter()
+        self.large_contest_changes()
+        self.assertLess(time.perf_counter() - started, 1.0)
+
+    def test_calculate_rating_view(self):
+        start = timezone.now() - timedelta(hours=3)
+        contest = Contest.objects.create(title='R', start_time=start, end_time=start + timedelta(hours=2))
+        problem = Problem.objects.create(title='A', description='a', correct_answer='1')
+        contest.problems.add(problem)
+        winner = User.objects.create_user('winner')
+        loser = User.objects.create_user('loser')
+        make_submission(winner, problem, start + timedelta(minutes=5), is_correct=True)
+        make_submission(loser, problem, start + timedelta(minutes=5), is_correct=False)
+
+        staff = User.objects.create_user('admin', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.post(reverse('calculate_rating', args=[contest.pk]))
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('job_detail', args=[job.pk]))
+        self.assertEqual(job.status, Job.QUEUED)
+        run_job(claim_next())
+
+        winner.profile.refresh_from_db()
+        loser.profile.refresh_from_db()
+        self.assertEqual(winner.profile.rating, int(30 * 0.5) + 50)
+        self.assertEqual(loser.profile.rating, int(30 * -0.5))
+        self.assertEqual(RatingHistory.objects.filter(contest=contest).count(), 2)
+
+        # Повторное нажатие не применяет рейтинг второй раз
+        self.client.post(reverse('calculate_rating', args=[contest.pk]))
+        self.assertIsNone(claim_next())
+        with self.assertRaises(ContestAlreadyRated):
+            apply_contest_rating(contest)
+        winner.profile.refresh_from_db()
+        self.assertEqual(winner.profile.rating, int(30 * 0.5) + 50)
+        self.assertEqual(RatingHistory.objects.filter(contest=contest).count(), 2)
+        contest.refresh_from_db()
+        self.assertIsNotNone(contest.rated_at)
+
+    def test_second_contest_bonus_and_query_count(self):
+        users = [User.objects.create_user(f'p{i}') for i in range(6)]
+        problem = Problem.objects.create(title='A', description='a', correct_answer='1')
+
+        def run_contest(title, hours_ago, participants):
+            start = timezone.now() - timedelta(hours=hours_ago)
+            contest = Contest.objects.create(title=title, start_time=start, end_time=start + timedelta(hours=1))
+            contest.problems.add(problem)
+            for i, user in enumerate(participants):
+                make_submission(user, problem, start + timedelta(minutes=i), is_correct=True)
+            with CaptureQueriesContext(connection) as queries:
+                apply_contest_rating(contest)
+            # Записывать ли места в рейтинге, зависит от того, сдвинулся ли кто-то, а не от числа участников
+            return sum(1 for q in queries if not q['sql'].startswith('UPDATE "archive_profile" SET "rank_position"'))
+
+        small = run_contest('First', 10, users[:2])
+        first_round = [u.rating_history.get().rating for u in users[:2]]
+        large = run_contest('Second', 5, users)
+        self.assertEqual(small, large)
+
+        changes = rating_changes(first_round + [0] * 4, [1] * 6, [0, 1, 2, 3, 4, 5])
+        final = [u.rating_history.order_by('id').last().rating for u in users]
+        # Второй контест для первых двух (бонус 25), первый для остальных (бонус 50)
+        self.assertEqual(final[0], first_round[0] + int(changes[0] + 25))
+        self.assertEqual(final[5], int(changes[5] + 50))
+
+
+class RankingTests(TestCase):
+    def setUp(self):
+        ratings = [1500, 1200, 1200, 900, 0, -40]
+        self.users = [User.objects.create_user(f'u{i}') for i in range(len(ratings))]
+        for user, rating in zip(self.users, ratings):
+            Profile.objects.filter(user=user).update(rating=rating)
+        refresh_rank_positions()
+
+    def positions(self):
+        return dict(Profile.objects.values_list('user__username', 'rank_position'))
+
+    def test_positions_follow_rating_then_username(self):
+        self.assertEqual(self.positions(), {'u0': 1, 'u1': 2, 'u2': 3, 'u3': 4, 'u4': 5, 'u5': 6})
+        Profile.objects.filter(user=self.users[0]).update(is_disqualified=True)
+        Profile.objects.filter(user=self.users[5]).update(rating=2000)
+        self.assertEqual(refresh_rank_positions(), 2)
+        self.assertEqual(self.positions(), {'u0': None, 'u1': 2, 'u2': 3, 'u3': 4, 'u4': 5, 'u5': 1})
+        # Повторный пересчёт ничего не пишет
+        self.assertEqual(refresh_rank_positions(), 0)
+
+    def test_new_users_are_listed_before_refresh(self):
+        newbie = User.objects.create_user('newbie')
+        another = User.objects.create_user('another')
+        Profile.objects.filter(user=another).update(rating=100)
+        self.assertIsNone(self.positions()['newbie'])
+
+        # До пересчёта новички идут за ранжированными: по рейтингу, затем по id
+        response = self.client.get(reverse('ranking'))
+        rows = [(p.user.username, p.rank_position) for p in response.context['profiles']]
+        self.assertEqual(rows[-3:], [('u5', 6), ('another', 7), ('newbie', 8)])
+        with mock.patch('archive.views.RANKING_PAGE_SIZE', 3):
+            response = self.client.get(reverse('ranking'), {'user': 'newbie'})
+            self.assertEqual(response.context['highlight'].user, newbie)
+            self.assertEqual(response.context['page_obj']['number'], 3)
+            self.assertEqual([p.user.username for p in response.context['profiles']], ['another', 'newbie'])
+            self.client.force_login(another)
+            response = self.client.get(reverse('ranking'), {'me': 1})
+            self.assertEqual(response.context['page_obj']['number'], 3)
+
+        refresh_rank_positions()
+        positions = self.positions()
+        self.assertEqual((positions['another'], positions['newbie']), (5, 6))
+        self.assertEqual(len(set(positions.values())), len(positions))
+
+    def test_apply_contest_rating_refreshes_positions(self):
+        start = timezone.now() - timedelta(hours=3)
+        contest = Contest.objects.create(title='R', start_time=start, end_time=start + timedelta(hours=2))
+        problem = Problem.objects.create(title='A', description='a', correct_answer='1')
+        contest.problems.add(problem)
+        make_submission(self.users[5], problem, start + timedelta(minutes=5), is_correct=True)
+        make_submission(self.users[4], problem, start + timedelta(minutes=5), is_correct=False)
+        apply_contest_rating(contest)
+        positions = self.positions()
+        self.assertLess(positions['u5'], positions['u4'])
+
+    def test_pages_and_find_me_are_indexed_lookups(self):
+        with mock.patch('archive.views.RANKING_PAGE_SIZE', 2):
+            response = self.client.get(reverse('ranking'), {'page': 2})
+            self.assertEqual([p.user.username for p in response.context['profiles']], ['u2', 'u3'])
+            self.assertEqual(response.context['page_obj']['num_pages'], 3)
+
+            self.client.force_login(self.users[4])
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('ranking'), {'me': 1})
+            self.assertEqual(response.context['page_obj']['number'], 3)
+            self.assertEqual(response.context['highlight'].user, self.users[4])
+            self.assertContains(response, 'id="me"')
+            ranking_sql = [q['sql'] for q in queries if 'archive_profile' in q['sql']]
+            self.assertEqual(len(ranking_sql), 4)
+            self.assertFalse(any('COUNT(' in sql or 'OFFSET' in sql for sql in ranking_sql))
+
+            response = self.client.get(reverse('ranking'), {'page': 99})
+            self.assertEqual(response.context['page_obj']['number'], 3)
+
+    def test_rank_ordering_uses_index(self):
+        with connection.cursor() as cursor:
+            sql, params = Profile.objects.filter(rank_position__gt=100).order_by('rank_position')[:100].query.sql_with_params()
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('USING INDEX', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class RankTierTests(TestCase):
+    def setUp(self):
+        rank_resolver.clear()
+        self.addCleanup(rank_resolver.clear)
+        self.pupil = Rank.objects.create(title='Pupil', min_rating=1200, color_code='#008000')
+        self.expert = Rank.objects.create(title='Expert', min_rating=1600, color_code='#0000ff')
+
+    def test_resolve_by_thresholds(self):
+        self.assertIsNone(rank_resolver.resolve(1199))
+        self.assertEqual(rank_resolver.resolve(1200), self.pupil)
+        self.assertEqual(rank_resolver.resolve(1599), self.pupil)
+        # Таблица в памяти, версия в кеше: запросов к БД нет
+        with self.assertNumQueries(0):
+            self.assertEqual(rank_resolver.resolve(3000), self.expert)
+        self.client.force_login(User.objects.create_user('viewer'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('user_profile', args=['viewer']))
+        self.assertFalse(any('archive_rank' in query['sql'] for query in queries))
+
+    def test_changes_reach_every_process(self):
+        # Два резолвера — как два рабочих процесса со своей памятью и своим локальным кешем
+        first, second = RankResolver(), RankResolver()
+        self.assertEqual(first.resolve(2500), self.expert)
+        self.assertEqual(second.resolve(2500), self.expert)
+
+        master = Rank.objects.create(title='Master', min_rating=2400)
+        self.assertEqual(first.resolve(2500), master)
+        self.assertEqual(second.resolve(2500), master)
+
+        # Правка в обход сигналов видна, когда истечёт срок версии в кеше
+        Rank.objects.filter(pk=master.pk).update(min_rating=2600, updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(second.resolve(2500), master)
+        cache.delete(RANK_VERSION_KEY)
+        self.assertEqual(second.resolve(2500), self.expert)
+        master.delete()
+        self.assertEqual(first.resolve(2700), self.expert)
+        self.assertEqual(first.info()['loads'], 3)
+
+    def test_annotate_pages_without_per_row_queries(self):
+        for i, rating in enumerate([1700, 1300, 1000]):
+            user = User.objects.create_user(f'r{i}')
+            Profile.objects.filter(user=user).update(rating=rating)
+        refresh_rank_positions()
+        rank_resolver.resolve(0)
+        # Новички без места, последнее место (число страниц) и сама страница; ранги — из памяти
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('ranking'))
+        self.assertEqual([p.rank for p in response.context['profiles']], [self.expert, self.pupil, None])
+        self.assertContains(response, 'color: #0000ff')
+
+        response = self.client.get(reverse('user_profile', args=['r1']))
+        self.assertEqual(response.context['rank'], self.pupil)
+
+
+class UserSearchTests(TestCase):
+    def setUp(self):
+        for name in ['Alice', 'alicia', 'malice', 'bob', 'xAliceX', 'al']:
+            User.objects.create_user(name)
+        cheater = User.objects.create_user('alice_banned')
+        Profile.objects.filter(user=cheater).update(is_disqualified=True)
+
+    def names(self, query, **kwargs):
+        return [profile.user.username for profile in search_users(query, **kwargs)]
+
+    def test_ranking_exact_prefix_substring(self):
+        self.assertEqual(self.names('ALICE'), ['Alice', 'malice', 'xAliceX'])
+        self.assertEqual(self.names('al'), ['al', 'Alice', 'alicia'])
+        self.assertEqual(self.names('lic'), ['Alice', 'alicia', 'malice', 'xAliceX'])
+        self.assertEqual(self.names('lic', limit=2), ['Alice', 'alicia'])
+        self.assertEqual(self.names('  '), [])
+
+    def test_substring_index_follows_renames_and_deletes(self):
+        self.assertTrue(SEARCH_INDEXES['users'].available())
+        user = User.objects.get(username='bob')
+        user.username = 'Roberto'
+        user.save()
+        self.assertEqual(self.names('bert'), ['Roberto'])
+        self.assertEqual(self.names('bob'), [])
+        user.delete()
+        self.assertEqual(self.names('bert'), [])
+        # Сохранение без смены имени не трогает индекс
+        alice = User.objects.get(username='Alice')
+        alice.save()
+        self.assertEqual(self.names('mal'), ['malice'])
+
+    def test_fallback_without_fts(self):
+        with mock.patch('archive.search.fts_available', return_value=False):
+            self.assertEqual(self.names('lice'), ['Alice', 'malice', 'xAliceX'])
+            self.assertIn('malice', self.names('li'))
+
+    def test_views(self):
+        response = self.client.get(reverse('user_search'), {'q': 'ali'})
+        self.assertEqual([u.username for u in response.context['users']], ['Alice', 'alicia', 'malice', 'xAliceX'])
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('user_typeahead'), {'q': 'lic'})
+        results = response.json()['results']
+        self.assertEqual(results[0], {'username': 'Alice', 'rating': 0, 'url': reverse('user_profile', args=['Alice'])})
+        self.assertNotIn('alice_banned', [r['username'] for r in results])
+
+    def test_prefix_lookup_uses_index(self):
+        with connection.cursor() as cursor:
+            sql, params = Profile.objects.filter(
+                username_lower__gte='ali', username_lower__lt='ali\uffff'
+            ).order_by('username_lower').values('pk')[:20].query.sql_with_params()
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('USING', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class ContentSearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('writer')
+        self.title_hit = Problem.objects.create(title='Triangle inequality', description='Prove it for a < b.')
+        self.body_hit = Problem.objects.create(
+            title='Geometry warmup', description='Find the area of a right triangle with legs 3 and 4 <b>fast</b>.'
+        )
+        self.hidden = Problem.objects.create(title='Secret triangle', description='Upcoming contest problem.')
+        start = timezone.now() + timedelta(days=1)
+        contest = Contest.objects.create(title='Future', start_time=start, end_time=start + timedelta(hours=2))
+        contest.problems.add(self.hidden)
+
+    def titles(self, results):
+        return [obj.title for obj in results]
+
+    def test_bm25_ranking_snippets_and_visibility(self):
+        results, has_next = search_problems('triangles')
+        self.assertEqual(self.titles(results), ['Triangle inequality', 'Geometry warmup'])
+        self.assertFalse(has_next)
+        snippet = results[1].snippet_html
+        self.assertIn('<mark>triangle</mark>', snippet)
+        self.assertIn('&lt;b&gt;', snippet)
+
+        results, _ = search_problems('triangle', include_unpublished=True)
+        self.assertIn('Secret triangle', self.titles(results))
+        response = self.client.get(reverse('content_search'), {'q': 'secret'})
+        self.assertEqual(list(response.context['results']), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.body_hit.description = 'Compute the circumference of a circle.'
+        self.body_hit.save()
+        self.assertEqual(self.titles(search_problems('circumference')[0]), ['Geometry warmup'])
+        self.assertEqual(self.titles(search_problems('legs')[0]), [])
+        self.body_hit.delete()
+        self.assertEqual(self.titles(search_problems('circumference')[0]), [])
+
+    def test_user_input_is_not_fts_syntax(self):
+        for query in ['AND', '"tri', 'NEAR(a b)', 'title:secret', '*', '-']:
+            search_problems(query)
+        self.assertEqual(self.titles(search_problems('tri')[0]), ['Triangle inequality', 'Geometry warmup'])
+
+    def test_post_prefix_match_and_deletes(self):
+        diary = BlogPost.objects.create(title='Combinatorics diary', content='Counting lattice paths.', author=self.author)
+        notes = BlogPost.objects.create(title='Contest notes', content='Combinatorial geometry recap.', author=self.author)
+        # Последнее слово запроса ищется как префикс: «combinat» находит оба поста
+        results, has_next = search_posts('combinat')
+        self.assertEqual(self.titles(results), ['Combinatorics diary', 'Contest notes'])
+        self.assertFalse(has_next)
+        self.assertEqual(results[0].author, self.author)
+        self.assertIn('<mark>', results[1].snippet_html)
+
+        diary.delete()
+        self.assertEqual(self.titles(search_posts('combinat')[0]), ['Contest notes'])
+        notes.delete()
+        self.assertEqual(search_posts('lattice')[0], [])
+
+    def test_posts_are_paginated(self):
+        for i in range(25):
+            BlogPost.objects.create(title=f'Olympiad diary {i}', content='Notes on inequalities.', author=self.author)
+        BlogPost.objects.create(title='Unrelated', content='Cooking.', author=self.author)
+        response = self.client.get(reverse('content_search'), {'q': 'inequality', 'type': 'posts'})
+        self.assertEqual(len(response.context['results']), 20)
+        self.assertTrue(response.context['has_next'])
+        response = self.client.get(reverse('content_search'), {'q': 'inequality', 'type': 'posts', 'page': 2})
+        self.assertEqual(len(response.context['results']), 5)
+        self.assertFalse(response.context['has_next'])
+        self.assertContains(response, '<mark>inequalities</mark>')
+
+    def test_fallback_without_fts(self):
+        with mock.patch('archive.search.fts_available', return_value=False):
+            results, _ = search_problems('TRIANGLE')
+            self.assertEqual(sorted(self.titles(results)), ['Geometry warmup', 'Triangle inequality'])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO archive_problem_search(archive_problem_search) VALUES ('delete-all')")
+        self.assertEqual(search_problems('inequality')[0], [])
+        call_command('rebuild_search_index', 'problems', stdout=StringIO())
+        self.assertEqual(self.titles(search_problems('inequality')[0]), ['Triangle inequality'])
+
+    def test_migrated_triggers_match_indexes(self):
+        # Миграции 0021/0022 хранят свою копию SQL; rebuild_search_index ставит триггеры из SEARCH_INDEXES
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'archive_%_search_%'")
+            migrated = {name: ' '.join(sql.split()) for name, sql in cursor.fetchall()}
+        expected = {
+            name: ' '.join(f'CREATE TRIGGER {name} {body}'.split())
+            for index in SEARCH_INDEXES.values() for name, body in index.triggers().items()
+        }
+        self.assertEqual(migrated, expected)
+
+
+class FriendsFilterTests(TestCase):
+    def setUp(self):
+        self.viewer = User.objects.create_user('viewer')
+        self.others = [User.objects.create_user(f'o{i}') for i in range(8)]
+        for i, user in enumerate([self.viewer] + self.others):
+            Profile.objects.filter(user=user).update(rating=1000 - 10 * i)
+        refresh_rank_positions()
+        self.viewer.profile.friends.add(self.others[1], self.others[4])
+
+        start = timezone.now() - timedelta(hours=1)
+        self.contest = Contest.objects.create(title='C', start_time=start, end_time=start + timedelta(hours=2))
+        problem = Problem.objects.create(title='A', description='a', correct_answer='1')
+        self.contest.problems.add(problem)
+        for i, user in enumerate(self.others + [self.viewer]):
+            make_submission(user, problem, start + timedelta(minutes=i + 1), is_correct=True)
+        rebuild_scoreboard(self.contest)
+        self.client.force_login(self.viewer)
+
+    def get(self, name, *args, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name, args=args), params)
+        return response, len(queries)
+
+    def test_ranking_friends_positions(self):
+        response, few = self.get('ranking', friends=1)
+        rows = [(p.user.username, p.friend_position, p.rank_position) for p in response.context['profiles']]
+        self.assertEqual(rows, [('viewer', 1, 1), ('o1', 2, 3), ('o4', 3, 6)])
+
+        self.viewer.profile.friends.add(*self.others)
+        response, many = self.get('ranking', friends=1)
+        self.assertEqual(len(response.context['profiles']), 9)
+        self.assertEqual(few, many)
+
+        response, _ = self.get('ranking')
+        self.assertFalse(response.context['friends_only'])
+        self.assertFalse(hasattr(response.context['profiles'][0], 'friend_position'))
+
+    def test_new_friend_is_listed_before_refresh(self):
+        newcomer = User.objects.create_user('newcomer')
+        self.viewer.profile.friends.add(newcomer)
+        response, _ = self.get('ranking', friends=1)
+        rows = [(p.user.username, p.friend_position, p.rank_position) for p in response.context['profiles']]
+        self.assertEqual(rows[-1], ('newcomer', 4, None))
+        self.assertContains(response, '&mdash;')
+
+    def test_ranking_find_me_among_friends(self):
+        with mock.patch('archive.views.RANKING_PAGE_SIZE', 2):
+            self.client.force_login(self.others[4])
+            self.others[4].profile.friends.add(*self.others[:4])
+            response, _ = self.get('ranking', friends=1, me=1)
+        self.assertEqual(response.context['page_obj']['number'], 3)
+        self.assertEqual([p.friend_position for p in response.context['profiles']], [5])
+
+    def test_standings_friends_filter(self):
+        response, few = self.get('contest_standings', self.contest.pk, friends=1)
+        self.assertEqual([row['user'].username for row in response.context['results']], ['o1', 'o4', 'viewer'])
+        self.assertContains(response, 'friends=1')
+
+        self.viewer.profile.friends.add(*self.others)
+        response, many = self.get('contest_standings', self.contest.pk, friends=1)
+        self.assertEqual(len(response.context['results']), 9)
+        self.assertEqual(few, many)
+
+        self.client.logout()
+        response, _ = self.get('contest_standings', self.contest.pk, friends=1)
+        self.assertEqual(len(response.context['results']), 9)
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        @job_handler('test_fail')
+        def fail(job, reason):
+            raise RuntimeError(reason)
+        self.addCleanup(JOB_HANDLERS.pop, 'test_fail')
+
+    def test_enqueue_reuses_pending_job(self):
+        first = enqueue('rebuild_standings', contest_id=1)
+        self.assertEqual(enqueue('rebuild_standings', contest_id=1), first)
+        self.assertNotEqual(enqueue('rebuild_standings', contest_id=2), first)
+
+    def test_failed_job_keeps_error(self):
+        enqueue('test_fail', reason='boom')
+        with self.assertLogs('archive.jobs', level='ERROR'):
+            job = run_job(claim_next())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('boom', job.error)
+        self.assertIsNotNone(job.duration())
+
+    def test_job_pages_are_staff_only(self):
+        job = enqueue('rebuild_standings')
+        self.assertEqual(self.client.get(reverse('job_detail', args=[job.pk])).status_code, 302)
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertContains(self.client.get(reverse('job_detail', args=[job.pk])), 'rebuild_standings')
+        run_job(claim_next())
+        self.assertContains(self.client.get(reverse('job_list')), 'Done')
+
+    @override_settings(JOB_LEASE_TIMEOUT=60)
+    def test_abandoned_job_is_failed(self):
+        dead = enqueue('rebuild_standings', contest_id=1)
+        alive = enqueue('rebuild_standings', contest_id=2)
+        self.assertEqual([claim_next(), claim_next()], [dead, alive])
+        # Воркер dead упал: аренду больше никто не продлевает
+        Job.objects.filter(pk__in=[dead.pk, alive.pk]).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        heartbeat([alive.pk])
+
+        with self.assertLogs('archive.jobs', level='WARNING'):
+            self.assertEqual(fail_abandoned_jobs(), 1)
+        dead.refresh_from_db()
+        self.assertEqual(dead.status, Job.FAILED)
+        self.assertIn('stopped responding', dead.error)
+        self.assertEqual(Job.objects.get(pk=alive.pk).status, Job.RUNNING)
+        # Брошенная задача больше не мешает поставить такую же заново
+        self.assertNotEqual(enqueue('rebuild_standings', contest_id=1), dead)
+
+
+@override_settings(JOB_LEASE_TIMEOUT=60)
+class JobWorkerTests(TransactionTestCase):
+    def test_worker_fails_abandoned_jobs(self):
+        enqueue('rebuild_standings', contest_id=1)
+        stale = claim_next()
+        Job.objects.filter(pk=stale.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        queued = enqueue('rebuild_standings', contest_id=2)
+        with self.assertLogs('archive.jobs', level='WARNING'):
+            self.assertEqual(run_worker(workers=1, poll_interval=0.01, once=True), 1)
+        self.assertEqual(Job.objects.get(pk=stale.pk).status, Job.FAILED)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.DONE)
+        self.assertIsNotNone(queued.heartbeat_at)
+
+
+class MarkdownCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        render_cache.clear()
+        self.addCleanup(render_cache.clear)
+
+    def test_cached_html_matches_uncached(self):
+        text = "# Title\n\n**bold** <script>alert(1)</script>\n\n| a | b |\n|---|---|\n| 1 | 2 |"
+        self.assertEqual(render_markdown(text), render_uncached(text))
+        self.assertNotIn('<script>', render_markdown(text))
+
+    def test_hit_and_miss_counters(self):
+        render_markdown('*one*')
+        render_markdown('*one*')
+        render_markdown('*two*')
+        info = render_cache.info()
+        self.assertEqual(info['misses'], 2)
+        self.assertEqual(info['local_hits'], 1)
+
+    def test_shared_tier_serves_other_processes(self):
+        render_markdown('shared text')
+        # Новый экземпляр — как кеш другого процесса с пустым локальным уровнем
+        other = RenderCache(maxsize=10)
+        other.render('shared text')
+        self.assertEqual(other.info()['shared_hits'], 1)
+        self.assertEqual(other.info()['misses'], 0)
+
+    def test_stats_endpoint(self):
+        render_markdown('*x*')
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get(reverse('markdown_cache_stats')).json()['misses'], 1)
+
+    def test_batch_rendering(self):
+        render_markdown('*cached*')
+        html = render_markdown_many(['*cached*', '', '*new*', '*new*'])
+        self.assertEqual(html, ['<p><em>cached</em></p>', '', '<p><em>new</em></p>', '<p><em>new</em></p>'])
+        self.assertEqual(render_cache.info()['misses'], 2)
+
+    def test_reused_converter_does_not_leak_state(self):
+        footnote = render_uncached('[ref]: http://example.com\n\n[link][ref]')
+        self.assertIn('href="http://example.com"', footnote)
+        self.assertNotIn('href', render_uncached('[link][ref]'))
+
+    def test_thread_local_converters(self):
+        texts = [f'**{i}**' for i in range(50)]
+        results = {}
+
+        def worker(n):
+            results[n] = [render_uncached(text) for text in texts]
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        expected = [f'<p><strong>{i}</strong></p>' for i in range(50)]
+        self.assertTrue(all(result == expected for result in results.values()))
+
+    SAMPLE_TEXT = "Some **bold** text with `code` and a [link](http://x)\n\n| a | b |\n|---|---|\n| 1 | 2 |"
+
+    def render_fresh(self, text):
+        html = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS, extension_configs=MARKDOWN_EXTENSION_CONFIGS)
+        return bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, strip=True)
+
+    def test_reused_converter_matches_fresh(self):
+        self.assertEqual(self.render_fresh(self.SAMPLE_TEXT), render_uncached(self.SAMPLE_TEXT))
+
+    @benchmark
+    def test_reused_converter_benchmark(self):
+        text = self.SAMPLE_TEXT
+
+        def per_call(func, calls=100):
+            # Лучшее из нескольких прогонов, чтобы меньше зависеть от шума
+            best = float('inf')
+            for _ in range(3):
+                started = time.perf_counter()
+                for _ in range(calls):
+                    func()
+                best = min(best, (time.perf_counter() - started) / calls)
+            return best
+
+        before = per_call(lambda: self.render_fresh(text))
+        after = per_call(lambda: render_uncached(text))
+        self.assertLess(after, before, f"per call: {before * 1e6:.0f}us before, {after * 1e6:.0f}us after")
+
+    def test_local_tier_is_bounded(self):
+        small = RenderCache(maxsize=3)
+        for i in range(10):
+            small.render(f'text {i}')
+        self.assertEqual(small.info()['local_size'], 3)
+
+
+class PrerenderedHtmlTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('writer')
+        self.post = BlogPost.objects.create(title='T', content='**hi**', author=self.author)
+
+    def test_html_is_stored_on_save(self):
+        comment = Comment.objects.create(post=self.post, author=self.author, text='`code`')
+        problem = Problem.objects.create(title='P', description='line 1\n\n<b>2</b>', correct_answer='1')
+        self.assertEqual(self.post.content_html, '<p><strong>hi</strong></p>')
+        self.assertEqual(self.post.html_version, RENDERER_VERSION)
+        self.assertEqual(comment.rendered_text, '<p><code>code</code></p>')
+        self.assertIn('&lt;b&gt;2&lt;/b&gt;', problem.rendered_description)
+
+    def test_stale_rows_are_rerendered(self):
+        BlogPost.objects.filter(pk=self.post.pk).update(content_html='<p>old</p>', html_version='outdated')
+        post = BlogPost.objects.get(pk=self.post.pk)
+        # Устаревший HTML не отдаётся даже до перерисовки
+        self.assertEqual(post.rendered_content, '<p><strong>hi</strong></p>')
+        self.assertTrue(has_stale_html())
+
+        self.assertEqual(rerender_stale_html(batch_size=1), 1)
+        self.assertFalse(has_stale_html())
+        post.refresh_from_db()
+        self.assertEqual(post.content_html, '<p><strong>hi</strong></p>')
+
+    def test_pages_use_stored_html(self):
+        Comment.objects.create(post=self.post, author=self.author, text='reply')
+        self.assertContains(self.client.get(reverse('post_detail', args=[self.post.pk])), '<strong>hi</strong>')
+        self.assertContains(self.client.get(reverse('community')), '<strong>hi</strong>')
+
+
+class CommentTreeTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('writer')
+        self.post = BlogPost.objects.create(title='T', content='body', author=self.author)
+
+    def add_thread(self, roots, depth):
+        for i in range(roots):
+            parent = None
+            for level in range(depth):
+                user = User.objects.create_user(f'u{roots}_{i}_{level}')
+                parent = Comment.objects.create(post=self.post, author=user, text=f'c{level}', parent=parent)
+
+    def render_queries(self):
+        self.client.force_login(self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('post_detail', args=[self.post.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_tree_structure(self):
+        self.add_thread(2, 3)
+        response, _ = self.render_queries()
+        roots = response.context['comments']
+        self.assertEqual(response.context['comment_count'], 6)
+        self.assertEqual(len(roots), 2)
+        self.assertEqual([c.text for c in [roots[0], roots[0].children[0], roots[0].children[0].children[0]]],
+                         ['c0', 'c1', 'c2'])
+
+    def test_query_count_is_constant(self):
+        self.add_thread(1, 2)
+        _, small = self.render_queries()
+        self.add_thread(10, 15)
+        response, large = self.render_queries()
+        self.assertEqual(response.context['comment_count'], 152)
+        self.assertEqual(small, large)
+
+
+class CommunityFeedTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('writer')
+        base = timezone.now()
+        for i in range(45):
+            post = BlogPost.objects.create(title=f'Post {i}', content=f'**{i}** ' + 'word ' * 100, author=self.author)
+            # Одинаковое время у пар постов проверяет разрешение ничьих по id
+            BlogPost.objects.filter(pk=post.pk).update(created_at=base - timedelta(minutes=i // 2), is_featured=i % 3 == 0)
+            for _ in range(i % 4):
+                Comment.objects.create(post=post, author=self.author, text='c')
+
+    def walk(self, sort):
+        seen, after, pages = [], '', 0
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('community'), {'sort': sort, 'after': after})
+            self.assertLessEqual(len(queries), 3)
+            seen.extend(post.pk for post in response.context['posts'])
+            pages += 1
+            after = response.context['next_cursor']
+            if not after:
+                return seen, pages
+
+    def test_new_sort_visits_every_post_once(self):
+        seen, pages = self.walk('new')
+        expected = list(BlogPost.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+
+    def test_featured_and_discussed_sorts(self):
+        seen, _ = self.walk('featured')
+        self.assertEqual(len(seen), 15)
+        seen, _ = self.walk('discussed')
+        expected = list(
+            BlogPost.objects.annotate(n=Count('comments')).order_by('-n', '-created_at', '-id').values_list('pk', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_preview_is_truncated_html(self):
+        response = self.client.get(reverse('community'))
+        post = response.context['posts'][0]
+        self.assertTrue(post.preview_html.startswith('<p><strong>'))
+        self.assertTrue(post.preview_html.endswith('</p>'))
+        self.assertLess(len(post.preview_html.split()), 50)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('community'), {'after': 'garbage!'})
+        self.assertEqual(len(response.context['posts']), 20)
+
+
+@unthrottled
+class SolvedSetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.p1 = Problem.objects.create(title='A', description='a', correct_answer='1')
+        self.p2 = Problem.objects.create(title='B', description='b', correct_answer='2')
+        self.client.force_login(self.user)
+
+    def submit(self, problem, answer):
+        self.client.post(reverse('problem_detail', args=[problem.pk]), {'answer': answer, 'solution': 'idea'})
+
+    def solved_count(self):
+        self.user.profile.refresh_from_db()
+        return self.user.profile.solved_count
+
+    def test_counts_each_problem_once(self):
+        self.submit(self.p1, '0')
+        self.assertEqual(self.solved_count(), 0)
+        self.submit(self.p1, '1')
+        self.submit(self.p1, '1')
+        self.submit(self.p2, '2')
+        self.assertEqual(self.solved_count(), 2)
+        self.assertEqual(
+            set(UserSolved.objects.filter(user=self.user).values_list('problem_id', flat=True)),
+            {self.p1.pk, self.p2.pk}
+        )
+
+        response = self.client.get(reverse('problem_list'))
+        self.assertEqual(response.context['solved_ids'], {self.p1.pk, self.p2.pk})
+        response = self.client.get(reverse('user_profile', args=[self.user.username]))
+        self.assertEqual(response.context['solved_count'], 2)
+
+    def test_verdict_flip(self):
+        start = timezone.now() - timedelta(hours=1)
+        first = make_submission(self.user, self.p1, start, is_correct=False)
+        second = make_submission(self.user, self.p1, start + timedelta(minutes=10), is_correct=False)
+
+        set_verdict(second, True)
+        self.assertEqual(self.solved_count(), 1)
+        set_verdict(first, True)
+        self.assertEqual(self.solved_count(), 1)
+        self.assertEqual(UserSolved.objects.get(user=self.user, problem=self.p1).first_solved_at, start)
+
+        set_verdict(first, False)
+        self.assertEqual(UserSolved.objects.get(user=self.user, problem=self.p1).first_solved_at, start + timedelta(minutes=10))
+        set_verdict(second, False)
+        self.assertEqual(self.solved_count(), 0)
+        self.assertFalse(UserSolved.objects.filter(user=self.user).exists())
+
+
+@unthrottled
+class ProblemStatsTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='pw')
+        self.bob = User.objects.create_user('bob', password='pw')
+        self.p1 = Problem.objects.create(title='A', description='a', correct_answer='1')
+        self.p2 = Problem.objects.create(title='B', description='b', correct_answer='2')
+        self.p3 = Problem.objects.create(title='C', description='c', correct_answer='3')
+
+    def submit(self, user, problem, answer):
+        self.client.force_login(user)
+        self.client.post(reverse('problem_detail', args=[problem.pk]), {'answer': answer, 'solution': 'idea'})
+
+    def stats(self, problem):
+        stats = ProblemStats.objects.get(problem=problem)
+        return stats.attempts, stats.accepted, stats.solvers
+
+    def test_incremental_matches_recompute(self):
+        self.submit(self.alice, self.p1, '0')
+        self.submit(self.alice, self.p1, '1')
+        self.submit(self.alice, self.p1, '1')
+        self.submit(self.bob, self.p1, '1')
+        self.submit(self.bob, self.p2, '0')
+        self.assertEqual(self.stats(self.p1), (4, 3, 2))
+        self.assertEqual(self.stats(self.p2), (1, 0, 0))
+
+        wrong = Submission.objects.get(author=self.bob, problem=self.p2)
+        set_verdict(wrong, True)
+        self.assertEqual(self.stats(self.p2), (1, 1, 1))
+        for sub in Submission.objects.filter(author=self.alice, problem=self.p1, is_correct=True):
+            set_verdict(sub, False)
+        self.assertEqual(self.stats(self.p1), (4, 1, 1))
+
+        self.assertEqual(recompute_problem_stats(check=True), 1)  # у задачи C нет строки
+        self.assertEqual(compute_problem_stats()[self.p1.pk], (4, 1, 1))
+
+        ProblemStats.objects.filter(problem=self.p2).update(solvers=7)
+        self.assertEqual(recompute_problem_stats(), 2)
+        self.assertEqual(self.stats(self.p2), (1, 1, 1))
+        self.assertEqual(self.stats(self.p3), (0, 0, 0))
+        self.assertEqual(recompute_problem_stats(), 0)
+
+    def test_problem_list_sort_and_filter(self):
+        self.submit(self.alice, self.p1, '0')
+        self.submit(self.alice, self.p1, '1')
+        self.submit(self.bob, self.p1, '1')
+        self.submit(self.alice, self.p2, '2')
+        self.client.force_login(self.alice)
+
+        def titles(**params):
+            response = self.client.get(reverse('problem_list'), params)
+            return [problem.title for problem in response.context['problems']]
+
+        self.assertEqual(titles(sort='popular'), ['A', 'B', 'C'])
+        self.assertEqual(titles(sort='acceptance'), ['B', 'A', 'C'])
+        self.assertEqual(titles(sort='hardest'), ['C', 'A', 'B'])
+        self.assertEqual(titles(min_solvers='2'), ['A'])
+        self.assertEqual(titles(min_acceptance='70'), ['B'])
+
+        with CaptureQueriesContext(connection) as queries:
+            list(self.client.get(reverse('problem_list'), {'sort': 'popular'}).context['problems'])
+        self.assertEqual(sum('archive_problemstats' in q['sql'] for q in queries.captured_queries), 1)
+
+
+class PublishedAtTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = User.objects.create_user('alice', password='pw')
+        self.standalone = Problem.objects.create(title='Standalone', description='s', correct_answer='1')
+        self.problem = Problem.objects.create(title='Contest problem', description='c', correct_answer='2')
+        self.future = Contest.objects.create(
+            title='Future', start_time=self.now + timedelta(days=1), end_time=self.now + timedelta(days=1, hours=2)
+        )
+        self.past = Contest.objects.create(
+            title='Past', start_time=self.now - timedelta(days=3), end_time=self.now - timedelta(days=3) + timedelta(hours=2)
+        )
+
+    def published_at(self):
+        self.problem.refresh_from_db()
+        return self.problem.published_at
+
+    def test_kept_in_sync_with_contests(self):
+        self.assertIsNone(self.published_at())
+        self.future.problems.add(self.problem)
+        self.assertEqual(self.published_at(), self.future.start_time)
+        self.problem.contests.add(self.past)
+        self.assertEqual(self.published_at(), self.past.start_time)
+
+        self.past.start_time = self.now + timedelta(days=2)
+        self.past.end_time = self.past.start_time + timedelta(hours=2)
+        self.past.save()
+        self.assertEqual(self.published_at(), self.future.start_time)
+
+        self.future.problems.remove(self.problem)
+        self.assertEqual(self.published_at(), self.past.start_time)
+        self.future.problems.add(self.problem)
+        self.past.problems.clear()
+        self.assertEqual(self.published_at(), self.future.start_time)
+        self.future.delete()
+        self.assertIsNone(self.published_at())
+        self.standalone.refresh_from_db()
+        self.assertIsNone(self.standalone.published_at)
+
+    def test_save_keeps_published_at(self):
+        stale = Problem.objects.get(pk=self.problem.pk)
+        self.past.problems.add(self.problem)
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertEqual(self.published_at(), self.past.start_time)
+        self.assertEqual(self.problem.title, 'Renamed')
+
+    def test_visibility(self):
+        self.future.problems.add(self.problem)
+        self.client.force_login(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('problem_list'))
+        self.assertEqual([p.title for p in response.context['problems']], ['Standalone'])
+        self.assertFalse(any('DISTINCT' in q['sql'] for q in queries.captured_queries))
+
+        response = self.client.get(reverse('problem_detail', args=[self.problem.pk]))
+        self.assertRedirects(response, reverse('problem_list'))
+
+        self.past.problems.add(self.problem)
+        response = self.client.get(reverse('problem_list'))
+        self.assertEqual(len(response.context['problems']), 2)
+        self.assertEqual(self.client.get(reverse('problem_detail', args=[self.problem.pk])).status_code, 200)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.start = timezone.now() - timedelta(hours=2)
+        self.contest = Contest.objects.create(
+            title='Round', start_time=self.start, end_time=self.start + timedelta(hours=3)
+        )
+        self.p1 = Problem.objects.create(title='A', description='a', correct_answer='1')
+        self.p2 = Problem.objects.create(title='B', description='b', correct_answer='2')
+        self.contest.problems.add(self.p1, self.p2)
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        make_submission(self.alice, self.p1, self.start + timedelta(minutes=3))
+        make_submission(self.alice, self.p1, self.start + timedelta(minutes=10), is_correct=True)
+        make_submission(self.bob, self.p1, self.start + timedelta(minutes=5), is_correct=True)
+        make_submission(self.bob, self.p2, self.start + timedelta(minutes=50), is_correct=True)
+        make_submission(self.alice, self.p2, self.start - timedelta(days=1), is_correct=True)
+        rebuild_scoreboard(self.contest)
+        self.staff = User.objects.create_user('admin', password='pw', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_standings_csv(self):
+        content = self.get(reverse('export_standings', args=[self.contest.pk]))
+        self.assertEqual(content.splitlines(), [
+            'rank,username,solved,penalty,A result,A time,B result,B time',
+            '1,bob,2,55,+,5,+,50',
+            '2,alice,1,30,+1,10,,',
+        ])
+
+        # Срез на момент времени считается теми же правилами
+        until = (self.start + timedelta(minutes=20)).isoformat()
+        content = self.get(reverse('export_standings', args=[self.contest.pk]), until=until, format='jsonl')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([(row['username'], row['solved'], row['penalty']) for row in rows], [('bob', 1, 5), ('alice', 1, 30)])
+        self.assertEqual(rows[0]['B result'], '')
+
+    def test_submissions_filters(self):
+        url = reverse('export_submissions')
+        content = self.get(url, contest=self.contest.pk, format='jsonl')
+        self.assertEqual(len(content.splitlines()), 4)
+        content = self.get(url, problem=self.p2.pk)
+        self.assertEqual(len(content.splitlines()), 3)
+        content = self.get(url, since=self.start.isoformat(), until=(self.start + timedelta(minutes=6)).isoformat(), format='jsonl')
+        self.assertEqual([json.loads(line)['username'] for line in content.splitlines()], ['alice', 'bob'])
+
+        self.assertEqual(self.client.get(url, {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'contest': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'problem': '1x'}).status_code, 400)
+        standings_url = reverse('export_standings', args=[self.contest.pk])
+        self.assertEqual(self.client.get(standings_url, {'problem': 'abc'}).status_code, 400)
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_time_with_offset(self):
+        # USE_TZ = False: время со смещением переводится в локальное наивное
+        until = timezone.make_aware(self.start + timedelta(minutes=20)).astimezone(timezone.get_fixed_timezone(240))
+        content = self.get(reverse('export_standings', args=[self.contest.pk]), until=until.isoformat(), format='jsonl')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([(row['username'], row['solved']) for row in rows], [('bob', 1), ('alice', 1)])
+        content = self.get(reverse('export_submissions'), until=until.isoformat(), contest=self.contest.pk)
+        self.assertEqual(len(content.splitlines()), 4)
+        self.get(reverse('export_submissions'), since='2026-01-01T00:00Z')
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_results', 'standings', contest=self.contest.pk, stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[1], '1,bob,2,55,+,5,+,50')
+        out = StringIO()
+        call_command('export_results', 'submissions', problem=[self.p1.pk], format='jsonl', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class ImportPackageTests(TestCase):
+    def setUp(self):
+        self.start = (timezone.now() + timedelta(days=1)).replace(microsecond=0)
+        self.records = [
+            {'type': 'problem', 'id': 'p1', 'title': 'Sum', 'description': 'Line one\nLine two', 'correct_answer': '  42 '},
+            {'type': 'problem', 'id': 'p2', 'title': 'Product', 'description': 'b', 'correct_answer': 7, 'difficulty': 30},
+            {'type': 'problem', 'id': 'p3', 'title': 'Standalone', 'description': 'c', 'correct_answer': '1'},
+            {
+                'type': 'contest', 'id': 'r1', 'title': 'Round 1', 'problems': ['p1', 'p2'],
+                'start_time': self.start.isoformat(), 'end_time': (self.start + timedelta(hours=2)).isoformat(),
+            },
+        ]
+
+    def package(self, records):
+        return BytesIO(''.join(json.dumps(record) + '\n' for record in records).encode())
+
+    def test_import_and_reimport(self):
+        summary = import_package(read_package(self.package(self.records)), batch_size=2)
+        self.assertEqual(summary, {
+            'problems_created': 3, 'problems_updated': 0, 'contests_created': 1, 'contests_updated': 0, 'links': 2,
+        })
+        p1 = Problem.objects.get(external_id='p1')
+        self.assertEqual(p1.correct_answer, '42')
+        self.assertEqual(p1.description_html, '<p>Line one<br>Line two</p>')
+        self.assertEqual(p1.published_at, self.start)
+        self.assertIsNone(Problem.objects.get(external_id='p3').published_at)
+        contest = Contest.objects.get(external_id='r1')
+        self.assertEqual(set(contest.problems.values_list('external_id', flat=True)), {'p1', 'p2'})
+
+        # Повторный импорт: те же строки обновляются, состав контеста заменяется
+        self.records[0]['title'] = 'Sum of two'
+        self.records[3]['problems'] = ['p2', 'p3']
+        summary = import_package(read_package(self.package(self.records)))
+        self.assertEqual((summary['problems_created'], summary['problems_updated']), (0, 3))
+        self.assertEqual((summary['contests_created'], summary['contests_updated']), (0, 1))
+        self.assertEqual(Problem.objects.count(), 3)
+        p1.refresh_from_db()
+        self.assertEqual(p1.title, 'Sum of two')
+        self.assertIsNone(p1.published_at)
+        self.assertEqual(Problem.objects.get(external_id='p3').published_at, self.start)
+        self.assertEqual(set(contest.problems.values_list('external_id', flat=True)), {'p2', 'p3'})
+
+    def test_invalid_package_writes_nothing(self):
+        self.records[1]['correct_answer'] = '   '
+        self.records[3]['problems'].append('missing')
+        with self.assertRaises(PackageError) as raised:
+            import_package(read_package(self.package(self.records)))
+        # Пустой ответ p2, ссылка контеста на отброшенную p2 и на несуществующую задачу
+        self.assertEqual(len(raised.exception.errors), 3)
+        self.assertFalse(Problem.objects.exists())
+
+    def test_zip_command_and_admin(self):
+        archive = BytesIO()
+        with zipfile.ZipFile(archive, 'w') as package:
+            package.writestr('1-problems.jsonl', self.package(self.records[:3]).getvalue())
+            package.writestr('2-contests.jsonl', self.package(self.records[3:]).getvalue())
+        with tempfile.NamedTemporaryFile(suffix='.zip') as path:
+            path.write(archive.getvalue())
+            path.flush()
+            out = StringIO()
+            call_command('import_package', path.name, stdout=out)
+        self.assertIn('Problems: 3 created', out.getvalue())
+        self.assertEqual(Contest.objects.get(external_id='r1').problems.count(), 2)
+
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        upload = SimpleUploadedFile('package.zip', archive.getvalue())
+        response = self.client.post(reverse('admin:archive_problem_import'), {'package': upload})
+        self.assertRedirects(response, reverse('admin:archive_problem_changelist'))
+        self.assertEqual(Problem.objects.count(), 3)
+
+
+@unthrottled
+class AnswerCheckerTests(TestCase):
+    def assert_verdicts(self, kind, canonical, accepted, rejected, tolerance=1e-6):
+        check = compile_checker(kind, canonical, tolerance)
+        for answer in accepted:
+            self.assertTrue(check(answer), f"{kind}: {answer!r} should match {canonical!r}")
+        for answer in rejected:
+            self.assertFalse(check(answer), f"{kind}: {answer!r} should not match {canonical!r}")
+
+    def test_checkers(self):
+        self.assert_verdicts('exact', 'Yes', [' yes', 'YES'], ['no', 'yes!'])
+        self.assert_verdicts(
+            'numeric', '1/2', ['0.5', '.5', '\\frac{1}{2}', '\\dfrac12', '2^{-1}', '$1/2$'], ['0.51', '1/3', 'x', '']
+        )
+        self.assert_verdicts('numeric', '3.14', ['3.1', 'pi'], ['3'], tolerance=0.02)
+        self.assert_verdicts('numeric', '\\sqrt{2}', ['sqrt(2)', '√2', '2^{1/2}', '\\sqrt[2]{2}'], ['1.41'])
+        self.assert_verdicts('rational', '1/2', ['0.5', '\\frac{2}{4}', '2^{-1}', '\\sqrt{1/4}'], ['0.5000001', 'sqrt(2)'])
+        self.assert_verdicts('tuple', '(1, 1/2)', ['(1, 0.5)', '1, \\frac12', '[1; 2^{-1}]'], ['(0.5, 1)', '(1)', '(1, 0.5, 0)'])
+        self.assert_verdicts('set', '\\{1, 2, 3\\}', ['{3, 2, 1}', '(1,2,3)', '{1, 1, 2, 3}'], ['{1, 2}', '{1, 2, 4}'])
+        self.assert_verdicts(
+            'symbolic', '(x+1)^2', ['x^2+2x+1', '(1+x)(x+1)', 'x**2 + 2*x + 1'], ['x^2+1', 'y^2+2y+1', '(x+1']
+        )
+        self.assert_verdicts('symbolic', '\\frac{\\sin x}{\\cos x}', ['tan x', 'sin(x)/cos(x)'], ['cot x'])
+        self.assert_verdicts('rational', '1', [], ['((9^999)^999)^999'])
+
+    def test_problem_integration(self):
+        problem = Problem(title='Half', description='h', correct_answer='1/2', checker='rational')
+        problem.full_clean()
+        problem.save()
+        problem.checker = 'numeric'
+        problem.correct_answer = 'one half'
+        with self.assertRaises(ValidationError):
+            problem.full_clean()
+
+        problem = Problem.objects.get(pk=problem.pk)
+        self.assertIs(problem.answer_checker(), Problem.objects.get(pk=problem.pk).answer_checker())
+        user = User.objects.create_user('alice', password='pw')
+        self.client.force_login(user)
+        response = self.client.post(reverse('problem_detail', args=[problem.pk]), {'answer': '\\frac{1}{2}', 'solution': ''})
+        self.assertEqual(response.context['result'], 'correct')
+        self.assertTrue(Submission.objects.get(author=user).is_correct)
+
+    def test_deeply_nested_answers_are_rejected(self):
+        hostile = [
+            '(' * 3000 + '1' + ')' * 3000, '-' * 5000 + '1', '2^' * 400 + '2', 'sqrt' * 400 + '4',
+            '+'.join(['1'] * 499), '\\frac{' * 60 + '1' + '}{1}' * 60,
+        ]
+        for kind in ['numeric', 'rational', 'tuple', 'set', 'symbolic']:
+            self.assert_verdicts(kind, '(1, 2)' if kind in ('tuple', 'set') else '1', [], hostile)
+
+        problem = Problem.objects.create(title='One', description='o', correct_answer='1', checker='numeric')
+        self.client.force_login(User.objects.create_user('mallory', password='pw'))
+        response = self.client.post(reverse('problem_detail', args=[problem.pk]), {'answer': hostile[0], 'solution': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Submission.objects.get(problem=problem).is_correct)
+
+    # Вид проверки: (эталон, ответы, вердикты)
+    THROUGHPUT_CASES = {
+        'exact': ('42', ['42', ' 41 '], [True, False]),
+        'numeric': ('1/2', ['0.5', '\\frac{1}{2}', '2^{-1}'], [True, True, True]),
+        'rational': ('1/2', ['0.5', '\\frac{1}{2}', '2^{-1}'], [True, True, True]),
+        'tuple': ('(1, 2)', ['(1, 2)', '(2, 1)'], [True, False]),
+        'set': ('{1, 2, 3}', ['{3, 2, 1}', '{1, 2}'], [True, False]),
+        'symbolic': ('(x+1)^2', ['x^2+2x+1', '(x+1)(x-1)'], [True, False]),
+    }
+
+    def test_compiled_checker_verdicts(self):
+        for kind, (canonical, answers, verdicts) in self.THROUGHPUT_CASES.items():
+            check = compile_checker(kind, canonical, 1e-6)
+            # Повторная проверка тем же объектом даёт тот же вердикт
+            self.assertEqual([check(answer) for answer in answers * 2], verdicts * 2, kind)
+
+    @benchmark
+    def test_throughput(self):
+        # Эталон разобран заранее: на посылку — один разбор ответа и одно сравнение
+        checks = 2000
+        for kind, (canonical, answers, _) in self.THROUGHPUT_CASES.items():
+            check = compile_checker(kind, canonical, 1e-6)
+            started = time.perf_counter()
+            for i in range(checks):
+                check(answers[i % len(answers)])
+            rate = checks / (time.perf_counter() - started)
+            self.assertGreater(rate, 2000, f"{kind}: {rate:.0f} checks/s")
+
+
+class RejudgeTests(TestCase):
+    def setUp(self):
+        self.start = timezone.now() - timedelta(hours=1)
+        self.contest = Contest.objects.create(
+            title='Round', start_time=self.start, end_time=self.start + timedelta(hours=2)
+        )
+        self.problem = Problem.objects.create(title='Half', description='h', correct_answer='0.5')
+        self.contest.problems.add(self.problem)
+        self.users = [User.objects.create_user(f'user{i}') for i in range(4)]
+        answers = ['0.5', '1/2', '\\frac{1}{2}', '2']
+        for i, (user, answer) in enumerate(zip(self.users, answers)):
+            sub = make_submission(user, self.problem, self.start + timedelta(minutes=i + 1), is_correct=(answer == '0.5'))
+            Submission.objects.filter(pk=sub.pk).update(user_answer=answer)
+        rebuild_scoreboard(self.contest)
+        recompute_problem_stats()
+        rebuild_problem_solved(self.problem.pk)
+
+    def assert_derived_in_sync(self):
+        entries, cells = build_scoreboard(self.contest)
+        self.assertEqual(scoreboard_drift(self.contest, entries, cells), 0)
+        self.assertEqual(recompute_problem_stats(check=True), 0)
+        for user in self.users:
+            profile = Profile.objects.get(user=user)
+            self.assertEqual(profile.solved_count, UserSolved.objects.filter(user=user).count())
+
+    def test_rejudge_with_new_checker(self):
+        # Ошибка в эталоне исправлена, а проверка переключена на числовую
+        Problem.objects.filter(pk=self.problem.pk).update(checker='numeric')
+        self.problem.refresh_from_db()
+
+        summary = rejudge_problem(self.problem, dry_run=True)
+        self.assertEqual((summary['flipped'], summary['to_correct']), (2, 2))
+        self.assertEqual(Submission.objects.filter(is_correct=True).count(), 1)
+
+        summary = rejudge_problem(self.problem, chunk_size=2, processes=2)
+        self.assertEqual(summary['checked'], 4)
+        self.assertEqual((summary['flipped'], summary['to_correct'], summary['to_wrong']), (2, 2, 0))
+        self.assertEqual((summary['solvers_added'], summary['solvers_removed'], summary['contests']), (2, 0, 1))
+        self.assertEqual(ProblemStats.objects.get(problem=self.problem).solvers, 3)
+        self.assert_derived_in_sync()
+
+        self.assertEqual(rejudge_problem(self.problem)['flipped'], 0)
+
+    def test_rejudge_command_and_admin_action(self):
+        Problem.objects.filter(pk=self.problem.pk).update(correct_answer='2')
+        out = StringIO()
+        call_command('rejudge', str(self.problem.pk), stdout=out)
+        self.assertIn('2 flipped (+1 / -1)', out.getvalue())
+        self.assertEqual(list(Submission.objects.filter(is_correct=True).values_list('user_answer', flat=True)), ['2'])
+        self.assert_derived_in_sync()
+
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        self.client.post(reverse('admin:archive_problem_changelist'), {
+            'action': 'rejudge_submissions', '_selected_action': [self.problem.pk],
+        })
+        job = Job.objects.get(kind='rejudge')
+        self.assertEqual(job.payload, {'problem_id': self.problem.pk})
+        run_job(claim_next())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertIn('0 verdict(s) flipped', job.result)
+
+    def test_admin_edits_keep_derived_in_sync(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='pw'))
+        wrong = Submission.objects.get(user_answer='2')
+        response = self.client.post(reverse('admin:archive_submission_change', args=[wrong.pk]), {
+            'solution_text': 'checked by hand', 'is_correct': 'on',
+        })
+        self.assertEqual(response.status_code, 302)
+        wrong.refresh_from_db()
+        self.assertEqual((wrong.is_correct, wrong.solution_text, wrong.user_answer), (True, 'checked by hand', '2'))
+        self.assertEqual(ProblemStats.objects.get(problem=self.problem).solvers, 2)
+        self.assert_derived_in_sync()
+
+        correct = Submission.objects.get(user_answer='0.5')
+        self.client.post(reverse('admin:archive_submission_delete', args=[correct.pk]), {'post': 'yes'})
+        self.client.post(reverse('admin:archive_submission_changelist'), {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': list(Submission.objects.filter(user_answer='1/2').values_list('pk', flat=True)),
+        })
+        self.assertEqual(Submission.objects.count(), 2)
+        self.assertEqual(self.contest.standings.count(), 2)
+        self.assert_derived_in_sync()
+
+
+@override_settings(SUBMISSION_RATE_CAPACITY=2, SUBMISSION_RATE_REFILL=60, SUBMISSION_DEDUPE_WINDOW=30)
+class SubmissionThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Вёдра остаются в кеше и иначе достались бы следующим тестам с теми же id
+        self.addCleanup(cache.clear)
+        submission_throttle.clear()
+        self.user = User.objects.create_user('alice', password='pw')
+        self.problem = Problem.objects.create(title='A', description='a', correct_answer='42')
+        self.other = Problem.objects.create(title='B', description='b', correct_answer='7')
+        self.client.force_login(self.user)
+
+    def submit(self, answer, problem=None):
+        return self.client.post(
+            reverse('problem_detail', args=[(problem or self.problem).pk]), {'answer': answer, 'solution': ''}
+        )
+
+    def test_duplicate_answer_reuses_verdict(self):
+        self.assertEqual(self.submit('41').context['result'], 'wrong')
+        response = self.submit(' 41 ')
+        self.assertEqual(response.context['result'], 'wrong')
+        self.assertEqual(Submission.objects.count(), 1)
+        self.assertEqual(self.submit('42').context['result'], 'correct')
+        self.assertEqual(self.submit('42').context['result'], 'correct')
+        self.assertEqual(Submission.objects.count(), 2)
+        self.assertEqual(submission_throttle.info()['deduplicated'], 2)
+
+    def test_token_bucket(self):
+        now = time.time()
+        with mock.patch('archive.throttle.time.time', return_value=now):
+            self.submit('1')
+            self.submit('2')
+            response = self.submit('3')
+            self.assertEqual(response.status_code, 429)
+            self.assertIsNone(response.context['result'])
+            # Ведро своё у каждой задачи
+            self.assertEqual(self.submit('7', self.other).context['result'], 'correct')
+        self.assertEqual(Submission.objects.filter(problem=self.problem).count(), 2)
+
+        with mock.patch('archive.throttle.time.time', return_value=now + 61):
+            self.assertEqual(self.submit('42').status_code, 200)
+            self.assertEqual(self.submit('43').status_code, 429)
+        self.assertEqual(Submission.objects.filter(problem=self.problem).count(), 3)
+        self.assertEqual(submission_throttle.info()['rejected'], 2)
+
+        staff = User.objects.create_user('admin', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        stats = self.client.get(reverse('submission_throttle_stats')).json()
+        self.assertEqual((stats['accepted'], stats['rejected'], stats['capacity']), (4, 2, 2))
+
+    @override_settings(SUBMISSION_RATE_REFILL=0)
+    def test_zero_refill_disables_limit(self):
+        for answer in ('1', '2', '3', '4'):
+            self.assertEqual(self.submit(answer).status_code, 200)
+        self.assertEqual(Submission.objects.count(), 4)
+        self.assertEqual(submission_throttle.info()['rejected'], 0)
+
+    def test_verdict_change_forgets_answer(self):
+        self.assertEqual(self.submit('41').context['result'], 'wrong')
+        set_verdict(Submission.objects.get(), True)
+        # Запомненный «wrong» устарел: ответ проверяется заново
+        self.assertEqual(self.submit('41').context['result'], 'wrong')
+        self.assertEqual(Submission.objects.count(), 2)
+
+        self.assertEqual(self.submit('7', self.other).context['result'], 'correct')
+        self.other.correct_answer = '8'
+        self.other.save()
+        rejudge_problem(self.other)
+        self.assertEqual(self.submit('7', self.other).context['result'], 'wrong')
+        self.assertEqual(Submission.objects.filter(problem=self.other).count(), 2)
+
+
+class SubmissionIngestTests(TestCase):
+    def setUp(self):
+        start = timezone.now() - timedelta(minutes=10)
+        self.contest = Contest.objects.create(title='Live', start_time=start, end_time=start + timedelta(hours=1))
+        self.problem = Problem.objects.create(title='A', description='a', correct_answer='42')
+        self.contest.problems.add(self.problem)
+        self.users = [User.objects.create_user(f'user{i}') for i in range(3)]
+
+    def test_group_commit_updates_derived_tables(self):
+        ingest = SubmissionIngest()
+        batch = [
+            Submission(author=user, problem=self.problem, user_answer=answer, is_correct=(answer == '42'))
+            for user in self.users for answer in ('1', '42')
+        ]
+        ingest.write(batch)
+        self.assertEqual(Submission.objects.count(), 6)
+        self.assertTrue(all(submission.pk for submission in batch))
+        self.assertEqual(ProblemStats.objects.get(problem=self.problem).solvers, 3)
+        self.assertEqual(UserSolved.objects.filter(problem=self.problem).count(), 3)
+        entries, cells = build_scoreboard(self.contest)
+        self.assertEqual(scoreboard_drift(self.contest, entries, cells), 0)
+        self.assertEqual(ingest.info()['written'], 6)
+
+    def test_submission_time_is_request_time(self):
+        submitted = timezone.now() - timedelta(seconds=30)
+        submission = Submission(author=self.users[0], problem=self.problem, user_answer='42', submitted_at=submitted)
+        SubmissionIngest().write([submission])
+        self.assertEqual(Submission.objects.get(pk=submission.pk).submitted_at, submitted)
+
+    def test_bad_row_does_not_drop_batch(self):
+        ingest = SubmissionIngest()
+        good = Submission(author=self.users[0], problem=self.problem, user_answer='1')
+        bad = Submission(author=self.users[1], problem=self.problem, user_answer=None)
+        with self.assertLogs('archive.ingest', level='ERROR'):
+            ingest.write([good, bad])
+        self.assertEqual(list(Submission.objects.values_list('author_id', flat=True)), [self.users[0].pk])
+        self.assertEqual((ingest.info()['written'], ingest.info()['failed']), (1, 1))
+
+
+@unthrottled
+@override_settings(SUBMISSION_INGEST_ENABLED=True)
+class SubmissionIngestThreadTests(TransactionTestCase):
+    def test_queued_submissions_are_written(self):
+        problem = Problem.objects.create(title='A', description='a', correct_answer='42')
+        user = User.objects.create_user('alice', password='pw')
+        self.client.force_login(user)
+        for answer in ('1', '2', '42'):
+            response = self.client.post(reverse('problem_detail', args=[problem.pk]), {'answer': answer, 'solution': ''})
+            self.assertEqual(response.context['result'], 'correct' if answer == '42' else 'wrong')
+        submission_ingest.flush()
+        self.assertEqual(Submission.objects.filter(author=user).count(), 3)
+        user.profile.refresh_from_db()
+        self.assertEqual(user.profile.solved_count, 1)
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN для горячих запросов к Submission: никаких полных сканов таблицы."""
+
+    def setUp(self):
+        now = timezone.now()
+        self.user = User.objects.create_user('alice')
+        self.staff = User.objects.create_user('admin', is_staff=True)
+        self.problem = Problem.objects.create(title='A', description='a', correct_answer='1')
+        self.contest = Contest.objects.create(title='R', start_time=now, end_time=now + timedelta(hours=2))
+        self.contest.problems.add(self.problem)
+
+    def assert_indexed(self, queryset, limited=False):
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            if 'archive_submission' in line or ' U0 ' in line:
+                self.assertNotRegex(line, r'SCAN (archive_submission|U0)(?! USING)', plan)
+        if limited:
+            # Для лент с LIMIT индекс должен давать порядок, иначе читается вся таблица
+            self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
+        return plan
+
+    def test_standings_window(self):
+        problems = [self.problem]
+        submissions = contest_submissions(self.contest, problems)
+        plan = self.assert_indexed(
+            submissions.order_by('author_id', 'problem_id', 'submitted_at', 'id')
+            .values_list('author_id', 'problem_id', 'submitted_at', 'is_correct')
+        )
+        self.assertIn('submission_problem_time_idx', plan)
+        self.assert_indexed(User.objects.filter(id__in=submissions.values('author_id')))
+
+    def test_user_history(self):
+        self.assert_indexed(
+            Submission.objects.filter(
+                author=self.user, problem=self.problem,
+                submitted_at__gte=self.contest.start_time, submitted_at__lte=self.contest.end_time
+            ).order_by('submitted_at', 'id')
+        )
+        self.assert_indexed(Submission.objects.filter(author=self.user).order_by('-submitted_at')[:15], limited=True)
+
+    def test_solved_sets(self):
+        # Первая верная посылка — по ней пересчитывается UserSolved при смене вердикта
+        self.assert_indexed(
+            Submission.objects.filter(author=self.user, problem=self.problem, is_correct=True)
+            .order_by('submitted_at').values_list('submitted_at', flat=True)[:1]
+        )
+        plan = UserSolved.objects.filter(user=self.user).values_list('problem_id', flat=True).explain()
+        self.assertNotRegex(plan, r'SCAN archive_usersolved(?! USING)')
+
+    def test_submission_feed(self):
+        for user in (self.staff, AnonymousUser()):
+            for problem_id in (None, self.problem.pk):
+                for status in (None, 'correct'):
+                    self.assert_indexed(submission_feed(user, problem_id, status), limited=True)
@@ -0,0 +1,120 @@
+import hashlib
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import Submission
+
+
+class SubmissionThrottle:
+    """
+    Ограничение частоты посылок на пару (пользователь, задача).
+
+    Token bucket хранится в кеше Django: в ведре до SUBMISSION_RATE_CAPACITY
+    жетонов, один жетон восстанавливается за SUBMISSION_RATE_REFILL секунд.
+    Тот же ответ в течение SUBMISSION_DEDUPE_WINDOW секунд не создаёт новую
+    посылку — возвращается вердикт предыдущей (и жетон не тратится); при смене
+    вердикта (set_verdict, перепроверка) запомненный вердикт забывается.
+    SUBMISSION_RATE_REFILL <= 0 отключает ограничение частоты.
+    Чтение и запись ведра не атомарны: при гонке двух запросов пользователь
+    может получить лишний жетон, что для ограничения частоты допустимо.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {'accepted': 0, 'deduplicated': 0, 'rejected': 0}
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'SUBMISSION_THROTTLE_CACHE', 'default')]
+
+    @property
+    def capacity(self):
+        return getattr(settings, 'SUBMISSION_RATE_CAPACITY', 5)
+
+    @property
+    def refill(self):
+        return getattr(settings, 'SUBMISSION_RATE_REFILL', 10)
+
+    @property
+    def dedupe_window(self):
+        return getattr(settings, 'SUBMISSION_DEDUPE_WINDOW', 30)
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    @staticmethod
+    def answer_key(user_id, problem_id, answer):
+        digest = hashlib.sha1(answer.encode()).hexdigest()
+        return f"submit:last:{user_id}:{problem_id}:{digest}"
+
+    def previous_verdict(self, user_id, problem_id, answer):
+        """Вердикт недавней посылки с тем же ответом (dict с 'is_correct') или None."""
+        if not self.dedupe_window:
+            return None
+        previous = self.cache.get(self.answer_key(user_id, problem_id, answer))
+        if previous is not None:
+            self._count('deduplicated')
+        return previous
+
+    def remember(self, submission):
+        # Только вердикт: из очереди ingest посылка приходит ещё без pk
+        if self.dedupe_window:
+            self.cache.set(
+                self.answer_key(submission.author_id, submission.problem_id, submission.user_answer),
+                {'is_correct': submission.is_correct},
+                self.dedupe_window
+            )
+
+    def forget(self, submissions):
+        """Убирает запомненные вердикты посылок, чтобы повтор ответа проверялся заново."""
+        if self.dedupe_window:
+            self.cache.delete_many([
+                self.answer_key(submission.author_id, submission.problem_id, submission.user_answer)
+                for submission in submissions
+            ])
+
+    def forget_recent(self, problem_id):
+        """Забывает вердикты посылок задачи, которые ещё могут быть в кеше (за dedupe_window)."""
+        if self.dedupe_window:
+            since = timezone.now() - timedelta(seconds=self.dedupe_window)
+            self.forget(
+                Submission.objects.filter(problem_id=problem_id, submitted_at__gte=since)
+                .only('author_id', 'problem_id', 'user_answer')
+            )
+
+    def acquire(self, user_id, problem_id):
+        """Берёт жетон; возвращает 0, если посылка разрешена, иначе сколько секунд ждать."""
+        if self.refill <= 0:
+            self._count('accepted')
+            return 0
+        key = f"submit:bucket:{user_id}:{problem_id}"
+        now = time.time()
+        tokens, updated_at = self.cache.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated_at) / self.refill)
+        if tokens < 1:
+            self._count('rejected')
+            return int((1 - tokens) * self.refill) + 1
+        # Ведро полностью восстановится за capacity * refill — дальше ключ не нужен
+        self.cache.set(key, (tokens - 1, now), int(self.capacity * self.refill) + 1)
+        self._count('accepted')
+        return 0
+
+    def clear(self):
+        with self._lock:
+            for stat in self.stats:
+                self.stats[stat] = 0
+
+    def info(self):
+        with self._lock:
+            return dict(
+                self.stats, capacity=self.capacity, refill_seconds=self.refill, dedupe_window=self.dedupe_window
+            )
+
+
+submission_throttle = SubmissionThrottle()
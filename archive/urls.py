@@ -16,11 +16,20 @@ urlpatterns = [
     path('contests/<int:contest_id>/problem/<int:pk>/', views.problem_detail, name='contest_problem_detail'),
 
     path('contest/<int:pk>/calculate/', views.calculate_contest_rating, name='calculate_rating'),
+    path('contest/<int:pk>/rebuild-standings/', views.rebuild_contest_standings, name='rebuild_standings'),
+    path('contest/<int:pk>/export-standings/', views.export_contest_standings, name='export_standings'),
+    path('submissions/export/', views.export_submission_list, name='export_submissions'),
+    path('jobs/', views.job_list, name='job_list'),
+    path('jobs/<int:pk>/', views.job_detail, name='job_detail'),
+    path('stats/markdown-cache/', views.markdown_cache_stats, name='markdown_cache_stats'),
+    path('stats/submission-throttle/', views.submission_throttle_stats, name='submission_throttle_stats'),
 
     path('profile/', views.profile_view, name='profile_view'), # Добавь это
     path('user/<str:username>/', views.user_profile_view, name='user_profile'),
 
     path('search/', views.user_search, name='user_search'),
+    path('search/users.json', views.user_typeahead, name='user_typeahead'),
+    path('search/content/', views.content_search, name='content_search'),
     path('user/<str:username>/toggle-friend/', views.toggle_friend, name='toggle_friend'),
     path('friends/', views.friends_list_view, name='friends_list'),
 
@@ -2,49 +2,87 @@ import math
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils import timezone
 from django.contrib.auth.forms import UserCreationForm
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views import generic
 from django.contrib.auth.decorators import login_required
-from .models import Problem, Submission, Contest, Profile, Rank, RatingHistory
+from .models import Problem, Submission, Contest, Profile, Job, UserSolved
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Q
 from django.core.paginator import Paginator
 from .models import BlogPost  
 from .models import Comment
-from django.db.models import Count
+from django.db.models import Count, F, FloatField, Max, Window
+from django.db.models.functions import Coalesce, NullIf, RowNumber
+from .standings import scoreboard_rows
+from .ingest import submission_ingest, submit_answer
+from .judging import set_verdict
+from .jobs import enqueue
+from .rendering import render_cache
+from .throttle import submission_throttle
+from .ranks import annotate_ranks, rank_resolver
+from .search import SEARCH_MAX_PAGES, TYPEAHEAD_LIMIT, search_posts, search_problems, search_users
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from .export import EXPORT_FORMATS, export_standings, export_submissions, parse_id, parse_time, serialize
+from django.utils.text import Truncator
+from datetime import datetime
+from .pagination import keyset_page
 
 # --- ARCHIVE ---
+def solved_problem_ids(user, problems=None):
+    """Множество id решённых пользователем задач (для проверок в шаблонах)."""
+    if not user.is_authenticated:
+        return set()
+    solved = UserSolved.objects.filter(user=user)
+    if problems is not None:
+        solved = solved.filter(problem__in=problems)
+    return set(solved.values_list('problem_id', flat=True))
+
+PROBLEM_SORTS = {
+    'popular': ('-solver_count', '-attempt_count', 'id'),
+    'acceptance': ('-acceptance', '-solver_count', 'id'),
+    'hardest': ('acceptance', 'solver_count', 'id'),
+}
+
 def problem_list(request):
-    now = timezone.now()
     if request.user.is_staff:
         problems = Problem.objects.all()
     else:
-        problems = Problem.objects.filter(
-            Q(contests__isnull=True) | Q(contests__start_time__lte=now)
-        ).distinct()
+        problems = Problem.objects.filter(Problem.published_q())
+
+    # Статистика приходит одним LEFT JOIN к ProblemStats; задачи без посылок получают нули
+    problems = problems.annotate(
+        solver_count=Coalesce('stats__solvers', 0),
+        attempt_count=Coalesce('stats__attempts', 0),
+        acceptance=Coalesce(
+            100.0 * F('stats__accepted') / NullIf('stats__attempts', 0), 0.0, output_field=FloatField()
+        ),
+    )
 
-    solved_ids = []
-    if request.user.is_authenticated:
-        solved_ids = Submission.objects.filter(
-            author=request.user, 
-            is_correct=True
-        ).values_list('problem_id', flat=True).distinct()
+    min_solvers = request.GET.get('min_solvers', '')
+    if min_solvers.isdigit():
+        problems = problems.filter(solver_count__gte=int(min_solvers))
+    min_acceptance = request.GET.get('min_acceptance', '')
+    if min_acceptance.isdigit():
+        problems = problems.filter(acceptance__gte=int(min_acceptance))
+
+    sort = request.GET.get('sort', '')
+    problems = problems.order_by(*PROBLEM_SORTS.get(sort, ('id',)))
+
+    solved_ids = solved_problem_ids(request.user)
     
-    return render(request, 'archive/problem_list.html', {'problems': problems, 'solved_ids': solved_ids})
+    return render(request, 'archive/problem_list.html', {
+        'problems': problems, 'solved_ids': solved_ids, 'sort': sort,
+        'min_solvers': min_solvers, 'min_acceptance': min_acceptance,
+    })
 
 def problem_detail(request, pk, contest_id=None):
     problem = get_object_or_404(Problem, pk=pk)
     now = timezone.now()
     
-    if not request.user.is_staff:
-        future_contests = problem.contests.filter(start_time__gt=now)
-        has_started_contest = problem.contests.filter(start_time__lte=now).exists()
-        
-        if future_contests.exists() and not has_started_contest:
-            messages.error(request, "This problem has not been published yet.")
-            return redirect('problem_list')
+    if not request.user.is_staff and not problem.is_published:
+        messages.error(request, "This problem has not been published yet.")
+        return redirect('problem_list')
 
     contest = None
     if contest_id:
@@ -54,52 +92,54 @@ def problem_detail(request, pk, contest_id=None):
     is_banned = getattr(request.user.profile, 'is_disqualified', False) if request.user.is_authenticated else False
 
     result = None
+    status = 200
     if request.method == 'POST' and not is_banned:
         user_answer = request.POST.get('answer', '').strip()
         solution = request.POST.get('solution', '')
         
-        # Надежное сравнение строк
-        correct_val = str(problem.correct_answer).strip().lower()
-        is_correct = (user_answer.lower() == correct_val)
-        
         if request.user.is_authenticated:
-            Submission.objects.create(
-                author=request.user,
-                problem=problem,
-                user_answer=user_answer,
-                solution_text=solution,
-                is_correct=is_correct
-            )
+            previous = submission_throttle.previous_verdict(request.user.id, problem.id, user_answer)
+            retry_after = 0 if previous else submission_throttle.acquire(request.user.id, problem.id)
+            if previous:
+                # Тот же ответ только что отправлялся — новую посылку не создаём
+                is_correct = previous['is_correct']
+                messages.info(request, "You have just submitted this answer; showing its verdict.")
+            elif retry_after:
+                messages.error(request, f"Too many submissions. Try again in {retry_after} s.")
+                status = 429
+            else:
+                submission = submit_answer(request.user, problem, user_answer, solution)
+                is_correct = submission.is_correct
+                submission_throttle.remember(submission)
+        else:
+            is_correct = problem.check_answer(user_answer)
         
-        result = "correct" if is_correct else "wrong"
+        if status == 200:
+            result = "correct" if is_correct else "wrong"
         
     return render(request, 'archive/problem_detail.html', {
         'problem': problem, 
         'result': result, 
         'active_contest': active_contest, 
         'is_banned': is_banned
-    })
+    }, status=status)
 
 # --- SUBMISSIONS ---
-def submission_list(request):
-    now = timezone.now()
-    base_query = Submission.objects.filter(author__profile__is_disqualified=False)
-    
-    problem_id = request.GET.get('problem_id')
-    status = request.GET.get('status')
-    
+def submission_feed(user, problem_id=None, status=None):
+    """Последние 50 посылок ленты с учётом фильтров и видимости задач."""
+    base_query = Submission.objects.filter(author__profile__is_disqualified=False).select_related('author', 'problem')
+
     if problem_id:
         base_query = base_query.filter(problem_id=problem_id)
     if status == 'correct':
         base_query = base_query.filter(is_correct=True)
 
-    if request.user.is_staff:
-        submissions = base_query.order_by('-submitted_at')[:50]
-    else:
-        submissions = base_query.filter(
-            Q(problem__contests__isnull=True) | Q(problem__contests__start_time__lte=now)
-        ).distinct().order_by('-submitted_at')[:50]
-        
+    if user.is_staff:
+        return base_query.order_by('-submitted_at')[:50]
+    return base_query.filter(Problem.published_q('problem__')).order_by('-submitted_at')[:50]
+
+def submission_list(request):
+    submissions = submission_feed(request.user, request.GET.get('problem_id'), request.GET.get('status'))
     return render(request, 'archive/submission_list.html', {'submissions': submissions})
 
 def submission_detail(request, pk):
@@ -126,36 +166,38 @@ def contest_dashboard(request, pk):
         return redirect('contest_list')
 
     problems = contest.problems.all()
-    solved_ids = Submission.objects.filter(author=request.user, is_correct=True).values_list('problem_id', flat=True).distinct() if request.user.is_authenticated else []
+    solved_ids = solved_problem_ids(request.user, problems)
     return render(request, 'archive/contest_dashboard.html', {'contest': contest, 'problems': problems, 'solved_ids': solved_ids})
 
+def friend_ids(user):
+    """id друзей пользователя вместе с ним самим — одним запросом, для фильтров «только друзья»."""
+    ids = set(user.profile.friends.values_list('id', flat=True))
+    ids.add(user.id)
+    return ids
+
+def friends_only(request):
+    return request.user.is_authenticated and request.GET.get('friends') == '1'
+
 def contest_standings(request, pk):
     contest = get_object_or_404(Contest, pk=pk)
-    problems = contest.problems.all()
-    submissions = Submission.objects.filter(
-        problem__in=problems, 
-        submitted_at__gte=contest.start_time, 
-        submitted_at__lte=contest.end_time,
-        author__profile__is_disqualified=False
-    )
-    users = {sub.author for sub in submissions}
-    results = []
-    for user in users:
-        solved_count, penalty, user_problems = 0, 0, []
-        for problem in problems:
-            attempts = submissions.filter(author=user, problem=problem).order_by('submitted_at')
-            correct_sub = attempts.filter(is_correct=True).first()
-            if correct_sub:
-                solved_count += 1
-                time_passed = (correct_sub.submitted_at - contest.start_time).total_seconds() // 60
-                failed_before = attempts.filter(submitted_at__lt=correct_sub.submitted_at).count()
-                penalty += time_passed + (failed_before * 20)
-                user_problems.append({'status': 'OK', 'failed': failed_before, 'time': int(time_passed)})
-            else:
-                user_problems.append({'status': 'WA', 'failed': attempts.count()})
-        results.append({'user': user, 'solved': solved_count, 'penalty': int(penalty), 'problems': user_problems})
-    results.sort(key=lambda x: (-x['solved'], x['penalty']))
-    return render(request, 'archive/contest_standings.html', {'contest': contest, 'results': results, 'problems': problems})
+    problems = list(contest.problems.all())
+    entries = contest.standings.filter(
+        user__profile__is_disqualified=False
+    ).select_related('user__profile').order_by('-solved', 'penalty', 'user_id')
+    # Места среди друзей — это нумерация отфильтрованной выдачи, как и общие места
+    show_friends = friends_only(request)
+    if show_friends:
+        entries = entries.filter(user_id__in=friend_ids(request.user))
+    paginator = Paginator(entries, 100)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    results = annotate_ranks(scoreboard_rows(contest, problems, page_obj))
+    return render(request, 'archive/contest_standings.html', {
+        'contest': contest,
+        'results': results,
+        'problems': problems,
+        'page_obj': page_obj,
+        'friends_only': show_friends,
+    })
 
 # --- ACCOUNTS & RANKING ---
 class SignUpView(generic.CreateView):
@@ -163,12 +205,98 @@ class SignUpView(generic.CreateView):
     success_url = reverse_lazy('login')
     template_name = 'registration/signup.html'
 
+RANKING_PAGE_SIZE = 100
+
+def ranking_page_of(position):
+    return (position - 1) // RANKING_PAGE_SIZE + 1
+
 def ranking_view(request):
-    users_list = User.objects.filter(profile__is_disqualified=False).select_related('profile').order_by('-profile__rating', 'username')
-    paginator = Paginator(users_list, 100) 
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return render(request, 'archive/ranking.html', {'page_obj': page_obj})
+    """
+    Общий рейтинг по предрассчитанному Profile.rank_position: страница N — это
+    rank_position > (N-1)*RANKING_PAGE_SIZE по индексу, без COUNT(*) и OFFSET.
+    Зарегистрировавшиеся после последнего пересчёта мест (rank_position NULL)
+    идут следом за ранжированными по (-rating, user_id), их место — условное.
+    ?me=1 (или ?user=<имя>) открывает страницу с нужным пользователем.
+
+    С ?friends=1 показываются только друзья (и сам пользователь): фильтр по
+    множеству id в БД, место среди друзей считает ROW_NUMBER() в том же запросе.
+    """
+    show_friends = friends_only(request)
+    listed = Profile.objects.filter(is_disqualified=False)
+    if show_friends:
+        listed = listed.filter(user_id__in=friend_ids(request.user))
+    ranked = listed.filter(rank_position__isnull=False)
+    # Новички до пересчёта мест: их немного, список id берём целиком
+    unranked = list(
+        listed.filter(rank_position__isnull=True).order_by('-rating', 'user_id').values_list('pk', flat=True)
+    )
+
+    highlight = None
+    username = request.user.username if request.GET.get('me') and request.user.is_authenticated else request.GET.get('user')
+    if username:
+        highlight = listed.filter(user__username=username).first()
+        if highlight is None:
+            messages.warning(request, f"{username} is not in the ranking yet.")
+
+    if show_friends:
+        # Друзей немного: счётчик и OFFSET идут по короткому списку id
+        last_position = ranked.count()
+    else:
+        last_position = Profile.objects.aggregate(last=Max('rank_position'))['last'] or 0
+    total = last_position + len(unranked)
+    num_pages = ranking_page_of(total) if total else 1
+
+    if highlight is not None:
+        if highlight.rank_position is None:
+            position = last_position + unranked.index(highlight.pk) + 1
+        elif show_friends:
+            position = ranked.filter(rank_position__lte=highlight.rank_position).count()
+        else:
+            position = highlight.rank_position
+        number = ranking_page_of(position)
+    else:
+        try:
+            number = max(1, int(request.GET.get('page', 1)))
+        except ValueError:
+            number = 1
+    number = min(number, num_pages)
+
+    start = (number - 1) * RANKING_PAGE_SIZE
+    profiles = []
+    if start < last_position:
+        ranked = ranked.select_related('user')
+        if show_friends:
+            page = ranked.annotate(
+                friend_position=Window(RowNumber(), order_by=F('rank_position').asc())
+            ).order_by('rank_position')[start:start + RANKING_PAGE_SIZE]
+        else:
+            page = ranked.filter(rank_position__gt=start).order_by('rank_position')[:RANKING_PAGE_SIZE]
+        profiles = list(page)
+    if len(profiles) < RANKING_PAGE_SIZE and unranked:
+        offset = max(0, start - last_position)
+        tail = unranked[offset:offset + RANKING_PAGE_SIZE - len(profiles)]
+        newcomers = Profile.objects.select_related('user').in_bulk(tail)
+        for position, pk in enumerate(tail, start=last_position + offset + 1):
+            profile = newcomers[pk]
+            if show_friends:
+                profile.friend_position = position
+            else:
+                # Условное место только для показа; в БД остаётся NULL до пересчёта
+                profile.rank_position = position
+            profiles.append(profile)
+    page_obj = {
+        'number': number,
+        'num_pages': num_pages,
+        'page_range': range(max(1, number - 2), min(num_pages, number + 2) + 1),
+        'has_previous': number > 1,
+        'has_next': number < num_pages,
+    }
+    return render(request, 'archive/ranking.html', {
+        'profiles': annotate_ranks(profiles),
+        'page_obj': page_obj,
+        'highlight': highlight,
+        'friends_only': show_friends,
+    })
 
 def user_profile_view(request, username):
     target_user = get_object_or_404(User, username=username)
@@ -181,8 +309,8 @@ def user_profile_view(request, username):
     if request.user.is_authenticated:
         is_friend = request.user.profile.friends.filter(id=target_user.id).exists()
 
-    solved_count = Submission.objects.filter(author=target_user, is_correct=True).values('problem').distinct().count()
-    current_rank = Rank.objects.filter(min_rating__lte=profile.rating).order_by('-min_rating').first()
+    solved_count = profile.solved_count
+    current_rank = rank_resolver.resolve(profile.rating)
     submissions = Submission.objects.filter(author=target_user).order_by('-submitted_at')[:15]
     
     rating_history = target_user.rating_history.all().order_by('date')
@@ -193,6 +321,7 @@ def user_profile_view(request, username):
         'solved_count': solved_count,
         'submissions': submissions,
         'rank': current_rank,
+        'ranking_page': ranking_page_of(profile.rank_position) if profile.rank_position else None,
         'is_friend': is_friend,
         'rating_history': rating_history,
     })
@@ -218,15 +347,42 @@ def toggle_friend(request, username):
 
 def user_search(request):
     query = request.GET.get('q', '')
-    if query:
-        users = User.objects.filter(
-            username__icontains=query,
-            profile__is_disqualified=False
-        ).select_related('profile')
-    else:
-        users = []
+    users = [profile.user for profile in search_users(query)] if query else []
     return render(request, 'archive/user_search.html', {'users': users, 'query': query})
 
+def user_typeahead(request):
+    """Подсказки для строки поиска: JSON с первыми TYPEAHEAD_LIMIT пользователями."""
+    profiles = search_users(request.GET.get('q', ''), limit=TYPEAHEAD_LIMIT)
+    return JsonResponse({'results': [
+        {'username': profile.user.username, 'rating': profile.rating, 'url': reverse('user_profile', args=[profile.user.username])}
+        for profile in profiles
+    ]})
+
+SEARCH_KINDS = ('problems', 'posts')
+
+def content_search(request):
+    """Полнотекстовый поиск по задачам или постам с постраничной выдачей."""
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('type')
+    if kind not in SEARCH_KINDS:
+        kind = 'problems'
+    try:
+        page = min(max(1, int(request.GET.get('page', 1))), SEARCH_MAX_PAGES)
+    except ValueError:
+        page = 1
+
+    if kind == 'problems':
+        results, has_next = search_problems(query, page, include_unpublished=request.user.is_staff)
+    else:
+        results, has_next = search_posts(query, page)
+    return render(request, 'archive/search.html', {
+        'query': query,
+        'kind': kind,
+        'results': results,
+        'page': page,
+        'has_next': has_next and page < SEARCH_MAX_PAGES,
+    })
+
 @login_required
 def friends_list_view(request):
     friends = request.user.profile.friends.filter(profile__is_disqualified=False).select_related('profile')
@@ -236,114 +392,116 @@ def friends_list_view(request):
 @staff_member_required
 def calculate_contest_rating(request, pk):
     contest = get_object_or_404(Contest, pk=pk)
-    submissions = Submission.objects.filter(
-        problem__in=contest.problems.all(),
-        submitted_at__gte=contest.start_time,
-        submitted_at__lte=contest.end_time
-    )
-    
-    author_list = list({
-        sub.author for sub in submissions 
-        if not sub.author.profile.is_disqualified
-    })
-    
-    participants = []
-    for author in author_list:
-        author_subs = submissions.filter(author=author)
-        solved_problems = contest.problems.filter(
-            submission__author=author,
-            submission__is_correct=True,
-            submission__submitted_at__gte=contest.start_time,
-            submission__submitted_at__lte=contest.end_time
-        ).distinct()
-        
-        solved_count = solved_problems.count()
-        penalty = 0
-        for problem in solved_problems:
-            prob_subs = author_subs.filter(problem=problem).order_by('submitted_at')
-            first_correct = prob_subs.filter(is_correct=True).first()
-            if first_correct:
-                time_passed = (first_correct.submitted_at - contest.start_time).total_seconds() // 60
-                failed_before = prob_subs.filter(submitted_at__lt=first_correct.submitted_at).count()
-                penalty += time_passed + (failed_before * 20)
-
-        participants.append({
-            'user': author,
-            'old_rating': author.profile.rating,
-            'solved': solved_count,
-            'penalty': penalty,
-            'change': 0
-        })
-
-    if not participants:
-        messages.warning(request, "No active participants found.")
+    if contest.rated_at:
+        messages.error(request, "Ratings for this contest have already been applied.")
         return redirect('contest_standings', pk=pk)
+    job = enqueue('rate_contest', user=request.user, contest_id=contest.pk)
+    messages.success(request, f"Rating calculation for {contest.title} has been queued.")
+    return redirect('job_detail', pk=job.pk)
 
-    K = 30 
-    for i in range(len(participants)):
-        for j in range(len(participants)):
-            if i == j: continue
-            p1, p2 = participants[i], participants[j]
-            expected = 1 / (1 + 10 ** ((p2['old_rating'] - p1['old_rating']) / 400))
-            
-            if p1['solved'] > p2['solved']: 
-                actual = 1
-            elif p1['solved'] < p2['solved']: 
-                actual = 0
-            else:
-                if p1['penalty'] < p2['penalty']: actual = 0.75
-                elif p1['penalty'] > p2['penalty']: actual = 0.25
-                else: actual = 0.5
-            
-            p1['change'] += K * (actual - expected)
-
-    for p in participants:
-        user = p['user']
-        past_contests_count = user.rating_history.count()
-        
-        bonus = 0
-        if p['solved'] > 0:
-            if past_contests_count == 0: bonus = 50
-            elif past_contests_count == 1: bonus = 25
-        
-        profile = user.profile
-        profile.rating += int(p['change'] + bonus)
-        profile.save()
-
-        RatingHistory.objects.create(
-            user=user, 
-            rating=profile.rating, 
-            contest=contest
-        )
-        
-    messages.success(request, f"Rating calculated for {len(participants)} participants!")
-    return redirect('contest_standings', pk=pk)
+@staff_member_required
+def rebuild_contest_standings(request, pk):
+    contest = get_object_or_404(Contest, pk=pk)
+    job = enqueue('rebuild_standings', user=request.user, contest_id=contest.pk)
+    messages.success(request, f"Standings rebuild for {contest.title} has been queued.")
+    return redirect('job_detail', pk=job.pk)
+
+@staff_member_required
+def markdown_cache_stats(request):
+    return JsonResponse(render_cache.info())
+
+@staff_member_required
+def submission_throttle_stats(request):
+    return JsonResponse(dict(submission_throttle.info(), ingest=submission_ingest.info()))
+
+@staff_member_required
+def job_list(request):
+    jobs = Job.objects.select_related('created_by')[:50]
+    return render(request, 'archive/job_list.html', {'jobs': jobs})
+
+@staff_member_required
+def job_detail(request, pk):
+    job = get_object_or_404(Job, pk=pk)
+    return render(request, 'archive/job_detail.html', {'job': job})
+
+def streaming_export(rows, header, fmt, filename):
+    response = StreamingHttpResponse(serialize(rows, header, fmt), content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+@staff_member_required
+def export_contest_standings(request, pk):
+    contest = get_object_or_404(Contest, pk=pk)
+    fmt = request.GET.get('format', 'csv')
+    try:
+        problem_ids = [parse_id(value) for value in request.GET.getlist('problem')]
+        until = parse_time(request.GET.get('until'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Unknown export format.")
+
+    problems = contest.problems.filter(pk__in=problem_ids) if problem_ids else None
+    header, rows = export_standings(contest, problems, until)
+    return streaming_export(rows, header, fmt, f"standings-{contest.pk}")
+
+@staff_member_required
+def export_submission_list(request):
+    fmt = request.GET.get('format', 'csv')
+    try:
+        since = parse_time(request.GET.get('since'))
+        until = parse_time(request.GET.get('until'))
+        contest_id = parse_id(request.GET.get('contest'))
+        problem_id = parse_id(request.GET.get('problem'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if fmt not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Unknown export format.")
+
+    contest = get_object_or_404(Contest, pk=contest_id) if contest_id else None
+    header, rows = export_submissions(contest, problem_id, since, until)
+    return streaming_export(rows, header, fmt, f"submissions-{contest.pk}" if contest else "submissions")
 
 @staff_member_required
 def manual_update_submission(request, pk, action):
     submission = get_object_or_404(Submission, pk=pk)
     if action == 'make_correct':
-        submission.is_correct = True
+        set_verdict(submission, True)
     elif action == 'make_incorrect':
-        submission.is_correct = False
-    submission.save()
+        set_verdict(submission, False)
     messages.success(request, f"Submission #{submission.id} status updated.")
     return redirect('submission_detail', pk=pk)
 
+COMMUNITY_PAGE_SIZE = 20
+PREVIEW_WORDS = 40
+
 def community_list(request):
     sort = request.GET.get('sort', 'new')
-    posts = BlogPost.objects.all().select_related('author')
+    posts = BlogPost.objects.select_related('author').annotate(com_count=Count('comments'))
 
     if sort == 'featured':
-        posts = BlogPost.objects.filter(is_featured=True).order_by('-created_at')
+        posts = posts.filter(is_featured=True)
+        keyset = (('created_at', 'id'), (datetime, int))
     elif sort == 'discussed':
         # Сортировка по количеству комментариев
-        posts = posts.annotate(com_count=Count('comments')).order_by('-com_count', '-created_at')
+        keyset = (('com_count', 'created_at', 'id'), (int, datetime, int))
     else:
         # По умолчанию самые новые
-        posts = posts.order_by('-created_at')
-        
-    return render(request, 'archive/community.html', {'posts': posts, 'sort': sort})
+        sort = 'new'
+        keyset = (('created_at', 'id'), (datetime, int))
+
+    fields, types = keyset
+    posts, next_cursor = keyset_page(posts, fields, request.GET.get('after'), types, COMMUNITY_PAGE_SIZE)
+    for post in posts:
+        # Превью обрезается по готовому HTML, с корректным закрытием тегов
+        post.preview_html = Truncator(post.rendered_content).words(PREVIEW_WORDS, html=True)
+
+    return render(request, 'archive/community.html', {
+        'posts': posts,
+        'sort': sort,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('after')
+    })
 
 @login_required
 def create_post(request):
@@ -355,8 +513,30 @@ def create_post(request):
             return redirect('community')
     return render(request, 'archive/create_post.html')
 
+def build_comment_tree(post):
+    """
+    Загружает всё обсуждение одним запросом и собирает дерево в Python.
+
+    У каждого комментария появляется список ``children``, поэтому шаблону
+    не нужно обращаться к ORM. Возвращает (корневые комментарии, всего комментариев).
+    """
+    comments = list(post.comments.select_related('author').order_by('created_at', 'id'))
+    by_id = {comment.id: comment for comment in comments}
+    roots = []
+    for comment in comments:
+        comment.children = []
+    for comment in comments:
+        parent = by_id.get(comment.parent_id)
+        if parent is not None:
+            parent.children.append(comment)
+        else:
+            roots.append(comment)
+    # Корневые — сначала новые, ответы — в хронологическом порядке
+    roots.reverse()
+    return roots, len(comments)
+
 def post_detail(request, pk):
-    post = get_object_or_404(BlogPost, pk=pk)
+    post = get_object_or_404(BlogPost.objects.select_related('author'), pk=pk)
     if request.method == 'POST' and request.user.is_authenticated:
         text = request.POST.get('text')
         parent_id = request.POST.get('parent_id') # ID комментария, на который отвечаем
@@ -367,9 +547,12 @@ def post_detail(request, pk):
             Comment.objects.create(post=post, author=request.user, text=text, parent=parent_obj)
             return redirect('post_detail', pk=pk)
     
-    # Берем только корневые комментарии (у которых нет parent)
-    comments = post.comments.filter(parent=None).order_by('-created_at')
-    return render(request, 'archive/post_detail.html', {'post': post, 'comments': comments})
+    comments, comment_count = build_comment_tree(post)
+    return render(request, 'archive/post_detail.html', {
+        'post': post,
+        'comments': comments,
+        'comment_count': comment_count
+    })
 
 @login_required
 def edit_comment(request, pk):
@@ -59,9 +59,53 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL: чтение не блокируется записью; IMMEDIATE: транзакция сразу берёт
+            # блокировку записи и ждёт её (timeout), а не падает с "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-32000;'
+                'PRAGMA mmap_size=134217728;'
+            ),
+        },
+    }
+}
+
+# --- КЕШ ---
+# По умолчанию кеш в памяти процесса; для общего кеша между воркерами
+# достаточно указать здесь Redis/Memcached/файловый бэкенд
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Кеш отрендеренного Markdown: размер LRU в процессе и время жизни в общем кеше
+MARKDOWN_CACHE_SIZE = 2048
+MARKDOWN_CACHE_TIMEOUT = 24 * 60 * 60
+# Сколько секунд версия таблицы рангов живёт в кеше (с LocMem — задержка, с
+# которой другие процессы видят изменения Rank)
+RANK_VERSION_TIMEOUT = 60
+
+# Посылки: token bucket на пару (пользователь, задача) и подавление повторов того же ответа
+SUBMISSION_RATE_CAPACITY = 5      # сколько посылок подряд можно сделать
+SUBMISSION_RATE_REFILL = 10       # за сколько секунд восстанавливается одна посылка (0 — без ограничения)
+SUBMISSION_DEDUPE_WINDOW = 30     # тот же ответ в течение этого времени не создаёт посылку
+
+# Group commit посылок (archive.ingest): вердикт возвращается сразу, запись — пачками
+# фоновым потоком. Посылки, не записанные к падению процесса, теряются
+SUBMISSION_INGEST_ENABLED = False
+SUBMISSION_INGEST_BATCH_SIZE = 100
+SUBMISSION_INGEST_INTERVAL = 0.005  # секунд ждать добора пачки
+
+# Фоновые задачи: воркер продлевает аренду выполняемых задач; RUNNING-задача без
+# отметки дольше этого срока (секунд) считается брошенной и помечается FAILED (0 — не проверять)
+JOB_LEASE_TIMEOUT = 300
+
 # --- ВАЛИДАЦИЯ ПАРОЛЕЙ ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},